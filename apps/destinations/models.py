@@ -1,13 +1,15 @@
+from typing import Dict
+
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
-from django.db.models import Q, FloatField, Func, F, Value, Count, Case, When, Prefetch, Min
+from django.db.models import Q, FloatField, Func, F, Value, Count, Case, When, Prefetch, Min, Sum, IntegerField
+from django.db.models.functions import Coalesce
 from rest_framework.exceptions import NotFound
 
-
-# Create your models here.
-class LevenshteinRatio(Func):
-    function = "_levenshtein_ratio"
-    output_field = FloatField()
+from apps.leaderboards.boards import TOP_CITIES
+from apps.leaderboards.models import LeaderboardEntry, Rankings
+from apps.search.fields import SearchKeyField, SearchSkeletonField
+from apps.search.ranking import keyword_ratio_expression, relevance_expression, MIN_NAME_RATIO
 
 
 class CountryManger(models.Manager):
@@ -31,15 +33,16 @@ class Country(models.Model):
 
 class CityManager(models.Manager):
 
-    def find_by_keyword(self, keyword: str):
-        return self.annotate(
-            name_ratio=Case(
-                When(name__icontains=keyword, then=1),
-                default=LevenshteinRatio(F('name'), Value(keyword)),
-                output_field=FloatField(),
-            )
+    def find_by_keyword(self, keyword: str, relevances: Dict[int, float] = None):
+        """
+        Ratios computed by the database, or the relevances ranked beforehand for the candidate ids.
+        """
+        items = self.all() if relevances is None else self.filter(id__in=relevances)
+        return items.annotate(
+            name_ratio=keyword_ratio_expression(keyword) if relevances is None
+            else relevance_expression(relevances)
         ).filter(
-            name_ratio__gt=0.3
+            name_ratio__gt=MIN_NAME_RATIO
         ).order_by('-name_ratio').all()
 
     def find_by_id(self, city_id: int):
@@ -55,14 +58,25 @@ class CityManager(models.Manager):
         except ObjectDoesNotExist as e:
             raise NotFound({'detail': 'No such city with this id'})
 
+    def rank_cities(self, size: int) -> Rankings:
+        # Summed from the hotel statistics, one row per hotel instead of one per reservation
+        cities = self.annotate(
+            reservations_count=Coalesce(Sum('hotels__stats__reservations_count'), Value(0))
+        ).order_by('-reservations_count', 'id').values_list('id', 'reservations_count')[:size]
+        return {'all': list(cities)}
+
     def find_top_cities(self):
+        ranking = LeaderboardEntry.objects.find_ranking(TOP_CITIES, limit=7)
         return self.annotate(
-            reservations_count=Count('hotels__reservations')
-        ).order_by('-reservations_count').all()[:7]
+            reservations_count=Case(*[When(id=city_id, then=Value(int(score))) for city_id, score in ranking],
+                                    default=Value(0), output_field=IntegerField())
+        ).filter(id__in=[city_id for city_id, _ in ranking]).order_by('-reservations_count', 'id')
 
 
 class City(models.Model):
     name = models.CharField(max_length=255)
+    search_key = SearchKeyField(source='name')
+    search_skeleton = SearchSkeletonField(source='name')
     cover_img = models.ImageField(upload_to='destinations/cities/', null=True)
     description = models.TextField(null=True)
     country = models.ForeignKey(Country, related_name='cities', on_delete=models.SET_NULL, null=True)
@@ -50,7 +50,10 @@ class RoomTypeConverter:
     amenity_category_converter = BaseAmenityCategoryConverter()
 
     def to_dto(self, room_type: RoomType) -> RoomTypeDTO:
-        categories_dict = RoomType.objects.get_categories_and_amenities(room_type.id)
+        # Group the prefetched amenities by their categories
+        categories_dict = {}
+        for amenity in room_type.amenities.all():
+            categories_dict.setdefault(amenity.category, []).append(amenity)
         return RoomTypeDTO(
             room_type.id, room_type.name, room_type.size, room_type.cover_img.url,
             room_type.beds.all(), room_type.price_per_night,
@@ -89,7 +92,6 @@ class AmenityCategoryDtoConverter:
 
 class HotelDashboardRoomTypeDtoConverter:
     def to_dto(self, room_type: RoomType) -> HotelDashboardRoomTypeDto:
-        print(f"Monthly revenue for room_type {room_type.name} is : f{room_type.monthly_revenue}")
         return HotelDashboardRoomTypeDto(
             room_type.id, room_type.name, room_type.rooms_count,
             room_type.occupied_rooms_count, room_type.monthly_revenue
@@ -102,7 +104,7 @@ class HotelDashboardRoomTypeDtoConverter:
 class HotelDashboardInfoDtoConverter:
     room_type_converter = HotelDashboardRoomTypeDtoConverter()
 
-    def to_dto(self, hotel: Hotel) -> HotelDashboardInfoDto:
+    def to_dto(self, hotel: Hotel, reviews_page: RecentReviewsPageDto) -> HotelDashboardInfoDto:
         return HotelDashboardInfoDto(
             hotel.id,
             hotel.name,
@@ -115,7 +117,7 @@ class HotelDashboardInfoDtoConverter:
                 hotel.reservations_count, hotel.completed_count,
                 hotel.cancellations_count, hotel.revenue
             ), self.room_type_converter.to_dtos_list(hotel.room_types.all()),
-            [r.review for r in hotel.reservations.all() if hasattr(r, 'review')]
+            reviews_page.reviews, reviews_page.next_cursor
         )
 
 
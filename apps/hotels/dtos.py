@@ -1,7 +1,7 @@
 import typing
 from dataclasses import dataclass
 from datetime import datetime, date, time
-from typing import List
+from typing import List, Optional
 
 from apps.hotels.models import GuestReview, RoomTypeBed, RoomTypePolicies, HotelRules
 
@@ -96,6 +96,46 @@ class AmenityParamDto:
     param: str
 
 
+@dataclass
+class AmenityFacetDto:
+    id: int
+    param: str
+    count: int
+
+
+@dataclass
+class StarsFacetDto:
+    stars: int
+    count: int
+
+
+@dataclass
+class PriceBucketDto:
+    starts_at: int
+    ends_at: int
+    count: int
+
+
+@dataclass
+class SearchFacetsDto:
+    amenities: List[AmenityFacetDto]
+    stars: List[StarsFacetDto]
+    prices: List[PriceBucketDto]
+
+
+@dataclass
+class CalendarNightDto:
+    night: date
+    free_rooms: int
+
+
+@dataclass
+class RoomTypeCalendarDto:
+    id: int
+    name: str
+    nights: List[CalendarNightDto]
+
+
 @dataclass
 class AmenityCategoryDto:
     name: str
@@ -131,6 +171,20 @@ class HotelDashboardInfoDto:
     reservations: HotelDashboardReservationDto
     room_types: List[HotelDashboardRoomTypeDto]
     reviews: List[GuestReview]
+    reviews_next_cursor: Optional[str]
+
+
+@dataclass
+class RoomTypeRevenueDto:
+    id: int
+    name: str
+    revenue: int
+
+
+@dataclass
+class RecentReviewsPageDto:
+    reviews: List[GuestReview]
+    next_cursor: Optional[str]
 
 
 @dataclass
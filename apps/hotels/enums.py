@@ -2,6 +2,7 @@ from django.db import models
 
 
 class ReservationStatus(models.TextChoices):
+    ON_HOLD = 'On Hold'
     UNCOMPLETED = 'Uncompleted'
     CONFIRMED = 'Confirmed'
     ACTIVE = 'Active'
@@ -11,6 +12,12 @@ class ReservationStatus(models.TextChoices):
     DELETED_BY_ADMIN = 'Deleted_By_Admin'
 
 
+# Reservations in these states hold their rooms for the booked nights
+OCCUPYING_RESERVATION_STATUSES = [ReservationStatus.CONFIRMED, ReservationStatus.ACTIVE]
+# Same with the checkouts waiting for their payment, until their hold expires
+ROOM_HOLDING_RESERVATION_STATUSES = [ReservationStatus.ON_HOLD, *OCCUPYING_RESERVATION_STATUSES]
+
+
 class HotelCancellationPolicy(models.TextChoices):
     NO = 'No Cancellation Policy'
     DEPENDS = 'Cancellation Depends on Selected Room Type'
@@ -0,0 +1,184 @@
+import json
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import date, timedelta
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+
+from apps.destinations.models import Country, City
+from apps.guests.models import Guest
+from apps.hotels.enums import RoomTypeStatus
+from apps.hotels.models import Hotel, RoomType, Room, RoomAssignment, RoomTypeInventory, Reservation
+from apps.hotels.utils import get_nights, ClaimConflict
+from apps.owners.models import Owner
+from apps.users.models import User
+from core.utils import CustomException
+
+
+def _run_requests(requests):
+    """
+    Send the booking requests one after the other and measure each of them, runs inside a
+    thread or a forked process with its own database connection.
+    """
+    # Imported here, the serializers query the amenities as soon as they are loaded
+    from apps.hotels import services
+    results = []
+    try:
+        guest_user = User.objects.get(email='benchmark-guest@example.com')
+        for request in requests:
+            retries = Counter()
+
+            def on_retry(attempt, error):
+                if isinstance(error, ClaimConflict):
+                    retries['claim_conflicts'] += 1
+                elif (error.args and error.args[0] == 1213) or 'deadlock' in str(error).lower():
+                    retries['deadlocks'] += 1
+                else:
+                    retries['lock_waits'] += 1
+
+            started_at = time.perf_counter()
+            try:
+                services.reserve_hotel_room(guest_user, request, on_retry=on_retry)
+                outcome = 'booked'
+            except ValidationError:
+                outcome = 'sold_out'
+            except CustomException:
+                outcome = 'conflict'
+            except Exception as e:
+                outcome = f'error: {e.__class__.__name__}'
+            results.append((outcome, time.perf_counter() - started_at, retries))
+    finally:
+        connections.close_all()
+    return results
+
+
+class Command(BaseCommand):
+    help = ('Benchmark reserve_hotel_room with concurrent bookings of overlapping stays on a throwaway database, '
+            'then report the throughput, the latencies, the retries and the double booked room nights')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotels', type=int, default=2)
+        parser.add_argument('--room-types', type=int, default=2, help='Room types per hotel')
+        parser.add_argument('--rooms', type=int, default=5, help='Rooms per room type')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--mode', choices=['threads', 'processes'], default='threads')
+        parser.add_argument('--days', type=int, default=14, help='Width of the window the stays start in')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the report to this json file')
+        parser.add_argument('--baseline', help='Compare the report with a previous json report')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'processes' and connection.vendor == 'sqlite':
+            raise CommandError('The processes mode needs a database server, the sqlite test database '
+                               'lives in memory and can not be shared between processes')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            requests = self.seed(options)
+            report = self.run(requests, options)
+            report['double_booked_room_nights'] = self.count_double_booked_room_nights()
+            report['oversold_inventory_nights'] = RoomTypeInventory.objects.filter(sold__gt=F('total')).count()
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.print_report(report, options)
+
+    def seed(self, options):
+        country = Country.objects.create(name='Algeria', country_code='213')
+        city = City.objects.create(name='Oran', country=country)
+        owner_user = User.objects.create_user(email='benchmark-owner@example.com', password='benchmark', is_active=True)
+        owner = Owner.objects.create_owner(user=owner_user, first_name='Benchmark', last_name='Owner', birthday=None,
+                                           country_code=country, phone=1234567, country=country)
+        guest_user = User.objects.create_user(email='benchmark-guest@example.com', password='benchmark', is_active=True)
+        Guest.objects.create_guest(guest_user, 'Benchmark', 'Guest')
+        room_types = []
+        for i in range(options['hotels']):
+            hotel = Hotel.objects.create(owner=owner, name=f'Benchmark hotel {i}', address='Front de mer', city=city,
+                                         stars=4, country_code=country, contact_number=674947412)
+            for j in range(options['room_types']):
+                room_type = RoomType.objects.create(hotel=hotel, name='Double', size=20, number_of_guests=2,
+                                                    price_per_night=5000 * (j + 1), status=RoomTypeStatus.VISIBLE)
+                Room.objects.bulk_create([Room(room_type=room_type) for _ in range(options['rooms'])])
+                room_types.append(room_type)
+        # The same seed always gives the same requests, runs can be compared with each other
+        rand = random.Random(options['seed'])
+        first_day = date.today() + timedelta(days=1)
+        requests = []
+        for _ in range(options['requests']):
+            room_type = rand.choice(room_types)
+            check_in = first_day + timedelta(days=rand.randrange(options['days']))
+            requests.append({
+                'first_name': 'Benchmark', 'last_name': 'Guest', 'email': 'benchmark-guest@example.com',
+                'country_id': country.id, 'country_code_id': country.id, 'phone': 1234567,
+                'hotel_id': room_type.hotel_id, 'check_in': check_in,
+                'check_out': check_in + timedelta(days=rand.randint(1, 4)),
+                'requested_room_types': [{'room_type_id': room_type.id, 'nb_rooms': rand.randint(1, 2)}],
+            })
+        return requests
+
+    def run(self, requests, options):
+        workers = options['workers']
+        chunks = [requests[i::workers] for i in range(workers)]
+        connections.close_all()
+        if options['mode'] == 'threads':
+            executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            # Forked workers inherit the test database settings of this process
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('fork'))
+        started_at = time.perf_counter()
+        with executor:
+            results = [result for chunk_results in executor.map(_run_requests, chunks) for result in chunk_results]
+        elapsed = time.perf_counter() - started_at
+        outcomes = Counter(outcome for outcome, _, _ in results)
+        latencies = sorted(latency * 1000 for _, latency, _ in results)
+        retries = sum((request_retries for _, _, request_retries in results), Counter())
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'mode': options['mode'],
+            'workers': workers,
+            'requests': len(results),
+            'elapsed_seconds': round(elapsed, 3),
+            'bookings_per_second': round(outcomes['booked'] / elapsed, 2),
+            'requests_per_second': round(len(results) / elapsed, 2),
+            'latency_ms': {'p50': round(percentiles[49], 2), 'p95': round(percentiles[94], 2),
+                           'p99': round(percentiles[98], 2)},
+            'outcomes': dict(outcomes),
+            'retries': {name: retries[name] for name in ('deadlocks', 'lock_waits', 'claim_conflicts')},
+        }
+
+    def count_double_booked_room_nights(self) -> int:
+        room_nights = Counter()
+        assignments = RoomAssignment.objects.filter(
+            reserved_room_type__reservation__in=Reservation.objects.holding_rooms()
+        ).values_list('room_id', 'reserved_room_type__reservation__check_in',
+                      'reserved_room_type__reservation__check_out')
+        for room_id, check_in, check_out in assignments:
+            for night in get_nights(check_in, check_out):
+                room_nights[(room_id, night)] += 1
+        return sum(1 for count in room_nights.values() if count > 1)
+
+    def print_report(self, report, options):
+        self.stdout.write(json.dumps(report, indent=2))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            for name, value, baseline_value in [
+                ('bookings/sec', report['bookings_per_second'], baseline['bookings_per_second']),
+                ('p95 latency ms', report['latency_ms']['p95'], baseline['latency_ms']['p95']),
+                ('p99 latency ms', report['latency_ms']['p99'], baseline['latency_ms']['p99']),
+            ]:
+                change = (value - baseline_value) / baseline_value * 100 if baseline_value else 0
+                self.stdout.write(f'{name}: {baseline_value} -> {value} ({change:+.1f}%)')
+        if report['double_booked_room_nights'] or report['oversold_inventory_nights']:
+            self.stdout.write(self.style.ERROR('Some room nights have been booked more than once'))
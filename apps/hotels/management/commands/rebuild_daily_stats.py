@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apps.hotels.models import Hotel, HotelDailyStats
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the hotel and room type daily statistics from the reservations, a chunk of hotels '
+            'at a time, to backfill the history or repair any drift')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=50, help='Hotels rebuilt per transaction')
+        parser.add_argument('--hotel', type=int, action='append', dest='hotel_ids',
+                            help='Only rebuild this hotel, can be repeated')
+
+    def handle(self, *args, **options):
+        hotels = Hotel.objects.order_by('id')
+        if options['hotel_ids']:
+            hotels = hotels.filter(id__in=options['hotel_ids'])
+        hotel_ids = list(hotels.values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        for start in range(0, len(hotel_ids), chunk_size):
+            chunk = hotel_ids[start:start + chunk_size]
+            HotelDailyStats.objects.rebuild(chunk)
+            self.stdout.write(f'Rebuilt {start + len(chunk)}/{len(hotel_ids)} hotels')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -1,34 +1,34 @@
 from datetime import datetime
 
 from django.db import models
-from django.db.models import Q, QuerySet, OuterRef, Count
+from django.db.models import Q, QuerySet, OuterRef, Count, Exists
+from django.utils import timezone
 
-from apps.hotels.enums import ReservationStatus
+from apps.hotels.enums import ReservationStatus, OCCUPYING_RESERVATION_STATUSES
 from apps.owners.models import Owner
 from .models import *
+from .utils import to_date
 
 
 class RoomManager(models.Manager):
     def find_available_rooms_by_room_type(self, room_type_id: int, check_in: datetime, check_out: datetime) -> QuerySet:
-        reserved_rooms = self.filter(
-            Q(status=RoomStatus.VISIBLE) &
-            Q(room_type_id=room_type_id) &
-            Q(assignments__reserved_room_type__reservation__status=ReservationStatus.CONFIRMED.value) |
-            Q(assignments__reserved_room_type__reservation__status=ReservationStatus.ACTIVE.value)
-            & (
-                    Q(assignments__reserved_room_type__reservation__check_in__gt=check_in) &
-                    Q(assignments__reserved_room_type__reservation__check_in__lt=check_out)
-                    |
-                    Q(assignments__reserved_room_type__reservation__check_in__lte=check_in) &
-                    Q(assignments__reserved_room_type__reservation__check_out__gte=check_out)
-                    |
-                    Q(assignments__reserved_room_type__reservation__check_out__gt=check_in) &
-                    Q(assignments__reserved_room_type__reservation__check_out__lt=check_out)
-            )
-        ).all()
-        reserved_rooms_ids = reserved_rooms.values_list('id', flat=True)
-        available_rooms = self.filter(room_type_id=room_type_id,status=RoomStatus.VISIBLE).exclude(id__in=reserved_rooms_ids).all()
-        return available_rooms
+        from .models import RoomTypeInventory
+        # The nightly inventory answers the sold out case without touching the reservations
+        if RoomTypeInventory.objects.count_available_rooms(room_type_id, check_in, check_out) == 0:
+            return self.none()
+        return self.find_unassigned_rooms(room_type_id, check_in, check_out)
+
+    def find_unassigned_rooms(self, room_type_id: int, check_in: datetime, check_out: datetime) -> QuerySet:
+        """
+        Rooms of the room type without a live claim on any night of the stay.
+        """
+        from .models import RoomNightClaim
+        claims = RoomNightClaim.objects.filter(
+            room_id=OuterRef('pk'),
+            night__gte=to_date(check_in),
+            night__lt=to_date(check_out)
+        ).filter(Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()))
+        return self.filter(room_type_id=room_type_id, status=RoomStatus.VISIBLE).exclude(Exists(claims))
 
     def get_room_type_rooms_subquery(self):
         return self.filter(
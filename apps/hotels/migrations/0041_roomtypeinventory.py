@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:25
+
+from collections import defaultdict
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_inventory(apps, schema_editor):
+    Room = apps.get_model('hotels', 'Room')
+    ReservedRoomType = apps.get_model('hotels', 'ReservedRoomType')
+    RoomTypeInventory = apps.get_model('hotels', 'RoomTypeInventory')
+    rooms_counts = defaultdict(int)
+    for room_type_id in Room.objects.filter(status='Visible').values_list('room_type_id', flat=True):
+        rooms_counts[room_type_id] += 1
+    sold = defaultdict(int)
+    reserved_room_types = ReservedRoomType.objects.filter(
+        reservation__status__in=['Confirmed', 'Active']
+    ).values_list('room_type_id', 'nb_rooms', 'reservation__check_in', 'reservation__check_out')
+    for room_type_id, nb_rooms, check_in, check_out in reserved_room_types:
+        for i in range((check_out.date() - check_in.date()).days):
+            sold[(room_type_id, check_in.date() + timedelta(days=i))] += nb_rooms
+    RoomTypeInventory.objects.bulk_create(
+        [RoomTypeInventory(room_type_id=room_type_id, night=night, sold=nb_rooms, total=rooms_counts[room_type_id])
+         for (room_type_id, night), nb_rooms in sold.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0040_alter_hotel_contact_number_alter_reservation_phone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomTypeInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('room_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='hotels.roomtype')),
+            ],
+            options={
+                'db_table': 'room_type_inventory',
+                'unique_together': {('room_type', 'night')},
+            },
+        ),
+        migrations.RunPython(fill_inventory, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:31
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_amenity_masks(apps, schema_editor):
+    Hotel = apps.get_model('hotels', 'Hotel')
+    RoomType = apps.get_model('hotels', 'RoomType')
+    HotelAmenityMask = apps.get_model('hotels', 'HotelAmenityMask')
+    masks = defaultdict(int)
+    for hotel_id, amenity_id in Hotel.amenities.through.objects.values_list('hotel_id', 'amenity_id'):
+        masks[(hotel_id, None)] |= 1 << amenity_id
+    for hotel_id, price_per_night, amenity_id in RoomType.amenities.through.objects.values_list(
+            'roomtype__hotel_id', 'roomtype__price_per_night', 'amenity_id'):
+        masks[(hotel_id, price_per_night)] |= 1 << amenity_id
+    HotelAmenityMask.objects.bulk_create(
+        [HotelAmenityMask(hotel_id=hotel_id, price_per_night=price_per_night, mask=format(mask, 'x'))
+         for (hotel_id, price_per_night), mask in masks.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0041_roomtypeinventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotelAmenityMask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_per_night', models.BigIntegerField(null=True)),
+                ('mask', models.CharField(max_length=255)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='amenity_masks', to='hotels.hotel')),
+            ],
+            options={
+                'db_table': 'hotel_amenity_masks',
+                'unique_together': {('hotel', 'price_per_night')},
+            },
+        ),
+        migrations.RunPython(fill_amenity_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:38
+
+from datetime import date, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_claims(apps, schema_editor):
+    RoomAssignment = apps.get_model('hotels', 'RoomAssignment')
+    RoomNightClaim = apps.get_model('hotels', 'RoomNightClaim')
+    today = date.today()
+    # The past nights do not matter for the availability, only the upcoming ones are claimed
+    assignments = RoomAssignment.objects.filter(
+        reserved_room_type__reservation__status__in=['Confirmed', 'Active'],
+        reserved_room_type__reservation__check_out__date__gt=today
+    ).values_list('room_id', 'reserved_room_type_id', 'reserved_room_type__reservation__check_in',
+                  'reserved_room_type__reservation__check_out')
+    claims = []
+    for room_id, reserved_room_type_id, check_in, check_out in assignments:
+        for i in range((check_out.date() - check_in.date()).days):
+            night = check_in.date() + timedelta(days=i)
+            if night >= today:
+                claims.append(RoomNightClaim(room_id=room_id, night=night, reserved_room_type_id=reserved_room_type_id))
+    # Rooms that are already double booked keep their first claim
+    RoomNightClaim.objects.bulk_create(claims, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0042_hotelamenitymask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomNightClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('reserved_room_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='night_claims', to='hotels.reservedroomtype')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='night_claims', to='hotels.room')),
+            ],
+            options={
+                'db_table': 'room_night_claims',
+                'unique_together': {('room', 'night')},
+            },
+        ),
+        migrations.RunPython(fill_claims, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0007_country_iso'),
+        ('guests', '0009_alter_guest_phone'),
+        ('hotels', '0043_roomnightclaim'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='reservation',
+            name='chk_status',
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='hold_expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='roomnightclaim',
+            name='expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='status',
+            field=models.CharField(choices=[('On Hold', 'On Hold'), ('Uncompleted', 'Uncompleted'), ('Confirmed', 'Confirmed'), ('Active', 'Active'), ('Cancelled By Owner', 'Cancelled By Owner'), ('Cancelled By Guest', 'Cancelled By Guest'), ('Completed', 'Completed'), ('Deleted_By_Admin', 'Deleted By Admin')], default='Confirmed', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['status', 'hold_expires_at'], name='idx_reservation_hold'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.CheckConstraint(condition=models.Q(('status__in', ['On Hold', 'Uncompleted', 'Confirmed', 'Active', 'Cancelled By Owner', 'Cancelled By Guest', 'Completed', 'Deleted_By_Admin'])), name='chk_status'),
+        ),
+    ]
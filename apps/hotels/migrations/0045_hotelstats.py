@@ -0,0 +1,65 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Min, Q, Sum
+
+
+def fill_hotel_stats(apps, schema_editor):
+    Hotel = apps.get_model('hotels', 'Hotel')
+    HotelStats = apps.get_model('hotels', 'HotelStats')
+    stats = {hotel_id: HotelStats(hotel_id=hotel_id) for hotel_id in Hotel.objects.values_list('id', flat=True)}
+    reviews = apps.get_model('hotels', 'GuestReview').objects.values('reservation__hotel_id').annotate(
+        rating_avg=Avg('rating'), reviews_count=Count('id')
+    )
+    for row in reviews:
+        if row['reservation__hotel_id'] in stats:
+            stats[row['reservation__hotel_id']].rating_avg = row['rating_avg']
+            stats[row['reservation__hotel_id']].reviews_count = row['reviews_count']
+    reservations = apps.get_model('hotels', 'Reservation').objects.values('hotel_id').annotate(
+        reservations_count=Count('id'),
+        completed_count=Count('id', filter=Q(status='Completed')),
+        cancellations_count=Count('id', filter=Q(status__in=['Cancelled By Guest', 'Cancelled By Owner'])),
+        revenue=Sum('total_price', filter=Q(status='Completed')),
+    )
+    for row in reservations:
+        if row['hotel_id'] in stats:
+            hotel_stats = stats[row['hotel_id']]
+            hotel_stats.reservations_count = row['reservations_count']
+            hotel_stats.completed_count = row['completed_count']
+            hotel_stats.cancellations_count = row['cancellations_count']
+            hotel_stats.revenue = row['revenue'] or 0
+    prices = apps.get_model('hotels', 'RoomType').objects.filter(status='Visible').values('hotel_id').annotate(
+        starts_at=Min('price_per_night')
+    )
+    for row in prices:
+        stats[row['hotel_id']].starts_at = row['starts_at']
+    HotelStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0044_reservation_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotelStats',
+            fields=[
+                ('hotel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='hotels.hotel')),
+                ('rating_avg', models.FloatField(null=True)),
+                ('reviews_count', models.IntegerField(default=0)),
+                ('starts_at', models.BigIntegerField(null=True)),
+                ('reservations_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('cancellations_count', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'hotel_stats',
+            },
+        ),
+        migrations.RunPython(fill_hotel_stats, migrations.RunPython.noop),
+    ]
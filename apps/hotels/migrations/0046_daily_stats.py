@@ -0,0 +1,48 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0045_hotelstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotelDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('check_ins', models.IntegerField(default=0)),
+                ('check_outs', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('occupied_room_nights', models.IntegerField(default=0)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='hotels.hotel')),
+            ],
+            options={
+                'db_table': 'hotel_daily_stats',
+                'unique_together': {('hotel', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RoomTypeDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('check_ins', models.IntegerField(default=0)),
+                ('check_outs', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('occupied_room_nights', models.IntegerField(default=0)),
+                ('room_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='hotels.roomtype')),
+            ],
+            options={
+                'db_table': 'room_type_daily_stats',
+                'unique_together': {('room_type', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:10
+
+import apps.search.fields
+from django.db import migrations
+
+from apps.search.utils import to_search_key
+
+
+def fill_search_keys(apps, schema_editor):
+    Hotel = apps.get_model('hotels', 'Hotel')
+    items = list(Hotel.objects.only('name'))
+    for item in items:
+        item.search_key = to_search_key(item.name)[:255]
+    Hotel.objects.bulk_update(items, ['search_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0046_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='search_key',
+            field=apps.search.fields.SearchKeyField(db_index=True, default='', editable=False, max_length=255, source='name'),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+    ]
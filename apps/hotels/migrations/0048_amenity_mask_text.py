@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0047_search_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='hotelamenitymask',
+            name='mask',
+            field=models.TextField(),
+        ),
+    ]
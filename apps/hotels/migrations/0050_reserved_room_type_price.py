@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_prices(apps, schema_editor):
+    # The stays booked before keep the current price of their room types, the nearest known
+    ReservedRoomType = apps.get_model('hotels', 'ReservedRoomType')
+    RoomType = apps.get_model('hotels', 'RoomType')
+    ReservedRoomType.objects.update(price_per_night=Subquery(
+        RoomType.objects.filter(id=OuterRef('room_type_id')).values('price_per_night')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0049_search_skeleton'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservedroomtype',
+            name='price_per_night',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_prices, migrations.RunPython.noop),
+    ]
@@ -1,29 +1,37 @@
-from datetime import datetime
+from collections import defaultdict, Counter
+from datetime import datetime, date, timedelta
+from itertools import accumulate
+from typing import List, Dict, Tuple
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.db.models import CheckConstraint, Q, Index, Count, Avg, Min, QuerySet, Func, FloatField, F, Value, Case, \
-    When, Sum, OuterRef, Subquery, ExpressionWrapper, Prefetch, IntegerField
+    When, Sum, OuterRef, Subquery, ExpressionWrapper, Prefetch, IntegerField, Max, Exists
 from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework.exceptions import NotFound, ValidationError
-from sql_util.aggregates import SubqueryAggregate, SubqueryCount, SubqueryAvg, SubquerySum, SubqueryMin
+from sql_util.aggregates import SubqueryAggregate, SubqueryCount, SubqueryAvg, SubquerySum, SubqueryMin, \
+    SubqueryMax
 
 from apps.destinations.models import City, Country
 from apps.guests.models import Guest
+from apps.leaderboards.boards import TOP_HOTELS
+from apps.leaderboards.models import LeaderboardEntry, Rankings
+from apps.leaderboards.utils import compute_scores
+from apps.search.fields import SearchKeyField, SearchSkeletonField
+from apps.search.ranking import keyword_ratio_expression, relevance_expression, MIN_NAME_RATIO
+from core.utils import bump_cache_version
 from apps.hotels.enums import ReservationStatus, HotelCancellationPolicy, ParkingType, HotelPrepaymentPolicy, \
     HotelStatus, \
-    RoomTypeEnum, RoomTypeStatus, RoomTypeCancellationPolicy, RoomTypePrepaymentPolicy, RoomStatus
+    RoomTypeEnum, RoomTypeStatus, RoomTypeCancellationPolicy, RoomTypePrepaymentPolicy, RoomStatus, \
+    OCCUPYING_RESERVATION_STATUSES, ROOM_HOLDING_RESERVATION_STATUSES
 from . import managers
+from .utils import get_nights, to_date, to_amenity_mask, ClaimConflict, invalidate_hotel_calendars
 from ..owners.models import Owner
 
 
-class LevenshteinRatio(Func):
-    function = "_levenshtein_ratio"
-    output_field = FloatField()
-
-
 class AmenityCategoryManager(models.Manager):
     pass
 
@@ -98,132 +106,216 @@ class HotelManager(models.Manager):
     w3 = 0.2  # Number of completed reservations
     w4 = 0.1  # Number of generated revenue
 
-    def find_top_hotels(self) -> QuerySet:
+    def rank_hotels(self, size: int) -> Rankings:
+        """
+        Score every visible hotel on its normalized statistics, the best ones are ranked
+        overall and within their city.
+        """
+        rows = list(self.filter(status=HotelStatus.VISIBLE).values_list(
+            'id', 'city_id', 'stats__rating_avg', 'stats__reviews_count', 'stats__completed_count', 'stats__revenue'
+        ))
+        scores = compute_scores(
+            features={
+                'rating': [row[2] for row in rows],
+                'reviews': [row[3] for row in rows],
+                'completed_reservations': [row[4] for row in rows],
+                'revenue': [row[5] for row in rows],
+            },
+            weights={'rating': self.w1, 'reviews': self.w2, 'completed_reservations': self.w3, 'revenue': self.w4}
+        )
+        rankings = defaultdict(list)
+        for (hotel_id, city_id, *_), score in sorted(zip(rows, scores), key=lambda item: (-item[1], item[0][0])):
+            if len(rankings['all']) < size:
+                rankings['all'].append((hotel_id, score))
+            if city_id is not None and len(rankings[f'city:{city_id}']) < size:
+                rankings[f'city:{city_id}'].append((hotel_id, score))
+        return rankings
+
+    def find_top_hotels(self, city_id: int = None) -> QuerySet:
+        """
+        Best hotels overall or in a city, read from the ranking refreshed in the background.
+        """
+        key = 'all' if city_id is None else f'city:{city_id}'
+        ranking = LeaderboardEntry.objects.find_ranking(TOP_HOTELS, key, limit=6)
+        if not ranking:
+            return self.none()
         return self.annotate(
-            reservations_count=SubqueryCount('reservations'),
-            revenue=SubquerySum('reservations__total_price',
-                                filter=Q(status=ReservationStatus.COMPLETED)
-                                ),
-            rating_avg=SubqueryAvg('reservations__review__rating'),
-            reviews_count=SubqueryCount('reservations__review'),
-            starts_at=SubqueryMin('room_types__price_per_night'),
-            average=ExpressionWrapper(F('rating_avg') * self.w1 + F('reviews_count') * self.w2 +
-                                      F('reservations_count') * self.w3 + F('revenue') * self.w4,
-                                      output_field=models.FloatField())
-        ).filter(status=HotelStatus.VISIBLE).order_by('-average').all()[:6]
+            rating_avg=F('stats__rating_avg'),
+            reviews_count=Coalesce(F('stats__reviews_count'), Value(0)),
+            starts_at=F('stats__starts_at'),
+            average=Case(*[When(id=hotel_id, then=Value(score)) for hotel_id, score in ranking],
+                         output_field=FloatField())
+        ).filter(id__in=[hotel_id for hotel_id, _ in ranking], status=HotelStatus.VISIBLE).order_by('-average', 'id')
 
     def find_by_id(self, hotel_id: int):
         try:
             return (self.annotate(
-                rating_avg=SubqueryAvg('reservations__review__rating'),
-                reviews_count=SubqueryCount('reservations__review'),
-                starts_at=SubqueryMin('room_types__price_per_night'),
+                rating_avg=F('stats__rating_avg'),
+                reviews_count=Coalesce(F('stats__reviews_count'), Value(0)),
+                starts_at=F('stats__starts_at'),
             ).prefetch_related('owner').get(pk=hotel_id, status=HotelStatus.VISIBLE))
         except ObjectDoesNotExist as e:
             raise NotFound({'detail': 'No Such Hotel with this id'})
 
-    def find_by_keyword(self, keyword):
-        result = self.annotate(
-            name_ratio=Case(
-                When(name__icontains=keyword, then=1),
-                default=LevenshteinRatio(F('name'), Value(keyword)),
-                output_field=FloatField(),
-            )
+    def find_by_keyword(self, keyword: str, relevances: Dict[int, float] = None):
+        """
+        Ratios computed by the database, or the relevances ranked beforehand for the candidate ids.
+        """
+        items = self.all() if relevances is None else self.filter(id__in=relevances)
+        result = items.annotate(
+            name_ratio=keyword_ratio_expression(keyword) if relevances is None
+            else relevance_expression(relevances)
         ).filter(
-            Q(name_ratio__gt=0.3),
+            Q(name_ratio__gt=MIN_NAME_RATIO),
             status=HotelStatus.VISIBLE
         ).order_by('-name_ratio')
         return result.all()
 
     def find_available_hotels_by_city_id(self, city_id, check_in: datetime, check_out: datetime,
-                                         price_starts_at: int, price_ends_at: int, stars: int):
+                                         price_starts_at: int, price_ends_at: int, stars: int) -> QuerySet:
+        """
+        Lazy queryset of the city hotels having at least one free room type in the price range,
+        starts_at is the cheapest price among those available room types.
+        """
+        cheapest_available_price = RoomType.objects.with_available_rooms_count(check_in, check_out).filter(
+            hotel_id=OuterRef('pk'),
+            status=RoomTypeStatus.VISIBLE,
+            price_per_night__gte=price_starts_at,
+            price_per_night__lte=price_ends_at,
+            available_rooms_count__gt=0
+        ).order_by('price_per_night').values('price_per_night')[:1]
         hotels = self.annotate(
-            rating_avg=SubqueryAvg('reservations__review__rating'),
-            reviews_count=SubqueryCount('reservations__review'),
-            starts_at=SubqueryMin('room_types__price_per_night',
-                                  filter=Q(price_per_night__gte=price_starts_at,
-                                           price_per_night__lte=price_ends_at)),
+            rating_avg=F('stats__rating_avg'),
+            reviews_count=Coalesce(F('stats__reviews_count'), Value(0)),
+            starts_at=Subquery(cheapest_available_price),
         ).filter(
             city_id=city_id,
             status=HotelStatus.VISIBLE,
-            starts_at__gte=price_starts_at,
-            starts_at__lte=price_ends_at,
-        ).all()
+            starts_at__isnull=False,
+        )
         if stars is not None:
             hotels = hotels.filter(stars=stars)
-        available_hotels = []
-        for hotel in hotels.all():
-            for room_type in hotel.room_types.all():
-                available_rooms = Room.objects.find_available_rooms_by_room_type(room_type.id, check_in, check_out)
-                if available_rooms.count() > 0:
-                    available_hotels.append(hotel)
-                break
-        return available_hotels
-
-    def has_amenity(self, hotel_id, price_min: int, price_max: int, amenity_id: int) -> bool:
-        hotel_amenity_exists = self.filter(
-            id=hotel_id,
-            amenities__id=amenity_id
-        ).exists()
-        room_type_amenity_exists = self.filter(
-            id=hotel_id,
-            room_types__price_per_night__gte=price_min,
-            room_types__price_per_night__lte=price_max,
-            room_types__amenities__id=amenity_id
-        ).exists()
-        return hotel_amenity_exists or room_type_amenity_exists
+        return hotels.select_related('owner', 'city__country', 'rules').prefetch_related(
+            'amenities', 'images'
+        ).order_by('starts_at', 'id')
+
+    def filter_by_amenities(self, hotels: QuerySet, amenity_ids: List[int], price_min: int,
+                            price_max: int) -> QuerySet:
+        """
+        Keep the hotels offering every amenity, either as a facility of the hotel or
+        in one of its room types within the price range, using the precomputed amenity masks.
+        """
+        if not amenity_ids:
+            return hotels
+        required_mask = to_amenity_mask(amenity_ids)
+        hotels_masks = self.get_amenity_masks(hotels.values('id'), price_min, price_max)
+        matching_ids = [hotel_id for hotel_id, mask in hotels_masks.items() if mask & required_mask == required_mask]
+        return hotels.filter(id__in=matching_ids)
+
+    def get_amenity_masks(self, hotel_ids, price_min: int, price_max: int) -> dict:
+        """
+        Map each hotel id to the bitset of the amenities it offers within the price range.
+        """
+        masks = HotelAmenityMask.objects.filter(
+            Q(price_per_night__isnull=True) | Q(price_per_night__gte=price_min, price_per_night__lte=price_max),
+            hotel_id__in=hotel_ids
+        ).values_list('hotel_id', 'mask')
+        hotels_masks = defaultdict(int)
+        for hotel_id, mask in masks:
+            hotels_masks[hotel_id] |= int(mask, 16)
+        return hotels_masks
+
+    def count_facets(self, hotels: QuerySet, price_min: int, price_max: int, nb_price_buckets: int) -> dict:
+        """
+        Count the hotels per amenity, per stars and per starts_at price bucket in a single pass
+        over the result set, the price buckets have an equal width between the lowest and highest price.
+        """
+        rows = list(hotels.values_list('id', 'stars', 'starts_at'))
+        stars_counts = Counter(stars for _, stars, _ in rows)
+        amenities_counts = Counter()
+        for mask in self.get_amenity_masks([hotel_id for hotel_id, _, _ in rows], price_min, price_max).values():
+            while mask:
+                lowest_bit = mask & -mask
+                amenities_counts[lowest_bit.bit_length() - 1] += 1
+                mask ^= lowest_bit
+        price_buckets = []
+        if rows:
+            lowest_price = min(starts_at for _, _, starts_at in rows)
+            highest_price = max(starts_at for _, _, starts_at in rows)
+            width = max(-(-(highest_price - lowest_price + 1) // nb_price_buckets), 1)
+            counts = Counter((starts_at - lowest_price) // width for _, _, starts_at in rows)
+            price_buckets = [
+                (lowest_price + i * width, lowest_price + (i + 1) * width - 1, counts[i])
+                for i in range(nb_price_buckets)
+                if lowest_price + i * width <= highest_price
+            ]
+        return {'amenities': amenities_counts, 'stars': stars_counts, 'prices': price_buckets}
+
+    def find_search_candidates_by_city_id(self, city_id: int) -> List[tuple]:
+        """
+        (id, rating_avg, reviews_count) of every visible hotel of the city, read from the stats rollup.
+        """
+        return list(self.filter(city_id=city_id, status=HotelStatus.VISIBLE).values_list(
+            'id', Coalesce(F('stats__rating_avg'), Value(0.0)), Coalesce(F('stats__reviews_count'), Value(0))
+        ))
 
     def find_top_hotels_by_city_id(self, city_id: int):
         return (self.annotate(
-            rating_avg=Coalesce(SubqueryAvg('reservations__review__rating'), Value(0)),
-            reviews_count=SubqueryCount('reservations__review'),
-            starts_at=SubqueryMin('room_types__price_per_night'),
+            rating_avg=Coalesce(F('stats__rating_avg'), Value(0.0)),
+            reviews_count=Coalesce(F('stats__reviews_count'), Value(0)),
+            starts_at=F('stats__starts_at'),
         ).filter(city_id=city_id, status=HotelStatus.VISIBLE).order_by('-reviews_count').all())
 
-    def find_owner_hotels(self, owner: Owner):
-        return self.filter(
+    def find_owner_hotels(self, owner: Owner, limit: int = None) -> List['Hotel']:
+        """
+        The portfolio of an owner with its metrics in a fixed number of queries: the hotels joined to
+        their statistics, their amenities, then one grouped pass over the reservations and two over the
+        rooms, merged by hotel id.
+        """
+        hotels = self.filter(
             owner=owner,
             status=HotelStatus.VISIBLE
         ).annotate(
-            reviews_count=SubqueryCount('reservations__review'),
-            rating_avg=Coalesce(SubqueryAvg('reservations__review__rating'), Value(0)),
-            reservations_count=SubqueryCount('reservations'),
-            check_ins_count=SubqueryCount('reservations',
-                                          filter=~Q(
-                                              status__in=[ReservationStatus.ACTIVE, ReservationStatus.COMPLETED])),
-            cancellations_count=SubqueryCount('reservations',
-                                              filter=Q(status__in=[ReservationStatus.CANCELLED_BY_GUEST,
-                                                                   ReservationStatus.CANCELLED_BY_OWNER])),
-            revenue=Coalesce(SubquerySum('reservations__total_price',
-                                         filter=Q(status=ReservationStatus.COMPLETED)), Value(0)),
-            rooms_count=SubqueryCount('room_types__rooms',
-                                      filter=Q(status=RoomStatus.VISIBLE)),
-            occupied_rooms_count=SubqueryCount(
-                'reservations__reserved_room_types__assigned_rooms__room_id',
-                filter=Q(reserved_room_type__reservation__status=ReservationStatus.ACTIVE)
-            )
-        ).order_by('-revenue')
+            reviews_count=Coalesce(F('stats__reviews_count'), Value(0)),
+            rating_avg=Coalesce(F('stats__rating_avg'), Value(0.0)),
+            reservations_count=Coalesce(F('stats__reservations_count'), Value(0)),
+            cancellations_count=Coalesce(F('stats__cancellations_count'), Value(0)),
+            revenue=Coalesce(F('stats__revenue'), Value(0)),
+        ).select_related('city__country').prefetch_related('amenities').order_by('-revenue', 'id')
+        hotels = list(hotels[:limit] if limit is not None else hotels)
+        hotel_ids = [hotel.id for hotel in hotels]
+        check_ins = dict(Reservation.objects.filter(
+            hotel_id__in=hotel_ids, status__in=[ReservationStatus.ACTIVE, ReservationStatus.COMPLETED]
+        ).values('hotel_id').annotate(count=Count('id')).values_list('hotel_id', 'count'))
+        rooms = dict(Room.objects.filter(
+            room_type__hotel_id__in=hotel_ids, status=RoomStatus.VISIBLE
+        ).values('room_type__hotel_id').annotate(count=Count('id')).values_list('room_type__hotel_id', 'count'))
+        occupied_rooms = dict(RoomAssignment.objects.filter(
+            reserved_room_type__reservation__hotel_id__in=hotel_ids,
+            reserved_room_type__reservation__status=ReservationStatus.ACTIVE
+        ).values('reserved_room_type__reservation__hotel_id').annotate(
+            count=Count('room_id', distinct=True)
+        ).values_list('reserved_room_type__reservation__hotel_id', 'count'))
+        for hotel in hotels:
+            hotel.check_ins_count = check_ins.get(hotel.id, 0)
+            hotel.rooms_count = rooms.get(hotel.id, 0)
+            hotel.occupied_rooms_count = occupied_rooms.get(hotel.id, 0)
+        return hotels
 
     def count_owner_profits_in(self, owner: Owner, date) -> dict:
-        return self.filter(
-            owner=owner,
-            reservations__check_out__date=date,
-            reservations__status__in=[ReservationStatus.COMPLETED]
-        ).aggregate(income=Count('reservations__total_price'))
+        return HotelDailyStats.objects.filter(hotel__owner=owner, day=date).aggregate(
+            income=Coalesce(Sum('revenue'), Value(0))
+        )
 
     def find_hotel_details_for_dashboard(self, hotel_id: int):
         try:
             return self.annotate(
-                revenue=SubquerySum('reservations__total_price',
-                                    filter=Q(status=ReservationStatus.COMPLETED)),
-                reservations_count=SubqueryCount('reservations'),
-                cancellations_count=SubqueryCount('reservations',
-                                                  filter=Q(status__in=[ReservationStatus.CANCELLED_BY_GUEST,
-                                                                       ReservationStatus.CANCELLED_BY_OWNER])),
-
-                completed_count=SubqueryCount('reservations', filter=Q(status=ReservationStatus.COMPLETED)),
-                rating_avg=SubqueryAvg('reservations__review__rating'),
-                reviews_count=SubqueryCount('reservations__review'),
+                revenue=F('stats__revenue'),
+                reservations_count=Coalesce(F('stats__reservations_count'), Value(0)),
+                cancellations_count=Coalesce(F('stats__cancellations_count'), Value(0)),
+                completed_count=Coalesce(F('stats__completed_count'), Value(0)),
+                rating_avg=F('stats__rating_avg'),
+                reviews_count=Coalesce(F('stats__reviews_count'), Value(0)),
             ).prefetch_related(
                 Prefetch('room_types',
                          queryset=RoomType.objects.filter(hotel_id=hotel_id, status=RoomTypeStatus.VISIBLE)
@@ -232,12 +324,7 @@ class HotelManager(models.Manager):
                              occupied_rooms_count=SubqueryCount(
                                  'reserved_room_types__assigned_rooms__room_id',
                                  filter=Q(reserved_room_type__reservation__status=ReservationStatus.ACTIVE)
-                             ),
-                             monthly_revenue=
-                             SubqueryCount('reserved_room_types',
-                                           filter=Q(reservation__status=ReservationStatus.COMPLETED) &
-                                                  Q(reservation__check_out__month=datetime.today().month - 1)
-                                           )
+                             )
                          ))
             ).get(pk=hotel_id, status=HotelStatus.VISIBLE)
         except ObjectDoesNotExist as e:
@@ -255,6 +342,8 @@ class Hotel(models.Model):
     id = models.AutoField(primary_key=True)
     owner = models.ForeignKey(Owner, related_name='hotels', on_delete=models.SET_NULL, null=True)
     name = models.CharField(max_length=255)
+    search_key = SearchKeyField(source='name')
+    search_skeleton = SearchSkeletonField(source='name')
     stars = models.IntegerField()
     address = models.CharField(max_length=255)
     about = models.TextField(null=True)
@@ -393,27 +482,69 @@ class RoomTypeManager(models.Manager):
             occupied_rooms_count=SubqueryCount(
                 'reserved_room_types__assigned_rooms__room_id',
                 filter=Q(reserved_room_type__reservation__status=ReservationStatus.ACTIVE)
-            ),
-            monthly_revenue=
-            SubqueryCount('reserved_room_types',
-                          filter=Q(reservation__status=ReservationStatus.COMPLETED) &
-                                 Q(reservation__check_out__month=datetime.today().month - 1)
-                          )
+            )
         ).all()
         # link categories with the room type
         # for room_type in room_types:
         #     room_type.categories = self.get_categories_and_amenities(room_type.id)
         return room_types
 
-    def find_available_room_types_by_hotel_id(self, hotel_id, check_in, check_out):
-        room_types = self.filter(hotel_id=hotel_id, status=RoomTypeStatus.VISIBLE).all()
-        available_room_types = []
-        for room_type in room_types:
-            room_type.available_rooms_count = len(
-                Room.objects.find_available_rooms_by_room_type(room_type.id, check_in, check_out))
-            if room_type.available_rooms_count > 0:
-                available_room_types.append(room_type)
-        return available_room_types
+    def with_available_rooms_count(self, check_in, check_out) -> QuerySet:
+        """
+        Annotate every room type with the number of its rooms that are free for the whole stay,
+        the busiest night of the range decides.
+        """
+        return self.annotate(
+            rooms_count=SubqueryCount('rooms', filter=Q(status=RoomStatus.VISIBLE)),
+            max_sold=Coalesce(Subquery(RoomTypeInventory.objects.with_live_sold().filter(
+                room_type_id=OuterRef('pk'),
+                night__gte=to_date(check_in),
+                night__lt=to_date(check_out)
+            ).order_by('-live_sold').values('live_sold')[:1]), Value(0)),
+            available_rooms_count=Case(
+                When(rooms_count__gt=F('max_sold'), then=F('rooms_count') - F('max_sold')),
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
+
+    def find_available_room_types_by_hotel_ids(self, hotel_ids: List[int], check_in, check_out) -> QuerySet:
+        return self.with_available_rooms_count(check_in, check_out).filter(
+            hotel_id__in=hotel_ids,
+            status=RoomTypeStatus.VISIBLE,
+            available_rooms_count__gt=0
+        )
+
+    def find_available_room_types_by_hotel_id(self, hotel_id, check_in, check_out) -> QuerySet:
+        return self.find_available_room_types_by_hotel_ids([hotel_id], check_in, check_out).select_related(
+            'policies'
+        ).prefetch_related('beds__bed_type', 'amenities__category')
+
+    def find_free_rooms_calendar(self, hotel_id: int, first_night: date, nb_nights: int) -> List:
+        """
+        Free rooms of every visible room type of the hotel for each night of the period.
+        The reservations are expanded into a difference array over the nights, its running sum
+        gives the occupied rooms of each night.
+        """
+        room_types = list(self.filter(hotel_id=hotel_id, status=RoomTypeStatus.VISIBLE).annotate(
+            rooms_count=SubqueryCount('rooms', filter=Q(status=RoomStatus.VISIBLE))
+        ).order_by('id'))
+        end_night = first_night + timedelta(days=nb_nights)
+        reserved_room_types = ReservedRoomType.objects.filter(
+            room_type__in=room_types,
+            reservation__in=Reservation.objects.holding_rooms(),
+            reservation__check_in__date__lt=end_night,
+            reservation__check_out__date__gt=first_night,
+        ).values_list('room_type_id', 'nb_rooms', 'reservation__check_in', 'reservation__check_out')
+        deltas = {room_type.id: [0] * (nb_nights + 1) for room_type in room_types}
+        for room_type_id, nb_rooms, check_in, check_out in reserved_room_types:
+            deltas[room_type_id][max((to_date(check_in) - first_night).days, 0)] += nb_rooms
+            deltas[room_type_id][min((to_date(check_out) - first_night).days, nb_nights)] -= nb_rooms
+        return [
+            (room_type, [max(room_type.rooms_count - occupied, 0)
+                         for occupied in accumulate(deltas[room_type.id][:nb_nights])])
+            for room_type in room_types
+        ]
 
 
 class RoomType(models.Model):
@@ -495,15 +626,576 @@ class Room(models.Model):
         ]
 
 
+class RoomTypeInventoryManager(models.Manager):
+
+    def with_live_sold(self) -> QuerySet:
+        """
+        Annotate the sold rooms without those of the expired holds, they are still counted in
+        sold until the sweep releases them but they are already free.
+        """
+        expired_claims = RoomNightClaim.objects.filter(
+            room__room_type_id=OuterRef('room_type_id'),
+            night=OuterRef('night'),
+            expires_at__lte=timezone.now()
+        ).values('night').annotate(count=Count('id')).values('count')
+        return self.annotate(expired_sold=Coalesce(Subquery(expired_claims), Value(0))).annotate(
+            live_sold=Case(
+                When(sold__gt=F('expired_sold'), then=F('sold') - F('expired_sold')),
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
+
+    def count_available_rooms(self, room_type_id: int, check_in, check_out) -> int:
+        """
+        Number of rooms of the room type that are free for every night of the stay, read from
+        the inventory rows, only the nights without a row yet need the rooms to be counted.
+        """
+        nights = get_nights(check_in, check_out)
+        available = list(self.with_live_sold().filter(
+            room_type_id=room_type_id,
+            night__gte=to_date(check_in),
+            night__lt=to_date(check_out)
+        ).values_list('total', 'live_sold'))
+        available = [total - live_sold for total, live_sold in available]
+        if len(available) < len(nights):
+            available.append(Room.objects.filter(room_type_id=room_type_id, status=RoomStatus.VISIBLE).count())
+        return max(min(available, default=0), 0)
+
+    def _lock_nights(self, room_type_id: int, nights: List[date]) -> List[Tuple[int, int]]:
+        # Lock the nights in order, two bookings overlapping on several nights can not deadlock
+        return list(self.with_live_sold().select_for_update().filter(
+            room_type_id=room_type_id, night__in=nights
+        ).order_by('night').values_list('total', 'live_sold'))
+
+    def claim_available_nights(self, room_type_id: int, nights: List[date], nb_rooms: int) -> bool:
+        """
+        Lock the inventory rows of the nights and claim them only if every night still has enough
+        free rooms, a concurrent booking of one of these nights waits for the transaction to end.
+        The rooms of the expired holds are free already, the sweep gives back their sold count later.
+        Returns whether the nights were claimed.
+        """
+        rows = self._lock_nights(room_type_id, nights)
+        if len(rows) < len(nights):
+            # The first booking of a night creates its row with the rooms of the room type
+            rooms_count = Room.objects.filter(room_type_id=room_type_id, status=RoomStatus.VISIBLE).count()
+            self.bulk_create(
+                [RoomTypeInventory(room_type_id=room_type_id, night=night, total=rooms_count, sold=0)
+                 for night in nights],
+                ignore_conflicts=True
+            )
+            rows = self._lock_nights(room_type_id, nights)
+        if min(total - live_sold for total, live_sold in rows) < nb_rooms:
+            return False
+        self.filter(room_type_id=room_type_id, night__in=nights).update(sold=F('sold') + nb_rooms)
+        return True
+
+    def release_nights(self, room_type_id: int, nights: List[date], nb_rooms: int):
+        # Stay away from negative values, the sold column is unsigned
+        self.filter(room_type_id=room_type_id, night__in=nights).update(
+            sold=Case(When(sold__gt=nb_rooms, then=F('sold') - nb_rooms), default=Value(0))
+        )
+
+    def claim_reservation(self, reservation):
+        """
+        Claim the nights of a reservation taking its rooms back, the nights resold meanwhile make it fail
+        with ClaimConflict rather than selling more rooms than the hotel has.
+        """
+        nights = get_nights(reservation.check_in, reservation.check_out)
+        for reserved_room_type in reservation.reserved_room_types.order_by('room_type_id'):
+            if not self.claim_available_nights(reserved_room_type.room_type_id, nights, reserved_room_type.nb_rooms):
+                raise ClaimConflict(f'The nights of room type {reserved_room_type.room_type_id} were resold')
+
+    def release_reservation(self, reservation, from_night: date = None):
+        nights = get_nights(reservation.check_in, reservation.check_out)
+        if from_night is not None:
+            nights = [night for night in nights if night >= from_night]
+        if not nights:
+            return
+        for reserved_room_type in reservation.reserved_room_types.all():
+            self.release_nights(reserved_room_type.room_type_id, nights, reserved_room_type.nb_rooms)
+
+    def sync_total(self, room_type_id: int):
+        # Called by the Room signals, only the upcoming nights matter, the past ones are kept as they were sold
+        rooms_count = Room.objects.filter(room_type_id=room_type_id, status=RoomStatus.VISIBLE).count()
+        self.filter(room_type_id=room_type_id, night__gte=date.today()).update(total=rooms_count)
+
+    def rebuild(self):
+        """
+        Recompute the whole inventory from the reservations, to repair any drift.
+        """
+        sold = defaultdict(int)
+        reserved_room_types = ReservedRoomType.objects.filter(
+            reservation__in=Reservation.objects.holding_rooms()
+        ).values_list('room_type_id', 'nb_rooms', 'reservation__check_in', 'reservation__check_out')
+        for room_type_id, nb_rooms, check_in, check_out in reserved_room_types.iterator():
+            for night in get_nights(check_in, check_out):
+                sold[(room_type_id, night)] += nb_rooms
+        rooms_counts = dict(
+            Room.objects.filter(status=RoomStatus.VISIBLE).values('room_type_id')
+            .annotate(rooms_count=Count('id')).values_list('room_type_id', 'rooms_count')
+        )
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                [RoomTypeInventory(room_type_id=room_type_id, night=night, sold=nb_rooms,
+                                   total=rooms_counts.get(room_type_id, 0))
+                 for (room_type_id, night), nb_rooms in sold.items()],
+                batch_size=1000
+            )
+
+
+class RoomTypeInventory(models.Model):
+    room_type = models.ForeignKey(RoomType, on_delete=models.CASCADE, related_name='inventory')
+    night = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+    objects = RoomTypeInventoryManager()
+
+    class Meta:
+        db_table = 'room_type_inventory'
+        unique_together = ('room_type', 'night')
+
+
+class HotelAmenityMaskManager(models.Manager):
+
+    def rebuild(self, hotel_ids: List[int] = None):
+        """
+        Recompute the amenity masks of the given hotels, or of every hotel when no ids are given.
+        """
+        hotel_amenities = Hotel.amenities.through.objects.all()
+        room_type_amenities = RoomType.amenities.through.objects.all()
+        masks = self.all()
+        if hotel_ids is not None:
+            hotel_amenities = hotel_amenities.filter(hotel_id__in=hotel_ids)
+            room_type_amenities = room_type_amenities.filter(roomtype__hotel_id__in=hotel_ids)
+            masks = masks.filter(hotel_id__in=hotel_ids)
+        # The hotel facilities are kept under the None price, the room types ones under their price
+        amenity_ids = defaultdict(list)
+        for hotel_id, amenity_id in hotel_amenities.values_list('hotel_id', 'amenity_id').iterator():
+            amenity_ids[(hotel_id, None)].append(amenity_id)
+        for hotel_id, price_per_night, amenity_id in room_type_amenities.values_list(
+                'roomtype__hotel_id', 'roomtype__price_per_night', 'amenity_id').iterator():
+            amenity_ids[(hotel_id, price_per_night)].append(amenity_id)
+        with transaction.atomic():
+            masks.delete()
+            self.bulk_create(
+                [HotelAmenityMask(hotel_id=hotel_id, price_per_night=price_per_night,
+                                  mask=format(to_amenity_mask(ids), 'x'))
+                 for (hotel_id, price_per_night), ids in amenity_ids.items()],
+                batch_size=1000
+            )
+
+
+class HotelAmenityMask(models.Model):
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='amenity_masks')
+    price_per_night = models.BigIntegerField(null=True)
+    # Hexadecimal bitset of the amenity ids, a text column since its length grows with the highest amenity id
+    mask = models.TextField()
+    objects = HotelAmenityMaskManager()
+
+    class Meta:
+        db_table = 'hotel_amenity_masks'
+        unique_together = ('hotel', 'price_per_night')
+
+
+CANCELLED_RESERVATION_STATUSES = [ReservationStatus.CANCELLED_BY_GUEST, ReservationStatus.CANCELLED_BY_OWNER]
+
+
+class HotelStatsManager(models.Manager):
+
+    def _get_reservation_counters(self, status, total_price) -> dict:
+        completed = status == ReservationStatus.COMPLETED
+        return {
+            'completed_count': int(completed),
+            'cancellations_count': int(status in CANCELLED_RESERVATION_STATUSES),
+            'revenue': total_price if completed else 0,
+        }
+
+    def increment(self, hotel_id: int, **deltas):
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if hotel_id is None or not deltas:
+            return
+        self.bulk_create([HotelStats(hotel_id=hotel_id)], ignore_conflicts=True)
+        self.filter(hotel_id=hotel_id).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+    def record_new_reservation(self, reservation):
+        self.increment(reservation.hotel_id, reservations_count=1,
+                       **self._get_reservation_counters(reservation.status, reservation.total_price))
+
+    def record_status_change(self, reservation, old_status, new_status):
+        old_counters = self._get_reservation_counters(old_status, reservation.total_price)
+        new_counters = self._get_reservation_counters(new_status, reservation.total_price)
+        self.increment(reservation.hotel_id, **{field: new_counters[field] - old_counters[field]
+                                                for field in new_counters})
+
+    def refresh_reviews(self, hotel_id: int):
+        # A review can be edited, its hotel is recomputed instead of tracking the old rating
+        reviews = GuestReview.objects.filter(reservation__hotel_id=hotel_id).aggregate(
+            rating_avg=Avg('rating'), reviews_count=Count('id')
+        )
+        self.update_or_create(hotel_id=hotel_id, defaults=reviews)
+
+    def refresh_starts_at(self, hotel_id: int):
+        starts_at = RoomType.objects.filter(hotel_id=hotel_id, status=RoomTypeStatus.VISIBLE).aggregate(
+            starts_at=Min('price_per_night')
+        )['starts_at']
+        self.update_or_create(hotel_id=hotel_id, defaults={'starts_at': starts_at})
+
+    def rebuild(self, hotel_ids: List[int] = None):
+        """
+        Recompute the statistics from the reviews, reservations and room types, to repair any drift.
+        """
+        hotels = Hotel.objects.all() if hotel_ids is None else Hotel.objects.filter(id__in=hotel_ids)
+        stats = {hotel_id: HotelStats(hotel_id=hotel_id) for hotel_id in hotels.values_list('id', flat=True)}
+        reviews = GuestReview.objects.filter(reservation__hotel_id__in=stats.keys()).values(
+            'reservation__hotel_id'
+        ).annotate(rating_avg=Avg('rating'), reviews_count=Count('id'))
+        for row in reviews:
+            stats[row['reservation__hotel_id']].rating_avg = row['rating_avg']
+            stats[row['reservation__hotel_id']].reviews_count = row['reviews_count']
+        reservations = Reservation.objects.filter(hotel_id__in=stats.keys()).values('hotel_id').annotate(
+            reservations_count=Count('id'),
+            completed_count=Count('id', filter=Q(status=ReservationStatus.COMPLETED)),
+            cancellations_count=Count('id', filter=Q(status__in=CANCELLED_RESERVATION_STATUSES)),
+            revenue=Coalesce(Sum('total_price', filter=Q(status=ReservationStatus.COMPLETED)), Value(0)),
+        )
+        for row in reservations:
+            hotel_stats = stats[row.pop('hotel_id')]
+            for field, value in row.items():
+                setattr(hotel_stats, field, value)
+        prices = RoomType.objects.filter(hotel_id__in=stats.keys(), status=RoomTypeStatus.VISIBLE).values(
+            'hotel_id'
+        ).annotate(starts_at=Min('price_per_night'))
+        for row in prices:
+            stats[row['hotel_id']].starts_at = row['starts_at']
+        self.bulk_create(
+            stats.values(),
+            update_conflicts=True,
+            unique_fields=['hotel'],
+            update_fields=['rating_avg', 'reviews_count', 'starts_at', 'reservations_count', 'completed_count',
+                           'cancellations_count', 'revenue'],
+            batch_size=1000
+        )
+
+
+class HotelStats(models.Model):
+    hotel = models.OneToOneField(Hotel, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    rating_avg = models.FloatField(null=True)
+    reviews_count = models.IntegerField(default=0)
+    starts_at = models.BigIntegerField(null=True)
+    reservations_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    cancellations_count = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    objects = HotelStatsManager()
+
+    class Meta:
+        db_table = 'hotel_stats'
+
+
+# Reservations whose stay counts in the daily statistics
+BOOKED_RESERVATION_STATUSES = [*OCCUPYING_RESERVATION_STATUSES, ReservationStatus.COMPLETED]
+
+
+def split_revenue(revenue: int, weights: List[int]) -> List[int]:
+    """
+    Share the revenue in proportion to the weights, the rounding remainder goes to the heaviest share
+    so the shares always add up to the revenue.
+    """
+    if not sum(weights):
+        weights = [1] * len(weights)
+    total_weight = sum(weights)
+    shares = [revenue * weight // total_weight for weight in weights]
+    if shares:
+        shares[weights.index(max(weights))] += revenue - sum(shares)
+    return shares
+
+
+def get_daily_contributions(reservation, status,
+                            reserved_room_types: List[Tuple[int, int, int]]) -> Tuple[dict, dict]:
+    """
+    What a reservation in the given status adds to the hotel and room type daily buckets, keyed by
+    (hotel_id, day) and (room_type_id, day). Only the status and the booked dates are used, so the
+    incremental updates and a rebuild always agree: check-ins, check-outs and occupied room nights
+    count the booked stays on their dates, the revenue of a completed stay goes to its check-out day
+    and a cancellation to the check-in day it freed. The reserved room types are given as
+    (room_type_id, nb_rooms, price_per_night) with the price they were booked at, the revenue of a room
+    type is its share of the price of the stay, price_per_night * nb_rooms * nights.
+    """
+    hotel_buckets = defaultdict(Counter)
+    room_type_buckets = defaultdict(Counter)
+    check_in, check_out = to_date(reservation.check_in), to_date(reservation.check_out)
+    nights = get_nights(check_in, check_out)
+    total_rooms = sum(nb_rooms for _, nb_rooms, _ in reserved_room_types)
+    if status in BOOKED_RESERVATION_STATUSES:
+        revenue = reservation.total_price if status == ReservationStatus.COMPLETED else 0
+        hotel_buckets[check_in]['check_ins'] += 1
+        hotel_buckets[check_out]['check_outs'] += 1
+        hotel_buckets[check_out]['revenue'] += revenue
+        for night in nights:
+            hotel_buckets[night]['occupied_room_nights'] += total_rooms
+        revenues = split_revenue(revenue, [(price_per_night or 0) * nb_rooms * len(nights)
+                                           for _, nb_rooms, price_per_night in reserved_room_types])
+        for (room_type_id, nb_rooms, _), room_type_revenue in zip(reserved_room_types, revenues):
+            room_type_buckets[(room_type_id, check_in)]['check_ins'] += nb_rooms
+            room_type_buckets[(room_type_id, check_out)]['check_outs'] += nb_rooms
+            room_type_buckets[(room_type_id, check_out)]['revenue'] += room_type_revenue
+            for night in nights:
+                room_type_buckets[(room_type_id, night)]['occupied_room_nights'] += nb_rooms
+    elif status in CANCELLED_RESERVATION_STATUSES:
+        hotel_buckets[check_in]['cancellations'] += 1
+        for room_type_id, nb_rooms, _ in reserved_room_types:
+            room_type_buckets[(room_type_id, check_in)]['cancellations'] += nb_rooms
+    hotel_buckets = {(reservation.hotel_id, day): counters for day, counters in hotel_buckets.items()}
+    return hotel_buckets, dict(room_type_buckets)
+
+
+def subtract_buckets(new_buckets: dict, old_buckets: dict) -> dict:
+    deltas = {}
+    for key in new_buckets.keys() | old_buckets.keys():
+        counters = Counter(new_buckets.get(key, {}))
+        counters.subtract(old_buckets.get(key, {}))
+        counters = {field: delta for field, delta in counters.items() if delta}
+        if counters:
+            deltas[key] = counters
+    return deltas
+
+
+def invalidate_closed_revenues(hotel_ids: List[int]):
+    # The revenues of the closed months are cached until their buckets change, after the commit
+    transaction.on_commit(lambda: [bump_cache_version(f'room_type_revenues_version:{hotel_id}')
+                                   for hotel_id in hotel_ids])
+
+
+class DailyStatsManager(models.Manager):
+    # The foreign key the days are bucketed per
+    owner_field = None
+
+    def increment(self, buckets: Dict[Tuple[int, date], dict]):
+        """
+        Add the deltas to their buckets, the days receiving the same deltas share one update,
+        a stay touches a few rows per query rather than one query per night.
+        """
+        buckets = {key: deltas for key, deltas in buckets.items() if key[0] is not None and deltas}
+        if not buckets:
+            return
+        self.bulk_create([self.model(**{f'{self.owner_field}_id': owner_id, 'day': day})
+                          for owner_id, day in buckets], ignore_conflicts=True)
+        keys_by_deltas = defaultdict(lambda: defaultdict(list))
+        for (owner_id, day), deltas in buckets.items():
+            keys_by_deltas[tuple(sorted(deltas.items()))][owner_id].append(day)
+        for deltas, days_by_owner in keys_by_deltas.items():
+            for owner_id, days in days_by_owner.items():
+                self.filter(**{f'{self.owner_field}_id': owner_id}, day__in=days).update(
+                    **{field: F(field) + delta for field, delta in deltas}
+                )
+
+
+class HotelDailyStatsManager(DailyStatsManager):
+    owner_field = 'hotel'
+
+    def record_status_change(self, reservation, old_status, new_status, reserved_room_types=None):
+        """
+        Move the contribution of the reservation from its old status to the new one, in the hotel
+        and room type buckets.
+        """
+        tracked_statuses = [*BOOKED_RESERVATION_STATUSES, *CANCELLED_RESERVATION_STATUSES]
+        if old_status not in tracked_statuses and new_status not in tracked_statuses:
+            return
+        if reserved_room_types is None:
+            reserved_room_types = list(reservation.reserved_room_types.order_by('room_type_id').values_list(
+                'room_type_id', 'nb_rooms', 'price_per_night'
+            ))
+        new_hotel_buckets, new_room_type_buckets = get_daily_contributions(reservation, new_status,
+                                                                           reserved_room_types)
+        old_hotel_buckets, old_room_type_buckets = get_daily_contributions(reservation, old_status,
+                                                                           reserved_room_types)
+        room_type_deltas = subtract_buckets(new_room_type_buckets, old_room_type_buckets)
+        HotelDailyStats.objects.increment(subtract_buckets(new_hotel_buckets, old_hotel_buckets))
+        RoomTypeDailyStats.objects.increment(room_type_deltas)
+        # A stay completed after the end of its month changes a closed month
+        if any(day < date.today().replace(day=1) for _, day in room_type_deltas):
+            invalidate_closed_revenues([reservation.hotel_id])
+
+    def rebuild(self, hotel_ids: List[int]):
+        """
+        Recompute every bucket of the hotels and their room types from the reservations, in one transaction.
+        """
+        hotel_buckets = defaultdict(Counter)
+        room_type_buckets = defaultdict(Counter)
+        reserved_room_types = defaultdict(list)
+        for reservation_id, room_type_id, nb_rooms, price_per_night in ReservedRoomType.objects.filter(
+                reservation__hotel_id__in=hotel_ids
+        ).order_by('reservation_id', 'room_type_id').values_list(
+            'reservation_id', 'room_type_id', 'nb_rooms', 'price_per_night'
+        ).iterator(chunk_size=2000):
+            reserved_room_types[reservation_id].append((room_type_id, nb_rooms, price_per_night))
+        reservations = Reservation.objects.filter(hotel_id__in=hotel_ids).only(
+            'id', 'hotel_id', 'status', 'check_in', 'check_out', 'total_price'
+        )
+        for reservation in reservations.iterator(chunk_size=2000):
+            contributions = get_daily_contributions(reservation, reservation.status,
+                                                    reserved_room_types[reservation.id])
+            for buckets, contribution in zip((hotel_buckets, room_type_buckets), contributions):
+                for key, counters in contribution.items():
+                    buckets[key].update(counters)
+        with transaction.atomic():
+            HotelDailyStats.objects.filter(hotel_id__in=hotel_ids).delete()
+            RoomTypeDailyStats.objects.filter(room_type__hotel_id__in=hotel_ids).delete()
+            HotelDailyStats.objects.bulk_create(
+                [HotelDailyStats(hotel_id=hotel_id, day=day, **counters)
+                 for (hotel_id, day), counters in hotel_buckets.items()], batch_size=1000
+            )
+            RoomTypeDailyStats.objects.bulk_create(
+                [RoomTypeDailyStats(room_type_id=room_type_id, day=day, **counters)
+                 for (room_type_id, day), counters in room_type_buckets.items()], batch_size=1000
+            )
+            invalidate_closed_revenues(hotel_ids)
+
+    def find_owner_daily_incomes(self, owner_id: int, first_day: date, last_day: date) -> List[Tuple[date, int]]:
+        incomes = dict(self.filter(hotel__owner_id=owner_id, day__range=(first_day, last_day)).values(
+            'day'
+        ).annotate(income=Sum('revenue')).values_list('day', 'income'))
+        return [(day, incomes.get(day, 0))
+                for day in (first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1))]
+
+
+class RoomTypeDailyStatsManager(DailyStatsManager):
+    owner_field = 'room_type'
+
+    def sum_revenues_by_room_type(self, hotel_id: int, first_day: date, last_day: date) -> Dict[int, int]:
+        return dict(self.filter(room_type__hotel_id=hotel_id, day__range=(first_day, last_day)).values(
+            'room_type_id'
+        ).annotate(total=Sum('revenue')).values_list('room_type_id', 'total'))
+
+
+class DailyStats(models.Model):
+    day = models.DateField()
+    revenue = models.BigIntegerField(default=0)
+    check_ins = models.IntegerField(default=0)
+    check_outs = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    occupied_room_nights = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class HotelDailyStats(DailyStats):
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='daily_stats')
+    objects = HotelDailyStatsManager()
+
+    class Meta:
+        db_table = 'hotel_daily_stats'
+        # Also the index of the range scans of a hotel
+        unique_together = ('hotel', 'day')
+
+
+class RoomTypeDailyStats(DailyStats):
+    room_type = models.ForeignKey(RoomType, on_delete=models.CASCADE, related_name='daily_stats')
+    objects = RoomTypeDailyStatsManager()
+
+    class Meta:
+        db_table = 'room_type_daily_stats'
+        unique_together = ('room_type', 'day')
+
+
+# Time left to a guest to pay for the rooms held by the checkout
+RESERVATION_HOLD_DURATION = timedelta(minutes=15)
+
+
 class ReservationManager(models.Manager):
 
+    def update_status(self, reservation, new_status: ReservationStatus):
+        """
+        Move the reservation to its new status and keep the nightly inventory and room claims in sync.
+        """
+        with transaction.atomic():
+            # Read the status under lock, the holds sweep may have released the reservation meanwhile
+            old_status, hold_expires_at = self.select_for_update().values_list(
+                'status', 'hold_expires_at').get(pk=reservation.pk)
+            reservation.status = new_status
+            if new_status != ReservationStatus.ON_HOLD:
+                reservation.hold_expires_at = None
+            reservation.save()
+            if old_status == ReservationStatus.ON_HOLD and hold_expires_at <= timezone.now() \
+                    and new_status in OCCUPYING_RESERVATION_STATUSES:
+                # Paid after its hold expired, another booking may have taken its rooms before the sweep:
+                # give them back and claim them again, a ClaimConflict leaves the reservation on hold
+                RoomTypeInventory.objects.release_reservation(reservation)
+                RoomNightClaim.objects.release_reservation(reservation)
+                RoomTypeInventory.objects.claim_reservation(reservation)
+                RoomNightClaim.objects.claim_reservation(reservation)
+            elif old_status in ROOM_HOLDING_RESERVATION_STATUSES and new_status not in ROOM_HOLDING_RESERVATION_STATUSES:
+                # A completed reservation only gives back the nights after an early check-out
+                from_night = date.today() if new_status == ReservationStatus.COMPLETED else None
+                RoomTypeInventory.objects.release_reservation(reservation, from_night)
+                RoomNightClaim.objects.release_reservation(reservation, from_night)
+            elif old_status not in ROOM_HOLDING_RESERVATION_STATUSES and new_status in ROOM_HOLDING_RESERVATION_STATUSES:
+                RoomTypeInventory.objects.claim_reservation(reservation)
+                RoomNightClaim.objects.claim_reservation(reservation)
+            elif old_status == ReservationStatus.ON_HOLD and new_status in OCCUPYING_RESERVATION_STATUSES:
+                # The payment went through, the rooms are kept past the hold expiry
+                RoomNightClaim.objects.filter(reserved_room_type__reservation=reservation).update(expires_at=None)
+            HotelStats.objects.record_status_change(reservation, old_status, new_status)
+            HotelDailyStats.objects.record_status_change(reservation, old_status, new_status)
+        return reservation
+
+    def holding_rooms(self) -> QuerySet:
+        """
+        Reservations holding their rooms right now, the expired holds are left out even before
+        the sweep releases them.
+        """
+        return self.filter(
+            Q(status__in=OCCUPYING_RESERVATION_STATUSES) |
+            Q(status=ReservationStatus.ON_HOLD, hold_expires_at__gt=timezone.now())
+        )
+
+    def release_expired_holds(self, hotel_id: int = None) -> int:
+        """
+        Give back the rooms of the checkouts whose payment did not arrive in time, in bulk.
+        """
+        expired_holds = self.filter(status=ReservationStatus.ON_HOLD, hold_expires_at__lte=timezone.now())
+        if hotel_id is not None:
+            expired_holds = expired_holds.filter(hotel_id=hotel_id)
+        with transaction.atomic():
+            reservations_ids = list(expired_holds.select_for_update().values_list('id', flat=True))
+            if not reservations_ids:
+                return 0
+            reserved_room_types = ReservedRoomType.objects.filter(
+                reservation_id__in=reservations_ids
+            ).values_list('room_type_id', 'nb_rooms', 'reservation__check_in', 'reservation__check_out')
+            # Sum up the rooms to give back per room type and night, then release each amount at once
+            released = defaultdict(lambda: defaultdict(list))
+            sold = defaultdict(int)
+            for room_type_id, nb_rooms, check_in, check_out in reserved_room_types:
+                for night in get_nights(check_in, check_out):
+                    sold[(room_type_id, night)] += nb_rooms
+            for (room_type_id, night), nb_rooms in sold.items():
+                released[room_type_id][nb_rooms].append(night)
+            for room_type_id, nights_by_nb_rooms in sorted(released.items()):
+                for nb_rooms, nights in nights_by_nb_rooms.items():
+                    RoomTypeInventory.objects.release_nights(room_type_id, nights, nb_rooms)
+            RoomNightClaim.objects.filter(reserved_room_type__reservation_id__in=reservations_ids).delete()
+            hotels_ids = set(self.filter(id__in=reservations_ids).values_list('hotel_id', flat=True))
+            # The bulk update sends no post_save, the calendars of the hotels are invalidated here. The stats
+            # need no update: an on hold reservation is neither booked nor cancelled, nor is an uncompleted one
+            self.filter(id__in=reservations_ids).update(status=ReservationStatus.UNCOMPLETED, hold_expires_at=None)
+            invalidate_hotel_calendars(hotels_ids)
+        return len(reservations_ids)
+
     def create_reservation(self, guest: Guest, first_name, last_name, email, country, country_code,
                            phone, check_in: datetime, check_out: datetime, total_price, hotel):
-        return self.create(
+        reservation = self.create(
             guest=guest, first_name=first_name, last_name=last_name, email=email, country=country,
             country_code=country_code, phone=phone, check_in=check_in, check_out=check_out, total_price=total_price,
-            hotel=hotel, status=ReservationStatus.CONFIRMED.value
+            hotel=hotel, status=ReservationStatus.ON_HOLD.value,
+            hold_expires_at=timezone.now() + RESERVATION_HOLD_DURATION
         )
+        HotelStats.objects.record_new_reservation(reservation)
+        return reservation
 
     def find_latest_reservations_to_owner_hotel(self, owner_id):
         return self.filter(
@@ -565,12 +1257,16 @@ class Reservation(models.Model):
     status = models.CharField(max_length=50, choices=ReservationStatus.choices,
                               default=ReservationStatus.CONFIRMED.value)
     hotel = models.ForeignKey(Hotel, on_delete=models.SET_NULL, null=True, related_name='reservations')
+    hold_expires_at = models.DateTimeField(null=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
     objects = ReservationManager()
 
     class Meta:
         db_table = 'reservations'
+        indexes = [
+            Index(fields=['status', 'hold_expires_at'], name='idx_reservation_hold')
+        ]
         constraints = [
             CheckConstraint(
                 check=Q(status__in=list(ReservationStatus)), name='chk_status'
@@ -582,6 +1278,8 @@ class ReservedRoomType(models.Model):
     reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name="reserved_room_types")
     room_type = models.ForeignKey(RoomType, on_delete=models.CASCADE, related_name="reserved_room_types")
     nb_rooms = models.PositiveIntegerField()
+    # Price of a night when booked, the revenue of the stay is split between its room types on it
+    price_per_night = models.BigIntegerField()
 
     def clean(self):
         if self.reservation.hotel != self.room_type.hotel:
@@ -603,6 +1301,51 @@ class RoomAssignment(models.Model):
         db_table = 'room_assignments'
 
 
+class RoomNightClaimManager(models.Manager):
+
+    def claim_rooms(self, assignments: List[RoomAssignment], nights: List[date], expires_at: datetime = None):
+        """
+        Claim every night of the assigned rooms, the unique (room, night) key rejects a room
+        that a concurrent booking claimed first. The claims of the expired holds are taken over,
+        they stay in place until the sweep otherwise.
+        """
+        try:
+            with transaction.atomic():
+                self.filter(room_id__in={assignment.room_id for assignment in assignments}, night__in=nights,
+                            expires_at__lte=timezone.now()).delete()
+                self.bulk_create([
+                    RoomNightClaim(room_id=assignment.room_id, night=night, expires_at=expires_at,
+                                   reserved_room_type_id=assignment.reserved_room_type_id)
+                    for assignment in assignments for night in nights
+                ])
+        except IntegrityError as e:
+            raise ClaimConflict('One of the assigned rooms is already claimed') from e
+
+    def claim_reservation(self, reservation):
+        assignments = RoomAssignment.objects.filter(reserved_room_type__reservation=reservation)
+        self.claim_rooms(list(assignments), get_nights(reservation.check_in, reservation.check_out),
+                         reservation.hold_expires_at)
+
+    def release_reservation(self, reservation, from_night: date = None):
+        claims = self.filter(reserved_room_type__reservation=reservation)
+        if from_night is not None:
+            claims = claims.filter(night__gte=from_night)
+        claims.delete()
+
+
+class RoomNightClaim(models.Model):
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='night_claims')
+    night = models.DateField()
+    reserved_room_type = models.ForeignKey(ReservedRoomType, on_delete=models.CASCADE, related_name='night_claims')
+    # Set for the rooms of a checkout on hold, the claim no longer counts once expired
+    expires_at = models.DateTimeField(null=True)
+    objects = RoomNightClaimManager()
+
+    class Meta:
+        db_table = 'room_night_claims'
+        unique_together = ('room', 'night')
+
+
 class GuestReviewManager(models.Manager):
 
     def get_reviews_by_hotel_id(self, hotel_id):
@@ -619,6 +1362,18 @@ class GuestReviewManager(models.Manager):
             reviews_count=Count('id')
         )
 
+    def find_recent_reviews_by_hotel_id(self, hotel_id: int, limit: int,
+                                        before: Tuple[datetime, int] = None) -> List['GuestReview']:
+        """
+        Keyset page of the newest reviews of a hotel, before is the (created_at, id) of the last review
+        of the previous page, the guests come along in the same query.
+        """
+        reviews = self.filter(reservation__hotel_id=hotel_id)
+        if before is not None:
+            created_at, review_id = before
+            reviews = reviews.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=review_id))
+        return list(reviews.select_related('reservation__guest').order_by('-created_at', '-id')[:limit])
+
     def find_latest_reviews_relate_to_owner(self, owner_id):
         return self.filter(
             reservation__hotel__owner_id=owner_id
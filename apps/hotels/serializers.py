@@ -37,6 +37,10 @@ class HotelSerializer(serializers.ModelSerializer):
                   'cover_img', 'starts_at', 'reviews_count', 'rating_avg']
 
 
+class TopHotelsParamsSerializer(serializers.Serializer):
+    city = serializers.IntegerField(required=False, help_text='Rank the hotels of this city only')
+
+
 class RoomTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = RoomType
@@ -172,6 +176,10 @@ class GetHotelAvailableRoomTypesParamsSerializer(serializers.Serializer):
     check_out = serializers.DateField()
 
 
+class HotelCalendarParamsSerializer(serializers.Serializer):
+    month = serializers.DateField(input_formats=['%Y-%m'], help_text='YYYY-MM')
+
+
 class FilterRequestSerializer(serializers.Serializer):
     check_in = serializers.DateField()
     check_out = serializers.DateField()
@@ -181,6 +189,7 @@ class FilterRequestSerializer(serializers.Serializer):
     ends_at = serializers.IntegerField(required=False, default=MAX_LONG)
     stars = serializers.IntegerField(required=False, default=None,
                                      validators=[MinValueValidator(1), MaxValueValidator(5)])
+    facets = serializers.BooleanField(required=False, default=False)
     amenities = Amenity.objects.all()
     # Dynamically create serializers fields for each amenity
     amenity_map = {}
@@ -208,6 +217,16 @@ class AmenityParamDtoSerializer(DataclassSerializer):
         dataclass = AmenityParamDto
 
 
+class RoomTypeCalendarDtoSerializer(DataclassSerializer):
+    class Meta:
+        dataclass = RoomTypeCalendarDto
+
+
+class SearchFacetsDtoSerializer(DataclassSerializer):
+    class Meta:
+        dataclass = SearchFacetsDto
+
+
 class AmenityCategoryDtoSerializer(DataclassSerializer):
     amenities = AmenityParamDtoSerializer(many=True)
 
@@ -389,6 +408,10 @@ class DailyIncomeSerializer(serializers.Serializer):
     income = serializers.IntegerField()
 
 
+class OwnerDashboardParamsSerializer(serializers.Serializer):
+    days = serializers.ChoiceField(choices=[30, 90, 365], default=30, help_text='Days covered by the daily incomes')
+
+
 class OwnerDashboardSerializer(DataclassSerializer):
     # hotels = EssentialHotelInfoSerializer(many=True)
     # reviews = EssentialReviewItemSerializer(many=True)
@@ -406,6 +429,34 @@ class HotelDashboardInfoSerializer(DataclassSerializer):
         dataclass = HotelDashboardInfoDto
 
 
+class RoomTypeRevenuesParamsSerializer(serializers.Serializer):
+    first_day = serializers.DateField()
+    last_day = serializers.DateField()
+
+    def validate(self, attrs):
+        if attrs['first_day'] > attrs['last_day']:
+            raise serializers.ValidationError({'detail': 'The first day must not be after the last day'})
+        return attrs
+
+
+class RoomTypeRevenueDtoSerializer(DataclassSerializer):
+    class Meta:
+        dataclass = RoomTypeRevenueDto
+
+
+class RecentReviewsParamsSerializer(serializers.Serializer):
+    cursor = serializers.CharField(required=False, help_text='The next_cursor of the previous page')
+    # Left out by default, the first page is then the one of the dashboard
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=50)
+
+
+class RecentReviewsPageSerializer(DataclassSerializer):
+    reviews = EssentialReviewItemSerializer(many=True)
+
+    class Meta:
+        dataclass = RecentReviewsPageDto
+
+
 class RoomTypeItemSerializer(serializers.ModelSerializer):
     categories = serializers.SerializerMethodField()
     beds = RoomTypeBedSerializer(many=True)
@@ -1,33 +1,48 @@
-from datetime import datetime as _datetime
+import logging
+from calendar import monthrange
+from collections import Counter
+from datetime import datetime as _datetime, timedelta
+from typing import Dict
 
 import stripe
 from decouple import config
-from django.db import transaction, connection
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import QuerySet
 from django.shortcuts import get_object_or_404
 from rest_framework import status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound
 
 from apps.hotels.models import Reservation, ReservedRoomType, RoomAssignment, HotelImage, ParkingSituation, \
-    RoomTypeImage, BedType
-from core.utils import CustomException
+    RoomTypeImage, BedType, RoomTypeInventory, RoomNightClaim, HotelDailyStats, RoomTypeDailyStats
+from core.utils import CustomException, get_cache_version
 from core.utils import get_list_or_404
 from .converters import *
 from .enums import HotelStatus, ReservationStatus, RoomTypeStatus, HotelCancellationPolicy, RoomTypeEnum, \
     RoomTypeCancellationPolicy, RoomTypePrepaymentPolicy, RoomStatus
 from .serializers import FilterRequestSerializer
+from .utils import get_nights, run_with_retries, set_read_committed, ClaimConflict, \
+    encode_cursor, decode_cursor
 from ..destinations.models import Country
 from ..owners.models import Owner
 from ..users.models import User
 
 MAX_LONG = 9223372036854775807
+PRICE_BUCKETS_COUNT = 10
+CALENDAR_CACHE_TIMEOUT = 60 * 60
+RESERVATION_MAX_ATTEMPTS = 4
+RESERVATION_RETRY_BACKOFF = 0.05
+RESERVATION_MAX_RETRY_BACKOFF = 0.5
+DASHBOARD_REVIEWS_PAGE_SIZE = 5
+CLOSED_MONTH_REVENUES_CACHE_TIMEOUT = 60 * 60 * 24 * 31
 
 hotel_converter = HotelDetailsDtoConverter()
 room_type_converter = RoomTypeConverter()
+logger = logging.getLogger(__name__)
 
 
-def find_top_hotels() -> QuerySet:
-    return Hotel.objects.find_top_hotels()
+def find_top_hotels(city_id: int = None) -> QuerySet:
+    return Hotel.objects.find_top_hotels(city_id)
 
 
 def get_hotel_details_by_id(hotel_id: int):
@@ -42,6 +57,32 @@ def get_room_types_by_hotel_id(hotel_id: int, dates: dict):
     return room_types_dto
 
 
+def get_hotel_calendar(hotel_id: int, month: date) -> List[RoomTypeCalendarDto]:
+    """
+    Free rooms per room type for every night of the month, cached until a reservation,
+    a room or a room type of the hotel changes. The version is bumped by the signals of these models,
+    a bulk update of them must call invalidate_hotel_calendars itself.
+    """
+    cache_key = f'hotel_calendar:{hotel_id}:{get_cache_version(f"hotel_calendar_version:{hotel_id}")}:{month:%Y-%m}'
+    calendar = cache.get(cache_key)
+    if calendar is None:
+        get_object_or_404(Hotel, pk=hotel_id, status=HotelStatus.VISIBLE)
+        first_night = month.replace(day=1)
+        nb_nights = monthrange(first_night.year, first_night.month)[1]
+        calendar = [
+            RoomTypeCalendarDto(
+                id=room_type.id,
+                name=room_type.name,
+                nights=[CalendarNightDto(night=first_night + timedelta(days=i), free_rooms=free_rooms)
+                        for i, free_rooms in enumerate(free_rooms_per_night)]
+            )
+            for room_type, free_rooms_per_night in RoomType.objects.find_free_rooms_calendar(
+                hotel_id, first_night, nb_nights)
+        ]
+        cache.set(cache_key, calendar, CALENDAR_CACHE_TIMEOUT)
+    return calendar
+
+
 def get_reviews_by_hotel_id(hotel_id):
     reviews = GuestReview.objects.get_reviews_by_hotel_id(hotel_id)
     review_converter = ReviewDtoConverter()
@@ -49,7 +90,7 @@ def get_reviews_by_hotel_id(hotel_id):
     return reviews_dtos
 
 
-def reserve_hotel_room(user: User, request: dict):
+def reserve_hotel_room(user: User, request: dict, on_retry=None):
     # Validate Data
     hotel = Hotel.objects.find_by_id(request['hotel_id'])
     country = Country.objects.find_by_id(request['country_id'])
@@ -60,56 +101,80 @@ def reserve_hotel_room(user: User, request: dict):
     check_in = _datetime.combine(check_in, time(13, 0))
     check_out = _datetime.combine(check_out, time(12, 0))
     # Calculate Total Price
-    total_price = calculate_total_price(request['requested_room_types'], nb_nights)
-    with transaction.atomic():
-        cursor = connection.cursor()
-        cursor.execute('SET TRANSACTION ISOLATION LEVEL SERIALIZABLE')
-        reservation = Reservation.objects.create_reservation(
-            guest=user.guest,
-            first_name=request['first_name'],
-            last_name=request['last_name'],
-            email=request['email'],
-            country=country,
-            country_code=country_code,
-            phone=request['phone'],
-            check_in=check_in,
-            check_out=check_out,
-            total_price=total_price,
-            hotel=hotel
-        )
-        for item in request['requested_room_types']:
-            # Check for room availability for the requested room type
-            rooms = Room.objects.find_available_rooms_by_room_type(item['room_type_id'], check_in, check_out)
-            if rooms.count() < item['nb_rooms']:
-                raise ValidationError(
-                    {'detail': f"Insufficient available rooms for room type {item['room_type_id']}"}
-                )
-            # Create records to hold the requested room type and the number of rooms
-            reserved_room_type = ReservedRoomType.objects.create(
-                reservation=reservation,
-                room_type_id=item['room_type_id'],
-                nb_rooms=item['nb_rooms']
+    prices = find_room_type_prices(hotel.id, request['requested_room_types'])
+    total_price = calculate_total_price(prices, request['requested_room_types'], nb_nights)
+
+    def book_rooms():
+        with transaction.atomic():
+            set_read_committed()
+            reservation = Reservation.objects.create_reservation(
+                guest=user.guest,
+                first_name=request['first_name'],
+                last_name=request['last_name'],
+                email=request['email'],
+                country=country,
+                country_code=country_code,
+                phone=request['phone'],
+                check_in=check_in,
+                check_out=check_out,
+                total_price=total_price,
+                hotel=hotel
             )
-            # Assign a set of rooms to the requested room type
-            rooms_list = list(rooms)
-            for i in range(item['nb_rooms']):
-                RoomAssignment.objects.create(
-                    room=rooms_list[i],
-                    reserved_room_type=reserved_room_type
+            nights = get_nights(check_in, check_out)
+            assignments = []
+            # Go through the room types in the same order as the concurrent bookings to avoid deadlocks
+            for item in sorted(request['requested_room_types'], key=lambda item: item['room_type_id']):
+                # Mark the booked nights as sold, the locked inventory rows guard the rooms of these nights
+                if not RoomTypeInventory.objects.claim_available_nights(item['room_type_id'], nights,
+                                                                        item['nb_rooms']):
+                    raise ValidationError(
+                        {'detail': f"Insufficient available rooms for room type {item['room_type_id']}"}
+                    )
+                # Create records to hold the requested room type and the number of rooms
+                reserved_room_type = ReservedRoomType.objects.create(
+                    reservation=reservation,
+                    room_type_id=item['room_type_id'],
+                    nb_rooms=item['nb_rooms'],
+                    price_per_night=prices[item['room_type_id']]
                 )
+                # Assign a set of rooms to the requested room type
+                rooms = list(Room.objects.find_unassigned_rooms(
+                    item['room_type_id'], check_in, check_out
+                )[:item['nb_rooms']])
+                if len(rooms) < item['nb_rooms']:
+                    raise ValidationError(
+                        {'detail': f"Insufficient available rooms for room type {item['room_type_id']}"}
+                    )
+                assignments += [RoomAssignment(room=room, reserved_room_type=reserved_room_type) for room in rooms]
+            RoomAssignment.objects.bulk_create(assignments)
+            RoomNightClaim.objects.claim_rooms(assignments, nights, reservation.hold_expires_at)
             return reservation.id
 
-
-def calculate_total_price(requested_room_types, nb_nights) -> int:
-    total_price = 0
+    try:
+        return run_with_retries(book_rooms, RESERVATION_MAX_ATTEMPTS, RESERVATION_RETRY_BACKOFF,
+                                RESERVATION_MAX_RETRY_BACKOFF, on_retry)
+    except ClaimConflict:
+        raise CustomException({'detail': 'The selected rooms have just been booked, please try again'},
+                              status.HTTP_409_CONFLICT)
+
+
+def find_room_type_prices(hotel_id: int, requested_room_types) -> Dict[int, int]:
+    prices = dict(RoomType.objects.filter(
+        hotel_id=hotel_id,
+        status=RoomTypeStatus.VISIBLE,
+        id__in=[item['room_type_id'] for item in requested_room_types]
+    ).values_list('id', 'price_per_night'))
     for item in requested_room_types:
-        _id = item['room_type_id']
-        price_per_night = RoomType.objects.find_by_id(_id).price_per_night
-        total_price += total_price + price_per_night * item['nb_rooms'] * nb_nights
-    return total_price
+        if item['room_type_id'] not in prices:
+            raise NotFound({'detail': 'No such room type with this id in the hotel'})
+    return prices
+
 
+def calculate_total_price(prices: Dict[int, int], requested_room_types, nb_nights) -> int:
+    return sum(prices[item['room_type_id']] * item['nb_rooms'] * nb_nights for item in requested_room_types)
 
-def filter_city_hotels(city_id, search_req: dict):
+
+def filter_city_hotels(city_id, search_req: dict) -> QuerySet:
     check_in = _datetime.combine(search_req['check_in'], time(13, 0))
     check_out = _datetime.combine(search_req['check_out'], time(12, 0))
     price_starts_at = search_req.pop('starts_at', 0)
@@ -123,30 +188,29 @@ def filter_city_hotels(city_id, search_req: dict):
         price_ends_at=price_ends_at,
         stars=stars,
     )
-    print("Available Hotels :", hotels)
     search_req.pop('check_in')
     search_req.pop('check_out')
     search_req.pop('number_of_adults')
     search_req.pop('number_of_children')
-    # Iterate over amenities
-    filtered_hotels = []
-    for hotel in hotels:
-        keep_hotel = True
-        for key, value in search_req.items():
-            if value:
-                print(f"name: {key} id:{FilterRequestSerializer.amenity_map[key]}")
-                has_amenity = Hotel.objects.has_amenity(hotel.id, price_starts_at, price_ends_at,
-                                                        FilterRequestSerializer.amenity_map[key])
-                print(f"{hotel.name} has {key} ?: {has_amenity}")
-                if not has_amenity:
-                    keep_hotel = False
-                    break
-        if keep_hotel:
-            filtered_hotels.append(hotel)
-
-    # Update the hotels list with the filtered list
-    converter = HotelDetailsDtoConverter()
-    return converter.to_dtos_list(filtered_hotels)
+    # The remaining params are the checked amenities
+    amenity_ids = [FilterRequestSerializer.amenity_map[key] for key, value in search_req.items() if value]
+    return Hotel.objects.filter_by_amenities(hotels, amenity_ids, price_starts_at, price_ends_at)
+
+
+def count_city_hotels_facets(hotels: QuerySet, price_starts_at: int, price_ends_at: int) -> SearchFacetsDto:
+    facets = Hotel.objects.count_facets(hotels, price_starts_at, price_ends_at, PRICE_BUCKETS_COUNT)
+    amenity_params = {amenity_id: param for param, amenity_id in FilterRequestSerializer.amenity_map.items()}
+    return SearchFacetsDto(
+        amenities=[AmenityFacetDto(id=amenity_id, param=amenity_params.get(amenity_id), count=count)
+                   for amenity_id, count in sorted(facets['amenities'].items())],
+        stars=[StarsFacetDto(stars=stars, count=count) for stars, count in sorted(facets['stars'].items())],
+        prices=[PriceBucketDto(starts_at=starts_at, ends_at=ends_at, count=count)
+                for starts_at, ends_at, count in facets['prices']]
+    )
+
+
+def convert_hotels_to_dtos(hotels) -> List[HotelDetailsDTO]:
+    return hotel_converter.to_dtos_list(hotels)
 
 
 def find_hotel_amenities():
@@ -207,14 +271,66 @@ def find_hotel_by_reservation_id(reservation_id):
 
 def cancel_reservation(reservation_id: int):
     reservation = get_object_or_404(Reservation, pk=reservation_id)
-    reservation.status = ReservationStatus.CANCELLED_BY_OWNER.value
-    reservation.save()
+    Reservation.objects.update_status(reservation, ReservationStatus.CANCELLED_BY_OWNER.value)
 
 
 def find_hotel_dashboard_details(hotel_id) -> HotelDashboardInfoDto:
     converter = HotelDashboardInfoDtoConverter()
     hotel = Hotel.objects.find_hotel_details_for_dashboard(hotel_id)
-    return converter.to_dto(hotel)
+    # Revenue of the last closed month
+    last_day = _datetime.today().date().replace(day=1) - timedelta(days=1)
+    revenues = get_room_type_revenues(hotel_id, last_day.replace(day=1), last_day)
+    for room_type in hotel.room_types.all():
+        room_type.monthly_revenue = revenues.get(room_type.id, 0)
+    return converter.to_dto(hotel, find_hotel_recent_reviews(hotel_id))
+
+
+def get_room_type_revenues(hotel_id: int, first_day: date, last_day: date) -> Dict[int, int]:
+    """
+    Revenue of every room type of the hotel over the days, read from the daily buckets month by month,
+    the closed months are cached until a late change to their buckets.
+    """
+    revenues = Counter()
+    today = _datetime.today().date()
+    version = get_cache_version(f'room_type_revenues_version:{hotel_id}')
+    day = first_day
+    while day <= last_day:
+        month_start = day.replace(day=1)
+        month_end = month_start.replace(day=monthrange(month_start.year, month_start.month)[1])
+        end = min(month_end, last_day)
+        if day == month_start and end == month_end and month_end < today:
+            cache_key = f'room_type_revenues:{hotel_id}:{version}:{month_start:%Y-%m}'
+            month_revenues = cache.get(cache_key)
+            if month_revenues is None:
+                month_revenues = RoomTypeDailyStats.objects.sum_revenues_by_room_type(hotel_id, day, end)
+                cache.set(cache_key, month_revenues, CLOSED_MONTH_REVENUES_CACHE_TIMEOUT)
+        else:
+            month_revenues = RoomTypeDailyStats.objects.sum_revenues_by_room_type(hotel_id, day, end)
+        revenues.update(month_revenues)
+        day = end + timedelta(days=1)
+    return dict(revenues)
+
+
+def find_room_type_revenues(hotel_id: int, first_day: date, last_day: date) -> List[RoomTypeRevenueDto]:
+    revenues = get_room_type_revenues(hotel_id, first_day, last_day)
+    return [RoomTypeRevenueDto(room_type.id, room_type.name, revenues.get(room_type.id, 0))
+            for room_type in RoomType.objects.filter(hotel_id=hotel_id).exclude(
+                status=RoomTypeStatus.DELETED_BY_OWNER).order_by('id')]
+
+
+def find_hotel_recent_reviews(hotel_id: int, cursor: str = None,
+                              limit: int = DASHBOARD_REVIEWS_PAGE_SIZE) -> RecentReviewsPageDto:
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor)
+        except ValueError:
+            raise ValidationError({'detail': 'Invalid cursor'})
+    # One more review tells if there is a next page
+    reviews = GuestReview.objects.find_recent_reviews_by_hotel_id(hotel_id, limit + 1, before)
+    reviews, next_reviews = reviews[:limit], reviews[limit:]
+    next_cursor = encode_cursor(reviews[-1].created_at, reviews[-1].id) if next_reviews else None
+    return RecentReviewsPageDto(reviews, next_cursor)
 
 
 def find_room_types_by_hotel_id(hotel_id: int):
@@ -483,9 +599,9 @@ def get_hotel_info_for_edit(hotel_id) -> HotelEditInfoDTO:
     )
 
 
-def find_owner_dashboard_information(owner_id):
+def find_owner_dashboard_information(owner_id, nb_days: int = 30):
     review_converter = ReviewDtoConverter()
-    hotels = Hotel.objects.find_owner_hotels(owner_id)[:10]
+    hotels = Hotel.objects.find_owner_hotels(owner_id, limit=10)
     latest_reservations = Reservation.objects.find_latest_reservations_to_owner_hotel(owner_id)
     latest_reviews = GuestReview.objects.find_latest_reviews_relate_to_owner(owner_id)
     hotels = [EssentialHotelDTO(hotel.id, hotel.name, hotel.check_ins_count, hotel.reservations_count)
@@ -496,11 +612,14 @@ def find_owner_dashboard_information(owner_id):
                                    status=reservation.status,
                                    total_price=reservation.total_price)
                     for reservation in latest_reservations]
+    today = _datetime.today().date()
+    daily_incomes = HotelDailyStats.objects.find_owner_daily_incomes(owner_id, today - timedelta(days=nb_days - 1),
+                                                                     today)
     return OwnerDashboardDTO(
         hotels=hotels,
         reviews=review_converter.to_dtos_list(latest_reviews),
         reservations=reservations,
-        daily_incomes=[]
+        daily_incomes=[DailyIncomeDTO(day, income) for day, income in daily_incomes]
     )
 
 
@@ -586,7 +705,24 @@ def create_payment_intent(data: dict):
     return payment_intent
 
 
+def refund_late_payment(intent, reservation: Reservation):
+    """
+    Give back a payment that arrived once the expired hold had been released and its rooms booked again.
+    """
+    try:
+        # The idempotency key keeps a retried verification from refunding twice
+        stripe.Refund.create(payment_intent=intent.id, metadata={'reservation_id': reservation.id},
+                             idempotency_key=f'late-payment-refund-{intent.id}')
+        logger.warning('Refunded the late payment %s of reservation %s, its rooms were booked again',
+                       intent.id, reservation.id)
+    except stripe.error.StripeError:
+        # The payment stays captured without a reservation, it is left to the staff
+        logger.exception('Could not refund the late payment %s of reservation %s, to be handled manually',
+                         intent.id, reservation.id)
+
+
 def verify_payment_intent(data: dict):
+    stripe.api_key = config('STRIPE_SECRET_KEY')
     success, detail = True, "success"
     try:
         intent = stripe.PaymentIntent.retrieve(data['payment_intent_id'])
@@ -595,8 +731,11 @@ def verify_payment_intent(data: dict):
             return False, 'Payment not successful'
         # Case of successful payment
         reservation = get_object_or_404(Reservation, pk=intent.metadata['reservation_id'])
-        reservation.status = ReservationStatus.CONFIRMED
-        reservation.save()
+        Reservation.objects.update_status(reservation, ReservationStatus.CONFIRMED)
+    except ClaimConflict:
+        refund_late_payment(intent, reservation)
+        return False, 'The hold on your rooms has expired and they have been booked meanwhile, ' \
+                      'the payment is refunded'
     except stripe.error.StripeError as e:
         return CustomException({'detail': e}, status=status.HTTP_406_NOT_ACCEPTABLE)
     return success, detail
@@ -0,0 +1,86 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Hotel, RoomType, HotelAmenityMask, Reservation, Room, HotelStats, GuestReview, \
+    RoomTypeInventory
+from .utils import invalidate_hotel_calendars
+
+
+def _invalidate_hotel_calendar(hotel_id):
+    invalidate_hotel_calendars([hotel_id])
+
+
+def _room_types_to_hotel_ids(room_type_ids):
+    return list(RoomType.objects.filter(pk__in=room_type_ids).values_list('hotel_id', flat=True).distinct())
+
+
+def _rebuild_amenity_masks(instance, action, reverse, model, pk_set, to_hotel_ids):
+    if reverse and action == 'pre_clear':
+        # Clearing from the amenity side does not give the pk_set, collect it while the rows still exist
+        instance._cleared_pks = list(model.objects.filter(amenities=instance).values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            pks = [instance.pk]
+        elif action == 'post_clear':
+            pks = getattr(instance, '_cleared_pks', [])
+        else:
+            pks = pk_set
+        HotelAmenityMask.objects.rebuild(to_hotel_ids(pks))
+
+
+@receiver(m2m_changed, sender=Hotel.amenities.through)
+def on_hotel_amenities_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    _rebuild_amenity_masks(instance, action, reverse, model, pk_set, list)
+
+
+@receiver(m2m_changed, sender=RoomType.amenities.through)
+def on_room_type_amenities_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    _rebuild_amenity_masks(instance, action, reverse, model, pk_set, _room_types_to_hotel_ids)
+
+
+@receiver(pre_save, sender=RoomType)
+def on_room_type_saving(sender, instance, **kwargs):
+    # Keep the stored price, only a price change moves the amenities to another price bucket
+    instance._stored_price = RoomType.objects.filter(pk=instance.pk).values_list(
+        'price_per_night', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=RoomType)
+def on_room_type_saved(sender, instance, created, **kwargs):
+    _invalidate_hotel_calendar(instance.hotel_id)
+    HotelStats.objects.refresh_starts_at(instance.hotel_id)
+    # A new room type has no amenities yet, the m2m signals follow the changes of its amenities
+    if not created and getattr(instance, '_stored_price', None) != instance.price_per_night:
+        HotelAmenityMask.objects.rebuild([instance.hotel_id])
+
+
+@receiver(post_delete, sender=RoomType)
+def on_room_type_deleted(sender, instance, **kwargs):
+    _invalidate_hotel_calendar(instance.hotel_id)
+    HotelStats.objects.refresh_starts_at(instance.hotel_id)
+    HotelAmenityMask.objects.rebuild([instance.hotel_id])
+
+
+@receiver(post_save, sender=Reservation)
+def on_reservation_saved(sender, instance, **kwargs):
+    _invalidate_hotel_calendar(instance.hotel_id)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def on_room_changed(sender, instance, **kwargs):
+    _invalidate_hotel_calendar(instance.room_type.hotel_id)
+    # The inventory reads the available rooms from its total
+    RoomTypeInventory.objects.sync_total(instance.room_type_id)
+
+
+@receiver(post_save, sender=Hotel)
+def on_hotel_saved(sender, instance, created, **kwargs):
+    if created:
+        HotelStats.objects.get_or_create(hotel=instance)
+
+
+@receiver(post_save, sender=GuestReview)
+@receiver(post_delete, sender=GuestReview)
+def on_review_changed(sender, instance, **kwargs):
+    HotelStats.objects.refresh_reviews(instance.reservation.hotel_id)
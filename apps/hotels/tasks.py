@@ -1,11 +1,7 @@
-from datetime import datetime, timezone
-
-from celery import shared_task
-from django.conf import settings
 from django.utils import timezone
 
 from apps.hotels.enums import ReservationStatus
-from apps.hotels.models import Reservation
+from apps.hotels.models import Reservation, HotelStats
 from core.celery import app
 
 
@@ -16,9 +12,19 @@ def update_reservations():
     reservations = Reservation.objects.all()
     for reservation in reservations:
         if reservation.status == ReservationStatus.CONFIRMED and reservation.check_in <= now:
-            reservation.status = ReservationStatus.ACTIVE
-            reservation.save()
+            Reservation.objects.update_status(reservation, ReservationStatus.ACTIVE)
         elif reservation.status == ReservationStatus.ACTIVE and reservation.check_out <= now:
-            reservation.status = ReservationStatus.COMPLETED
-            reservation.save()
+            Reservation.objects.update_status(reservation, ReservationStatus.COMPLETED)
+    return "Done"
+
+
+@app.task
+def release_expired_holds():
+    released = Reservation.objects.release_expired_holds()
+    return f"{released} expired holds released"
+
+
+@app.task
+def reconcile_hotel_stats():
+    HotelStats.objects.rebuild()
     return "Done"
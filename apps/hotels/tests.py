@@ -1,7 +1,26 @@
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError
+from django.db.models import Max
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-from .models import Amenity, Hotel
+from .converters import RoomTypeConverter
+from .enums import ReservationStatus, RoomTypeStatus
+from .models import Amenity, AmenityCategory, Hotel, RoomType, Room, Reservation, ReservedRoomType, RoomTypeInventory, \
+    RoomTypePolicies, RoomAssignment, RoomNightClaim, HotelStats, GuestReview, HotelDailyStats, RoomTypeDailyStats, \
+    HotelAmenityMask
+from .utils import run_with_retries, ClaimConflict
+from ..destinations.models import Country, City
+from ..guests.models import Guest
+from ..leaderboards.models import LeaderboardEntry
+from ..leaderboards.tasks import refresh_leaderboards
 from ..owners.models import Owner
+from ..users.models import User
 
 
 class ModelsUnitTest(TestCase):
@@ -31,3 +50,579 @@ class ModelsUnitTest(TestCase):
             parking_available=False
         )
         self.assertIsInstance(hotel, Hotel)
+
+
+def create_hotel_with_rooms(nb_rooms=2, price_per_night=5000):
+    country = Country.objects.create(name='Algeria', country_code='213')
+    city = City.objects.create(name='Oran', country=country)
+    user = User.objects.create_user(email='owner@example.com', password='test1234', is_active=True)
+    owner = Owner.objects.create_owner(user=user, first_name='Ali', last_name='Ahmed', birthday=None,
+                                       country_code=country, phone=1234567, country=country)
+    hotel = Hotel.objects.create(owner=owner, name='Testing hotel', address='Front de mer', city=city, stars=4,
+                                 country_code=country, contact_number=674947412,
+                                 cover_img='accommodations/hotels/testing.png')
+    room_type = RoomType.objects.create(hotel=hotel, name='Double', size=20, number_of_guests=2,
+                                        price_per_night=price_per_night, status=RoomTypeStatus.VISIBLE,
+                                        cover_img='accommodations/room_types/double.png')
+    RoomTypePolicies.objects.create(room_type=room_type)
+    for i in range(nb_rooms):
+        Room.objects.create(room_type=room_type)
+    guest_user = User.objects.create_user(email='guest@example.com', password='test1234', is_active=True)
+    guest = Guest.objects.create_guest(guest_user, 'Yusuf', 'Mohammed')
+    return hotel, room_type, guest
+
+
+def book(hotel, room_type, guest, check_in: date, check_out: date, nb_rooms=1):
+    reservation = Reservation.objects.create_reservation(
+        guest=guest, first_name='Yusuf', last_name='Mohammed', email='guest@example.com', country=None,
+        country_code=None, phone=1234567, check_in=datetime.combine(check_in, time(13, 0)),
+        check_out=datetime.combine(check_out, time(12, 0)), total_price=0, hotel=hotel
+    )
+    ReservedRoomType.objects.create(reservation=reservation, room_type=room_type, nb_rooms=nb_rooms,
+                                    price_per_night=room_type.price_per_night)
+    RoomTypeInventory.objects.claim_reservation(reservation)
+    return reservation
+
+
+class RoomTypeInventoryTest(TestCase):
+
+    def setUp(self):
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms(nb_rooms=2)
+        self.check_in = date.today() + timedelta(days=10)
+
+    def test_sold_out_nights_are_read_from_the_inventory(self):
+        book(self.hotel, self.room_type, self.guest, self.check_in, self.check_in + timedelta(days=3), nb_rooms=2)
+        count = RoomTypeInventory.objects.count_available_rooms(
+            self.room_type.id, self.check_in + timedelta(days=2), self.check_in + timedelta(days=5))
+        self.assertEqual(count, 0)
+        self.assertFalse(Room.objects.find_available_rooms_by_room_type(
+            self.room_type.id, self.check_in + timedelta(days=2), self.check_in + timedelta(days=5)).exists())
+        # The check-out day is free again
+        count = RoomTypeInventory.objects.count_available_rooms(
+            self.room_type.id, self.check_in + timedelta(days=3), self.check_in + timedelta(days=4))
+        self.assertEqual(count, 2)
+
+    def test_cancellation_releases_the_nights(self):
+        reservation = book(self.hotel, self.room_type, self.guest, self.check_in, self.check_in + timedelta(days=2))
+        Reservation.objects.update_status(reservation, ReservationStatus.CANCELLED_BY_OWNER)
+        count = RoomTypeInventory.objects.count_available_rooms(
+            self.room_type.id, self.check_in, self.check_in + timedelta(days=2))
+        self.assertEqual(count, 2)
+
+    def test_nights_resold_meanwhile_are_not_claimed_again(self):
+        reservation = book(self.hotel, self.room_type, self.guest, self.check_in, self.check_in + timedelta(days=2))
+        Reservation.objects.update_status(reservation, ReservationStatus.UNCOMPLETED)
+        book(self.hotel, self.room_type, self.guest, self.check_in + timedelta(days=1),
+             self.check_in + timedelta(days=2), nb_rooms=2)
+        with self.assertRaises(ClaimConflict):
+            Reservation.objects.update_status(reservation, ReservationStatus.CONFIRMED)
+        self.assertEqual(RoomTypeInventory.objects.aggregate(Max('sold'))['sold__max'], 2)
+
+    def test_available_rooms_follow_the_rooms_of_the_room_type(self):
+        book(self.hotel, self.room_type, self.guest, self.check_in, self.check_in + timedelta(days=1))
+        Room.objects.create(room_type=self.room_type)
+        self.assertEqual(RoomTypeInventory.objects.get().total, 3)
+        with self.assertNumQueries(1):
+            count = RoomTypeInventory.objects.count_available_rooms(
+                self.room_type.id, self.check_in, self.check_in + timedelta(days=1))
+        self.assertEqual(count, 2)
+
+
+class AvailableRoomTypesTest(TestCase):
+
+    def setUp(self):
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms(nb_rooms=3)
+        self.suite = RoomType.objects.create(hotel=self.hotel, name='Suite', size=40, number_of_guests=4,
+                                             price_per_night=15000, status=RoomTypeStatus.VISIBLE,
+                                             cover_img='accommodations/room_types/suite.png')
+        RoomTypePolicies.objects.create(room_type=self.suite)
+        Room.objects.create(room_type=self.suite)
+        self.check_in = date.today() + timedelta(days=10)
+        self.check_out = self.check_in + timedelta(days=2)
+
+    def test_available_rooms_are_counted_for_all_room_types_at_once(self):
+        book(self.hotel, self.room_type, self.guest, self.check_in, self.check_out, nb_rooms=1)
+        book(self.hotel, self.suite, self.guest, self.check_in, self.check_out, nb_rooms=1)
+        with self.assertNumQueries(3):
+            room_types = RoomTypeConverter().to_dtos_list(
+                RoomType.objects.find_available_room_types_by_hotel_id(self.hotel.id, self.check_in, self.check_out))
+        self.assertEqual([(r.id, r.available_rooms_count) for r in room_types], [(self.room_type.id, 2)])
+
+
+class AvailableCityHotelsTest(TestCase):
+
+    def setUp(self):
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms(nb_rooms=1, price_per_night=5000)
+        self.suite = RoomType.objects.create(hotel=self.hotel, name='Suite', size=40, number_of_guests=4,
+                                             price_per_night=15000, status=RoomTypeStatus.VISIBLE)
+        Room.objects.create(room_type=self.suite)
+        self.check_in = date.today() + timedelta(days=10)
+        self.check_out = self.check_in + timedelta(days=2)
+
+    def find_hotels(self, price_starts_at=0, price_ends_at=100000):
+        return Hotel.objects.find_available_hotels_by_city_id(self.hotel.city_id, self.check_in, self.check_out,
+                                                              price_starts_at, price_ends_at, None)
+
+    def test_starts_at_is_the_cheapest_available_price(self):
+        self.assertEqual(self.find_hotels().get().starts_at, 5000)
+        book(self.hotel, self.room_type, self.guest, self.check_in, self.check_out)
+        self.assertEqual(self.find_hotels().get().starts_at, 15000)
+
+    def test_sold_out_hotels_are_not_returned(self):
+        book(self.hotel, self.room_type, self.guest, self.check_in, self.check_out)
+        self.assertFalse(self.find_hotels(price_ends_at=10000).exists())
+
+    def test_amenities_filter_uses_the_room_types_in_price_range(self):
+        category = AmenityCategory.objects.create(name='Facilities')
+        wifi = Amenity.objects.create(name='Wifi', category=category)
+        jacuzzi = Amenity.objects.create(name='Jacuzzi', category=category)
+        self.hotel.amenities.add(wifi)
+        self.suite.amenities.add(jacuzzi)
+        with self.assertNumQueries(1):
+            hotels = Hotel.objects.filter_by_amenities(self.find_hotels(), [wifi.id, jacuzzi.id], 0, 100000)
+        self.assertEqual(list(hotels.values_list('id', flat=True)), [self.hotel.id])
+        hotels = Hotel.objects.filter_by_amenities(self.find_hotels(), [wifi.id, jacuzzi.id], 0, 10000)
+        self.assertFalse(hotels.exists())
+        self.suite.price_per_night = 9000
+        self.suite.save()
+        hotels = Hotel.objects.filter_by_amenities(self.find_hotels(), [wifi.id, jacuzzi.id], 0, 10000)
+        self.assertTrue(hotels.exists())
+
+    def test_masks_hold_high_amenity_ids_and_follow_price_changes_only(self):
+        category = AmenityCategory.objects.create(name='Facilities')
+        sauna = Amenity.objects.create(id=5000, name='Sauna', category=category)
+        self.suite.amenities.add(sauna)
+        hotels = Hotel.objects.filter_by_amenities(self.find_hotels(), [sauna.id], 0, 100000)
+        self.assertEqual(list(hotels.values_list('id', flat=True)), [self.hotel.id])
+        masks = list(HotelAmenityMask.objects.values_list('id', flat=True))
+        self.suite.size = 45
+        self.suite.save()
+        self.assertEqual(list(HotelAmenityMask.objects.values_list('id', flat=True)), masks)
+        self.suite.price_per_night = 9000
+        self.suite.save()
+        self.assertEqual(HotelAmenityMask.objects.get(hotel=self.hotel).price_per_night, 9000)
+
+    def test_count_facets(self):
+        category = AmenityCategory.objects.create(name='Facilities')
+        wifi = Amenity.objects.create(name='Wifi', category=category)
+        self.suite.amenities.add(wifi)
+        other_hotel = Hotel.objects.create(owner=self.hotel.owner, name='Other hotel', address='Centre ville',
+                                           city=self.hotel.city, stars=3, country_code=self.hotel.country_code,
+                                           contact_number=674947413)
+        other_room_type = RoomType.objects.create(hotel=other_hotel, name='Single', size=12, number_of_guests=1,
+                                                  price_per_night=9000, status=RoomTypeStatus.VISIBLE)
+        Room.objects.create(room_type=other_room_type)
+        with self.assertNumQueries(2):
+            facets = Hotel.objects.count_facets(self.find_hotels(), 0, 100000, 2)
+        self.assertEqual(facets['amenities'], {wifi.id: 1})
+        self.assertEqual(facets['stars'], {self.hotel.stars: 1, 3: 1})
+        self.assertEqual(facets['prices'], [(5000, 7000, 1), (7001, 9001, 1)])
+
+
+class HotelCalendarTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms(nb_rooms=2)
+        self.month = date.today().replace(day=1) + timedelta(days=40)
+
+    def free_rooms(self):
+        response = self.client.get(f'/api/v1/hotels/{self.hotel.id}/calendar', {'month': f'{self.month:%Y-%m}'})
+        self.assertEqual(response.status_code, 200)
+        return [night['free_rooms'] for night in response.json()[0]['nights']]
+
+    def test_free_rooms_per_night(self):
+        first_night = self.month.replace(day=1)
+        book(self.hotel, self.room_type, self.guest, first_night - timedelta(days=1), first_night + timedelta(days=2))
+        book(self.hotel, self.room_type, self.guest, first_night + timedelta(days=1), first_night + timedelta(days=3))
+        free_rooms = self.free_rooms()
+        self.assertEqual(free_rooms[:4], [1, 0, 1, 2])
+        self.assertTrue(all(free == 2 for free in free_rooms[4:]))
+
+    def test_calendar_is_invalidated_by_reservations(self):
+        self.assertEqual(self.free_rooms()[0], 2)
+        with self.assertNumQueries(0):
+            self.free_rooms()
+        with self.captureOnCommitCallbacks(execute=True):
+            book(self.hotel, self.room_type, self.guest, self.month.replace(day=1), self.month.replace(day=2))
+        self.assertEqual(self.free_rooms()[0], 1)
+
+    def test_calendar_is_invalidated_by_deleted_rooms_and_swept_holds(self):
+        self.assertEqual(self.free_rooms()[0], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room_type.rooms.first().delete()
+        self.assertEqual(self.free_rooms()[0], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = book(self.hotel, self.room_type, self.guest, self.month.replace(day=1),
+                               self.month.replace(day=2))
+        self.assertEqual(self.free_rooms()[0], 0)
+        Reservation.objects.filter(pk=reservation.pk).update(status=ReservationStatus.ON_HOLD,
+                                                             hold_expires_at=timezone.now())
+        # The sweep bumps the version once its transaction commits, not before
+        with self.captureOnCommitCallbacks() as callbacks:
+            Reservation.objects.release_expired_holds(self.hotel.id)
+            self.assertEqual(self.free_rooms()[0], 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.free_rooms()[0], 1)
+
+
+class ReserveHotelRoomTest(TestCase):
+
+    def setUp(self):
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms(nb_rooms=2, price_per_night=5000)
+        self.suite = RoomType.objects.create(hotel=self.hotel, name='Suite', size=40, number_of_guests=4,
+                                             price_per_night=15000, status=RoomTypeStatus.VISIBLE)
+        Room.objects.create(room_type=self.suite)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.guest.user)
+        self.check_in = date.today() + timedelta(days=10)
+
+    def reserve(self, requested_room_types):
+        country_id = self.hotel.country_code_id
+        return self.client.post('/api/v1/hotels/reserve/', {
+            'first_name': 'Yusuf', 'last_name': 'Mohammed', 'email': 'guest@example.com',
+            'country_id': country_id, 'country_code_id': country_id, 'phone': 1234567,
+            'hotel_id': self.hotel.id, 'check_in': self.check_in, 'check_out': self.check_in + timedelta(days=2),
+            'requested_room_types': requested_room_types
+        }, format='json')
+
+    def test_every_requested_room_type_is_reserved(self):
+        response = self.reserve([{'room_type_id': self.suite.id, 'nb_rooms': 1},
+                                 {'room_type_id': self.room_type.id, 'nb_rooms': 2}])
+        self.assertEqual(response.status_code, 201)
+        reservation = Reservation.objects.get(pk=response.json()['reservation_id'])
+        self.assertEqual(reservation.total_price, (15000 + 2 * 5000) * 2)
+        self.assertEqual(RoomAssignment.objects.filter(reserved_room_type__reservation=reservation).count(), 3)
+        self.assertEqual(RoomTypeInventory.objects.count_available_rooms(
+            self.suite.id, self.check_in, self.check_in + timedelta(days=2)), 0)
+
+    def test_sold_out_room_type_is_rejected(self):
+        self.assertEqual(self.reserve([{'room_type_id': self.suite.id, 'nb_rooms': 1}]).status_code, 201)
+        response = self.reserve([{'room_type_id': self.room_type.id, 'nb_rooms': 1},
+                                 {'room_type_id': self.suite.id, 'nb_rooms': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Reservation.objects.count(), 1)
+        self.assertEqual(RoomTypeInventory.objects.count_available_rooms(
+            self.room_type.id, self.check_in, self.check_in + timedelta(days=2)), 2)
+
+    def test_rooms_are_claimed_until_cancellation(self):
+        response = self.reserve([{'room_type_id': self.suite.id, 'nb_rooms': 1}])
+        reservation = Reservation.objects.get(pk=response.json()['reservation_id'])
+        suite_room = self.suite.rooms.get()
+        self.assertEqual(RoomNightClaim.objects.filter(room=suite_room).count(), 2)
+        self.assertFalse(Room.objects.find_unassigned_rooms(self.suite.id, self.check_in,
+                                                            self.check_in + timedelta(days=1)).exists())
+        with self.assertRaises(ClaimConflict):
+            RoomNightClaim.objects.claim_reservation(reservation)
+        Reservation.objects.update_status(reservation, ReservationStatus.CANCELLED_BY_OWNER)
+        self.assertFalse(RoomNightClaim.objects.exists())
+        self.assertTrue(Room.objects.find_unassigned_rooms(self.suite.id, self.check_in,
+                                                           self.check_in + timedelta(days=1)).exists())
+
+    def expire_hold(self, reservation):
+        past = timezone.now() - timedelta(minutes=1)
+        Reservation.objects.filter(pk=reservation.pk).update(hold_expires_at=past)
+        RoomNightClaim.objects.filter(reserved_room_type__reservation=reservation).update(expires_at=past)
+
+    def test_expired_hold_frees_the_rooms(self):
+        response = self.reserve([{'room_type_id': self.suite.id, 'nb_rooms': 1}])
+        reservation = Reservation.objects.get(pk=response.json()['reservation_id'])
+        self.assertEqual(reservation.status, ReservationStatus.ON_HOLD)
+        stay = (self.suite.id, self.check_in, self.check_in + timedelta(days=2))
+        self.assertEqual(RoomTypeInventory.objects.count_available_rooms(*stay), 0)
+        self.expire_hold(reservation)
+        self.assertEqual(RoomTypeInventory.objects.count_available_rooms(*stay), 1)
+        self.assertTrue(Room.objects.find_unassigned_rooms(*stay).exists())
+        # Another guest takes the room over, the expired checkout is left to the sweep
+        self.assertEqual(self.reserve([{'room_type_id': self.suite.id, 'nb_rooms': 1}]).status_code, 201)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, ReservationStatus.ON_HOLD)
+        self.assertEqual(RoomTypeInventory.objects.count_available_rooms(*stay), 0)
+        self.assertEqual(Reservation.objects.release_expired_holds(), 1)
+        self.assertEqual(RoomTypeInventory.objects.get(room_type=self.suite, night=self.check_in).sold, 1)
+
+    def test_sweep_releases_expired_holds_and_payment_keeps_the_rooms(self):
+        expired = Reservation.objects.get(pk=self.reserve(
+            [{'room_type_id': self.suite.id, 'nb_rooms': 1}]).json()['reservation_id'])
+        paid = Reservation.objects.get(pk=self.reserve(
+            [{'room_type_id': self.room_type.id, 'nb_rooms': 1}]).json()['reservation_id'])
+        Reservation.objects.update_status(paid, ReservationStatus.CONFIRMED)
+        self.expire_hold(expired)
+        self.assertEqual(Reservation.objects.release_expired_holds(), 1)
+        self.assertFalse(RoomNightClaim.objects.filter(reserved_room_type__reservation=expired).exists())
+        self.assertTrue(RoomNightClaim.objects.filter(reserved_room_type__reservation=paid,
+                                                      expires_at__isnull=True).exists())
+        self.assertEqual(RoomTypeInventory.objects.filter(room_type=self.suite).aggregate(Max('sold'))['sold__max'], 0)
+
+    def test_payment_after_the_hold_expired_keeps_the_rooms_nobody_took(self):
+        late = Reservation.objects.get(pk=self.reserve(
+            [{'room_type_id': self.suite.id, 'nb_rooms': 1}]).json()['reservation_id'])
+        self.expire_hold(late)
+        Reservation.objects.update_status(late, ReservationStatus.CONFIRMED)
+        self.assertEqual(RoomNightClaim.objects.filter(reserved_room_type__reservation=late,
+                                                       expires_at__isnull=True).count(), 2)
+        self.assertEqual(RoomTypeInventory.objects.get(room_type=self.suite, night=self.check_in).sold, 1)
+
+    def test_payment_arriving_after_the_rooms_were_booked_again_is_refunded(self):
+        from .services import verify_payment_intent
+        late = Reservation.objects.get(pk=self.reserve(
+            [{'room_type_id': self.suite.id, 'nb_rooms': 1}]).json()['reservation_id'])
+        self.expire_hold(late)
+        self.assertEqual(self.reserve([{'room_type_id': self.suite.id, 'nb_rooms': 1}]).status_code, 201)
+        intent = SimpleNamespace(id='pi_late', status='succeeded', metadata={'reservation_id': late.id})
+        with mock.patch('stripe.PaymentIntent.retrieve', return_value=intent), \
+                mock.patch('stripe.Refund.create') as refund:
+            success, _ = verify_payment_intent({'payment_intent_id': 'pi_late'})
+        self.assertFalse(success)
+        refund.assert_called_once()
+        self.assertEqual(refund.call_args.kwargs['payment_intent'], 'pi_late')
+        # Nothing is kept from the attempt, the sweep closes the checkout
+        late.refresh_from_db()
+        self.assertEqual(late.status, ReservationStatus.ON_HOLD)
+        self.assertEqual(RoomTypeInventory.objects.get(room_type=self.suite, night=self.check_in).sold, 2)
+        Reservation.objects.release_expired_holds()
+        late.refresh_from_db()
+        self.assertEqual(late.status, ReservationStatus.UNCOMPLETED)
+
+
+class RunWithRetriesTest(TestCase):
+
+    def test_retries_deadlocks_then_gives_up(self):
+        attempts = []
+
+        def deadlock():
+            attempts.append(1)
+            raise OperationalError(1213, 'Deadlock found when trying to get lock')
+
+        with self.assertRaises(OperationalError):
+            run_with_retries(deadlock, max_attempts=3, backoff=0, max_backoff=0,
+                             on_retry=lambda attempt, error: attempts.append(attempt))
+        self.assertEqual(attempts, [1, 1, 1, 2, 1])
+
+
+class HotelStatsTest(TestCase):
+
+    def setUp(self):
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms(nb_rooms=2, price_per_night=5000)
+        self.check_in = date.today() + timedelta(days=3)
+
+    def get_stats(self):
+        return HotelStats.objects.values('rating_avg', 'reviews_count', 'starts_at', 'reservations_count',
+                                         'completed_count', 'cancellations_count', 'revenue').get(hotel=self.hotel)
+
+    def test_stats_follow_the_changes_and_match_a_rebuild(self):
+        completed = book(self.hotel, self.room_type, self.guest, self.check_in, self.check_in + timedelta(days=1))
+        cancelled = book(self.hotel, self.room_type, self.guest, self.check_in, self.check_in + timedelta(days=1))
+        Reservation.objects.filter(pk=completed.pk).update(total_price=8000)
+        completed.total_price = 8000
+        Reservation.objects.update_status(completed, ReservationStatus.COMPLETED)
+        Reservation.objects.update_status(cancelled, ReservationStatus.CANCELLED_BY_OWNER)
+        GuestReview.objects.create(reservation=completed, rating=4, title='Nice', content='Nice stay')
+        RoomType.objects.create(hotel=self.hotel, name='Single', size=12, number_of_guests=1,
+                                price_per_night=3000, status=RoomTypeStatus.VISIBLE)
+        stats = self.get_stats()
+        self.assertEqual(stats, {'rating_avg': 4.0, 'reviews_count': 1, 'starts_at': 3000, 'reservations_count': 2,
+                                 'completed_count': 1, 'cancellations_count': 1, 'revenue': 8000})
+        HotelStats.objects.all().delete()
+        HotelStats.objects.rebuild()
+        self.assertEqual(self.get_stats(), stats)
+        self.assertEqual(Hotel.objects.find_by_id(self.hotel.id).reviews_count, 1)
+
+
+class DailyStatsTest(TestCase):
+
+    def setUp(self):
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms(nb_rooms=3, price_per_night=5000)
+        self.check_in = date.today() + timedelta(days=3)
+
+    def get_buckets(self):
+        fields = ['day', 'revenue', 'check_ins', 'check_outs', 'cancellations', 'occupied_room_nights']
+        return (list(HotelDailyStats.objects.order_by('day').values_list(*fields)),
+                list(RoomTypeDailyStats.objects.order_by('day').values_list(*fields)))
+
+    def test_status_changes_feed_the_buckets_and_match_a_rebuild(self):
+        stay = book(self.hotel, self.room_type, self.guest, self.check_in, self.check_in + timedelta(days=2),
+                    nb_rooms=2)
+        cancelled = book(self.hotel, self.room_type, self.guest, self.check_in, self.check_in + timedelta(days=1))
+        Reservation.objects.filter(pk=stay.pk).update(total_price=20000)
+        stay.total_price = 20000
+        for status in [ReservationStatus.CONFIRMED, ReservationStatus.ACTIVE, ReservationStatus.COMPLETED]:
+            Reservation.objects.update_status(stay, status)
+        Reservation.objects.update_status(cancelled, ReservationStatus.CONFIRMED)
+        Reservation.objects.update_status(cancelled, ReservationStatus.CANCELLED_BY_GUEST)
+        hotel_buckets, room_type_buckets = self.get_buckets()
+        self.assertEqual(hotel_buckets, [
+            (self.check_in, 0, 1, 0, 1, 2),
+            (self.check_in + timedelta(days=1), 0, 0, 0, 0, 2),
+            (self.check_in + timedelta(days=2), 20000, 0, 1, 0, 0),
+        ])
+        self.assertEqual(room_type_buckets[0], (self.check_in, 0, 2, 0, 1, 2))
+        HotelDailyStats.objects.rebuild([self.hotel.id])
+        self.assertEqual(self.get_buckets(), (hotel_buckets, room_type_buckets))
+        incomes = HotelDailyStats.objects.find_owner_daily_incomes(self.hotel.owner_id, self.check_in,
+                                                                   self.check_in + timedelta(days=2))
+        self.assertEqual([income for _, income in incomes], [0, 0, 20000])
+
+
+class OwnerHotelsTest(TestCase):
+
+    def setUp(self):
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms(nb_rooms=2)
+        self.hotel.amenities.add(Amenity.objects.create(name='Wifi', category=AmenityCategory.objects.create(
+            name='Facilities')))
+
+    def add_hotel(self, index):
+        hotel = Hotel.objects.create(owner=self.hotel.owner, name=f'Hotel {index}', address='Centre',
+                                     city=self.hotel.city, stars=3, country_code=self.hotel.country_code,
+                                     contact_number=674947412, cover_img='accommodations/hotels/testing.png')
+        hotel.amenities.set(self.hotel.amenities.all())
+        room_type = RoomType.objects.create(hotel=hotel, name='Double', size=20, number_of_guests=2,
+                                            price_per_night=4000, status=RoomTypeStatus.VISIBLE)
+        room = Room.objects.create(room_type=room_type)
+        reservation = book(hotel, room_type, self.guest, date.today(), date.today() + timedelta(days=1))
+        RoomAssignment.objects.create(reserved_room_type=reservation.reserved_room_types.get(), room=room)
+        Reservation.objects.update_status(reservation, ReservationStatus.ACTIVE)
+
+    def serialize_owner_hotels(self):
+        from .serializers import MyHotelItemSerializer
+        return MyHotelItemSerializer(Hotel.objects.find_owner_hotels(self.hotel.owner), many=True).data
+
+    def test_query_count_does_not_grow_with_the_portfolio(self):
+        self.serialize_owner_hotels()
+        with self.assertNumQueries(5):
+            self.serialize_owner_hotels()
+        for index in range(3):
+            self.add_hotel(index)
+        with self.assertNumQueries(5):
+            hotels = self.serialize_owner_hotels()
+        self.assertEqual(len(hotels), 4)
+        occupied = [hotel for hotel in hotels if hotel['id'] != self.hotel.id]
+        self.assertTrue(all(hotel['check_ins_count'] == 1 and hotel['occupied_rooms_count'] == 1 and
+                            hotel['rooms_count'] == 1 and len(hotel['amenities']) == 1 for hotel in occupied))
+
+
+class RecentReviewsTest(TestCase):
+
+    def setUp(self):
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.hotel.owner.user)
+        Guest.objects.filter(pk=self.guest.pk).update(profile_pic='guests/profile.png')
+        created_at = timezone.now()
+        for i in range(7):
+            reservation = Reservation.objects.create(
+                guest=self.guest, phone=1234567, check_in=timezone.now(), check_out=timezone.now(),
+                total_price=0, hotel=self.hotel, status=ReservationStatus.COMPLETED
+            )
+            GuestReview.objects.create(reservation=reservation, rating=4, title=f'Review {i}', content='Nice stay')
+        # Ties on created_at are broken by the id
+        GuestReview.objects.update(created_at=created_at)
+
+    def test_pages_follow_each_other_without_gaps(self):
+        response = self.client.get(f'/api/v1/owner/hotels/{self.hotel.id}/')
+        self.assertEqual(len(response.json()['reviews']), 5)
+        self.assertIsNotNone(response.json()['reviews_next_cursor'])
+        first_page = self.client.get(f'/api/v1/owner/hotels/{self.hotel.id}/reviews/').json()
+        self.assertEqual(first_page['reviews'], response.json()['reviews'])
+        self.assertEqual(first_page['next_cursor'], response.json()['reviews_next_cursor'])
+        ids, cursor = [], None
+        while True:
+            params = {'limit': 3} if cursor is None else {'limit': 3, 'cursor': cursor}
+            page = self.client.get(f'/api/v1/owner/hotels/{self.hotel.id}/reviews/', params).json()
+            ids += [review['id'] for review in page['reviews']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(ids, sorted(GuestReview.objects.values_list('id', flat=True), reverse=True))
+        response = self.client.get(f'/api/v1/owner/hotels/{self.hotel.id}/reviews/', {'cursor': 'oops'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RoomTypeRevenuesTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms(nb_rooms=2)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.hotel.owner.user)
+        # A closed month
+        self.month = (date.today().replace(day=1) - timedelta(days=40)).replace(day=1)
+
+    def complete_stay(self, total_price):
+        reservation = book(self.hotel, self.room_type, self.guest, self.month + timedelta(days=2),
+                           self.month + timedelta(days=4))
+        Reservation.objects.filter(pk=reservation.pk).update(total_price=total_price)
+        reservation.total_price = total_price
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.update_status(reservation, ReservationStatus.CONFIRMED)
+            Reservation.objects.update_status(reservation, ReservationStatus.COMPLETED)
+
+    def get_revenue(self):
+        response = self.client.get(f'/api/v1/owner/hotels/{self.hotel.id}/revenues/',
+                                   {'first_day': self.month, 'last_day': date.today()})
+        self.assertEqual(response.status_code, 200)
+        return {room_type['id']: room_type['revenue'] for room_type in response.json()}[self.room_type.id]
+
+    def test_closed_months_are_summed_and_cached_until_they_change(self):
+        self.complete_stay(12000)
+        self.assertEqual(self.get_revenue(), 12000)
+        # Served from the cache of the closed month
+        RoomTypeDailyStats.objects.update(revenue=0)
+        self.assertEqual(self.get_revenue(), 12000)
+        HotelDailyStats.objects.rebuild([self.hotel.id])
+        self.complete_stay(8000)
+        self.assertEqual(self.get_revenue(), 20000)
+
+    def test_revenue_of_a_stay_is_split_by_the_price_of_its_room_types(self):
+        suite = RoomType.objects.create(hotel=self.hotel, name='Suite', size=40, number_of_guests=2,
+                                        price_per_night=15000, status=RoomTypeStatus.VISIBLE,
+                                        cover_img='accommodations/room_types/suite.png')
+        Room.objects.create(room_type=suite)
+        reservation = book(self.hotel, self.room_type, self.guest, self.month + timedelta(days=2),
+                           self.month + timedelta(days=4))
+        ReservedRoomType.objects.create(reservation=reservation, room_type=suite, nb_rooms=1, price_per_night=15000)
+        # 2 nights of a double at 5000 and a suite at 15000, less a discount leaving a remainder
+        Reservation.objects.filter(pk=reservation.pk).update(total_price=39999)
+        reservation.total_price = 39999
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.update_status(reservation, ReservationStatus.CONFIRMED)
+            Reservation.objects.update_status(reservation, ReservationStatus.COMPLETED)
+        response = self.client.get(f'/api/v1/owner/hotels/{self.hotel.id}/revenues/',
+                                   {'first_day': self.month, 'last_day': date.today()})
+        revenues = {room_type['id']: room_type['revenue'] for room_type in response.json()}
+        self.assertEqual(revenues, {self.room_type.id: 9999, suite.id: 30000})
+        buckets = list(RoomTypeDailyStats.objects.order_by('room_type_id', 'day').values_list(
+            'room_type_id', 'day', 'revenue'))
+        # The stay keeps the prices it was booked at
+        RoomType.objects.filter(pk=suite.pk).update(price_per_night=30000)
+        HotelDailyStats.objects.rebuild([self.hotel.id])
+        self.assertEqual(list(RoomTypeDailyStats.objects.order_by('room_type_id', 'day').values_list(
+            'room_type_id', 'day', 'revenue')), buckets)
+
+
+class TopHotelsTest(TestCase):
+
+    def setUp(self):
+        self.hotel, self.room_type, self.guest = create_hotel_with_rooms()
+        other_city = City.objects.create(name='Alger', country=self.hotel.city.country)
+        self.other = Hotel.objects.create(owner=self.hotel.owner, name='Other hotel', address='Centre', city=other_city,
+                                          stars=3, country_code=self.hotel.country_code, contact_number=674947413)
+        HotelStats.objects.filter(hotel=self.hotel).update(rating_avg=4.5, reviews_count=10)
+        HotelStats.objects.filter(hotel=self.other).update(rating_avg=3.0, reviews_count=2)
+
+    def get_top_hotels(self, **params):
+        response = self.client.get('/api/v1/hotels/top/', params)
+        self.assertEqual(response.status_code, 200)
+        return [hotel['id'] for hotel in response.json()]
+
+    def test_top_hotels_are_read_from_the_refreshed_ranking(self):
+        refresh_leaderboards()
+        self.assertEqual(self.get_top_hotels(), [self.hotel.id, self.other.id])
+        self.assertEqual(self.get_top_hotels(city=self.other.city_id), [self.other.id])
+        # Served from the stored ranking until the next refresh
+        HotelStats.objects.filter(hotel=self.other).update(rating_avg=5.0, reviews_count=50)
+        self.assertEqual(self.get_top_hotels(), [self.hotel.id, self.other.id])
+        refresh_leaderboards()
+        self.assertEqual(self.get_top_hotels(), [self.other.id, self.hotel.id])
+        self.assertEqual(LeaderboardEntry.objects.filter(board='top_hotels', key='all').count(), 2)
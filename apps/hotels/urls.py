@@ -9,6 +9,7 @@ urlpatterns = [
     path(APP_URL + '<int:hotel_id>/', GetHotelDetailsView.as_view()),
     path(APP_URL + '<int:hotel_id>/reviews/', ListCreateHotelReviewView.as_view()),
     path(APP_URL + '<int:hotel_id>/rooms', GetHotelAvailableRoomTypes.as_view()),
+    path(APP_URL + '<int:hotel_id>/calendar', GetHotelCalendar.as_view()),
     path(APP_URL + 'reserve/', CreateReservationView.as_view()),
     path('payment/config/', GetStripPublicKey.as_view()),
     path('payment/create-payment-intent/', CreatePaymentIntentView.as_view()),
@@ -20,6 +21,8 @@ urlpatterns = [
     path('owner/' + APP_URL + '<int:hotel_id>/edit-info/', GetHotelEditInformation.as_view()),
     path('owner/' + APP_URL + 'create-info/', GetHotelCreateInformation.as_view()),
     path('owner/' + APP_URL + '<int:hotel_id>/', ManageOwnerHotelDetailsView.as_view()),
+    path('owner/' + APP_URL + '<int:hotel_id>/reviews/', ListOwnerHotelRecentReviews.as_view()),
+    path('owner/' + APP_URL + '<int:hotel_id>/revenues/', GetOwnerHotelRoomTypeRevenues.as_view()),
     path('owner/' + APP_URL + '<int:hotel_id>/rooms/', ListCreateRoomType.as_view()),
     path('owner/' + APP_URL + 'rooms/create-info/', GetCreateRoomInformation.as_view()),
     path('owner/' + APP_URL + 'rooms/<int:room_type_id>/edit-info/', GetEditRoomInformation.as_view()),
@@ -0,0 +1,94 @@
+import base64
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+from django.db import OperationalError, connection, transaction
+
+from core.utils import bump_cache_version
+
+
+def to_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def get_nights(check_in, check_out) -> List[date]:
+    """
+    Return the nights covered by a stay, a night is identified by the date it starts on,
+    so the check-out day itself is not included.
+    """
+    first_night = to_date(check_in)
+    nb_nights = (to_date(check_out) - first_night).days
+    return [first_night + timedelta(days=i) for i in range(nb_nights)]
+
+
+def to_amenity_mask(amenity_ids) -> int:
+    """
+    Pack amenity ids into a bitset, the bit at position `id` is set for each amenity.
+    """
+    mask = 0
+    for amenity_id in amenity_ids:
+        mask |= 1 << amenity_id
+    return mask
+
+
+def invalidate_hotel_calendars(hotel_ids):
+    # Wait for the commit, a calendar read in between would cache the old state again
+    hotel_ids = list(hotel_ids)
+    transaction.on_commit(lambda: [bump_cache_version(f'hotel_calendar_version:{hotel_id}') for hotel_id in hotel_ids])
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{item_id}'.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Read back the position of a keyset cursor, raises ValueError on a malformed cursor.
+    """
+    try:
+        created_at, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError('Malformed cursor') from e
+
+
+# MySQL lock wait timeout and deadlock errors, the transaction can simply be replayed
+RETRYABLE_DB_ERROR_CODES = (1205, 1213)
+
+
+def is_retryable_db_error(error: OperationalError) -> bool:
+    if error.args and error.args[0] in RETRYABLE_DB_ERROR_CODES:
+        return True
+    message = str(error).lower()
+    return 'deadlock' in message or 'serializ' in message or 'is locked' in message
+
+
+class ClaimConflict(Exception):
+    """
+    A concurrent transaction claimed the same rows first, the transaction can be replayed.
+    """
+
+
+def run_with_retries(func, max_attempts: int, backoff: float, max_backoff: float, on_retry=None):
+    """
+    Call func until it does not fail on a lock conflict, waiting a jittered exponential backoff
+    between the attempts, on_retry(attempt, error) is called before each new attempt.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func()
+        except (OperationalError, ClaimConflict) as e:
+            if attempt == max_attempts or (isinstance(e, OperationalError) and not is_retryable_db_error(e)):
+                raise
+            if on_retry is not None:
+                on_retry(attempt, e)
+            time.sleep(min(backoff * 2 ** (attempt - 1), max_backoff) * random.uniform(0.5, 1))
+
+
+def set_read_committed():
+    # Must run before the first query of the transaction, the other databases keep their default level
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL READ COMMITTED')
@@ -19,12 +19,16 @@ class GetTopHotelsView(APIView):
     @extend_schema(
         tags=['Hotels'],
         summary='Get top hotels',
+        parameters=[serializers.TopHotelsParamsSerializer],
         responses={
             200: OpenApiResponse(response=serializers.HotelSerializer)
         }
     )
     def get(self, request):
-        hotels = services.find_top_hotels()
+        request_params = serializers.TopHotelsParamsSerializer(data=self.request.query_params)
+        if not request_params.is_valid():
+            raise ValidationError(request_params.errors)
+        hotels = services.find_top_hotels(request_params.validated_data.get('city'))
         hotels_serializer = serializers.HotelSerializer(hotels, many=True)
         return Response(data=hotels_serializer.data, status=status.HTTP_200_OK)
 
@@ -87,6 +91,28 @@ class GetHotelAvailableRoomTypes(APIView):
         return Response(data=response.data, status=status.HTTP_200_OK)
 
 
+class GetHotelCalendar(APIView):
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(
+        tags=['Hotels'],
+        summary='Get the free rooms of each room type for every night of a month',
+        parameters=[serializers.HotelCalendarParamsSerializer],
+        responses={200: serializers.RoomTypeCalendarDtoSerializer}
+    )
+    def get(self, request, *args, **kwargs):
+        hotel_id = kwargs.pop('hotel_id', None)
+        if hotel_id is None:
+            raise ValidationError({'detail': 'Provide a hotel id'})
+        request_params = serializers.HotelCalendarParamsSerializer(data=self.request.query_params)
+        if not request_params.is_valid():
+            raise ValidationError({'detail': 'Provide the month param as YYYY-MM'})
+        calendar = services.get_hotel_calendar(hotel_id, request_params.validated_data['month'])
+        response = serializers.RoomTypeCalendarDtoSerializer(calendar, many=True)
+        return Response(data=response.data, status=status.HTTP_200_OK)
+
+
 class CreateReservationView(APIView):
     permission_classes = [IsGuestOrAdmin]
 
@@ -128,10 +154,18 @@ class FindHotelsByCity(APIView):
         request = serializers.FilterRequestSerializer(data=self.request.query_params.dict())
         if not request.is_valid():
             raise ValidationError(request.errors)
-        print('Validated Data :', request.validated_data)
-        search_results = services.filter_city_hotels(city_id, request.validated_data)
-        response = serializers.HotelDetailsSerializer(search_results, many=True)
-        return Response(data=response.data, status=status.HTTP_200_OK)
+        with_facets = request.validated_data.pop('facets')
+        price_starts_at = request.validated_data['starts_at']
+        price_ends_at = request.validated_data['ends_at']
+        hotels = services.filter_city_hotels(city_id, request.validated_data)
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(hotels, self.request, view=self)
+        response = serializers.HotelDetailsSerializer(services.convert_hotels_to_dtos(page), many=True)
+        paginated_response = paginator.get_paginated_response(response.data)
+        if with_facets:
+            facets = services.count_city_hotels_facets(hotels, price_starts_at, price_ends_at)
+            paginated_response.data['facets'] = serializers.SearchFacetsDtoSerializer(facets).data
+        return paginated_response
 
 
 class GetAllAmenities(APIView):
@@ -158,10 +192,15 @@ class GetOwnerDashboardInfo(APIView):
     @extend_schema(
         tags=['Owner Dashboard'],
         summary='Get owner dashboard',
+        parameters=[serializers.OwnerDashboardParamsSerializer],
         responses=serializers.OwnerDashboardSerializer
     )
     def get(self, request, *args, **kwargs):
-        dashboard_info = services.find_owner_dashboard_information(request.user.owner.id)
+        request_params = serializers.OwnerDashboardParamsSerializer(data=self.request.query_params)
+        if not request_params.is_valid():
+            raise ValidationError(request_params.errors)
+        dashboard_info = services.find_owner_dashboard_information(request.user.owner.id,
+                                                                   request_params.validated_data['days'])
         response = serializers.OwnerDashboardSerializer(dashboard_info)
         return Response(response.data)
 
@@ -234,6 +273,52 @@ class GetHotelCreateInformation(APIView):
         return Response(response.data)
 
 
+class ListOwnerHotelRecentReviews(APIView):
+    permission_classes = [IsOwner]
+
+    @extend_schema(
+        summary='Get the recent reviews of a hotel, page by page - Owner',
+        tags=['Owner Dashboard'],
+        parameters=[serializers.RecentReviewsParamsSerializer],
+        responses=serializers.RecentReviewsPageSerializer
+    )
+    def get(self, request, *args, **kwargs):
+        hotel_id: int = kwargs.pop('hotel_id', None)
+        if hotel_id is None:
+            raise ValidationError({'detail': 'Provide the hotel id'})
+        hotel = services.find_hotel_by_id(hotel_id)
+        self.check_object_permissions(request, hotel)
+        request_params = serializers.RecentReviewsParamsSerializer(data=self.request.query_params)
+        if not request_params.is_valid():
+            raise ValidationError(request_params.errors)
+        reviews_page = services.find_hotel_recent_reviews(hotel_id, **request_params.validated_data)
+        response = serializers.RecentReviewsPageSerializer(reviews_page)
+        return Response(data=response.data, status=status.HTTP_200_OK)
+
+
+class GetOwnerHotelRoomTypeRevenues(APIView):
+    permission_classes = [IsOwner]
+
+    @extend_schema(
+        summary='Get the revenue of each room type of a hotel over a date range - Owner',
+        tags=['Owner Dashboard'],
+        parameters=[serializers.RoomTypeRevenuesParamsSerializer],
+        responses=serializers.RoomTypeRevenueDtoSerializer
+    )
+    def get(self, request, *args, **kwargs):
+        hotel_id: int = kwargs.pop('hotel_id', None)
+        if hotel_id is None:
+            raise ValidationError({'detail': 'Provide the hotel id'})
+        hotel = services.find_hotel_by_id(hotel_id)
+        self.check_object_permissions(request, hotel)
+        request_params = serializers.RoomTypeRevenuesParamsSerializer(data=self.request.query_params)
+        if not request_params.is_valid():
+            raise ValidationError(request_params.errors)
+        revenues = services.find_room_type_revenues(hotel_id, **request_params.validated_data)
+        response = serializers.RoomTypeRevenueDtoSerializer(revenues, many=True)
+        return Response(data=response.data, status=status.HTTP_200_OK)
+
+
 class ManageOwnerHotelDetailsView(APIView):
     permission_classes = [IsOwner]
     parser_classes = [JSONParser, MultiPartParser]
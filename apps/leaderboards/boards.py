@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.apps import apps
+
+
+@dataclass(frozen=True)
+class Board:
+    model: str  # Label of the model whose manager ranks the items
+    ranker: str  # Manager method building the rankings, called with the size
+    size: int  # Items kept in each ranking
+    max_age: timedelta  # Older rankings are still served, but a refresh is queued
+
+
+TOP_HOTELS = 'top_hotels'
+TOP_CITIES = 'top_cities'
+TOP_TOURS = 'top_tours'
+
+BOARDS = {
+    TOP_HOTELS: Board(model='hotels.Hotel', ranker='rank_hotels', size=20, max_age=timedelta(minutes=15)),
+    TOP_CITIES: Board(model='destinations.City', ranker='rank_cities', size=20, max_age=timedelta(minutes=15)),
+    TOP_TOURS: Board(model='touristicagencies.PeriodicTour', ranker='rank_tours', size=20,
+                     max_age=timedelta(minutes=15)),
+}
+
+
+def rank(board: str):
+    config = BOARDS[board]
+    manager = apps.get_model(config.model).objects
+    return getattr(manager, config.ranker)(config.size)
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=50)),
+                ('key', models.CharField(max_length=50)),
+                ('rank', models.PositiveIntegerField()),
+                ('item_id', models.IntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'leaderboard_entries',
+                'unique_together': {('board', 'key', 'rank')},
+            },
+        ),
+    ]
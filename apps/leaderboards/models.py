@@ -0,0 +1,71 @@
+from typing import Dict, List, Tuple
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
+
+from .boards import BOARDS, rank
+
+# The ranking of every item of a board, keyed by its scope ('all', 'city:<id>' ...)
+Rankings = Dict[str, List[Tuple[int, float]]]
+# Scope of the row written with every computed board, even an empty one, to tell it from a board never computed
+COMPUTED_MARKER_KEY = ''
+
+
+class LeaderboardEntryManager(models.Manager):
+
+    def replace_board(self, board: str, rankings: Rankings):
+        """
+        Swap the whole board at once, the readers keep seeing the previous rankings until the commit.
+        """
+        entries = [LeaderboardEntry(board=board, key=COMPUTED_MARKER_KEY, rank=0, item_id=0, score=0)]
+        entries += [
+            LeaderboardEntry(board=board, key=key, rank=rank, item_id=item_id, score=score)
+            for key, ranking in rankings.items()
+            for rank, (item_id, score) in enumerate(ranking, start=1)
+        ]
+        with transaction.atomic():
+            self.filter(board=board).delete()
+            self.bulk_create(entries, batch_size=1000)
+
+    def refresh_board(self, board: str) -> Rankings:
+        rankings = rank(board)
+        self.replace_board(board, rankings)
+        return rankings
+
+    def find_ranking(self, board: str, key: str = 'all', limit: int = None) -> List[Tuple[int, float]]:
+        """
+        Read a ranking, stale-while-revalidate: an outdated ranking is served as is while a refresh
+        is queued, a board never computed yet is served empty until its queued refresh lands.
+        """
+        entries = self.filter(board=board, key=key).order_by('rank').values_list('item_id', 'score', 'computed_at')
+        entries = list(entries[:limit] if limit is not None else entries)
+        if entries:
+            computed_at = entries[0][2]
+        else:
+            marker = self.filter(board=board, key=COMPUTED_MARKER_KEY)
+            computed_at = marker.values_list('computed_at', flat=True).first()
+        if computed_at is None or computed_at < timezone.now() - BOARDS[board].max_age:
+            self.schedule_refresh(board)
+        return [(item_id, score) for item_id, score, _ in entries]
+
+    def schedule_refresh(self, board: str):
+        from .tasks import refresh_leaderboard
+        # Readers of a stale or missing board queue a single refresh until the lock expires
+        if cache.add(f'leaderboards:{board}:refresh', True, timeout=BOARDS[board].max_age.total_seconds()):
+            transaction.on_commit(lambda: refresh_leaderboard.delay(board))
+
+
+class LeaderboardEntry(models.Model):
+    board = models.CharField(max_length=50)
+    key = models.CharField(max_length=50)
+    rank = models.PositiveIntegerField()
+    item_id = models.IntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(auto_now_add=True)
+    objects = LeaderboardEntryManager()
+
+    class Meta:
+        db_table = 'leaderboard_entries'
+        # Also the index reading a ranking in order
+        unique_together = ('board', 'key', 'rank')
@@ -0,0 +1,16 @@
+from apps.leaderboards.boards import BOARDS
+from apps.leaderboards.models import LeaderboardEntry
+from core.celery import app
+
+
+@app.task
+def refresh_leaderboard(board: str):
+    LeaderboardEntry.objects.refresh_board(board)
+    return "Done"
+
+
+@app.task
+def refresh_leaderboards():
+    for board in BOARDS:
+        LeaderboardEntry.objects.refresh_board(board)
+    return "Done"
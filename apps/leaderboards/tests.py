@@ -0,0 +1,56 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from .boards import TOP_CITIES
+from .models import LeaderboardEntry
+from .tasks import refresh_leaderboards
+from ..destinations.models import Country, City
+
+
+class LeaderboardTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        country = Country.objects.create(name='Algeria', country_code='213')
+        self.city = City.objects.create(name='Oran', country=country)
+
+    def get_top_cities(self):
+        response = self.client.get('/api/v1/destinations/top/')
+        self.assertEqual(response.status_code, 200)
+        return [city['id'] for city in response.json()]
+
+    def test_missing_board_is_served_empty_while_it_is_ranked_in_the_background(self):
+        with mock.patch('apps.leaderboards.tasks.refresh_leaderboard.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.get_top_cities(), [])
+                self.assertEqual(self.get_top_cities(), [])
+        delay.assert_called_once_with(TOP_CITIES)
+        self.assertFalse(LeaderboardEntry.objects.exists())
+        LeaderboardEntry.objects.refresh_board(TOP_CITIES)
+        self.assertEqual(self.get_top_cities(), [self.city.id])
+        self.assertEqual(LeaderboardEntry.objects.find_ranking(TOP_CITIES), [(self.city.id, 0)])
+
+    def test_stale_board_is_served_while_a_single_refresh_is_queued(self):
+        LeaderboardEntry.objects.refresh_board(TOP_CITIES)
+        LeaderboardEntry.objects.update(computed_at=timezone.now() - timedelta(hours=1))
+        with mock.patch('apps.leaderboards.tasks.refresh_leaderboard.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.get_top_cities(), [self.city.id])
+                self.assertEqual(self.get_top_cities(), [self.city.id])
+        delay.assert_called_once_with(TOP_CITIES)
+
+    def test_empty_board_is_served_empty(self):
+        refresh_leaderboards()
+        cache.clear()
+        with mock.patch('apps.leaderboards.tasks.refresh_leaderboard.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                for url in ('/api/v1/hotels/top/', '/api/v1/agencies/top-tours/'):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json(), [])
+        # Computed empty, not ranked again until it is stale
+        delay.assert_not_called()
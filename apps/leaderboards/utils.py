@@ -0,0 +1,22 @@
+from typing import Dict, List
+
+
+def min_max_normalize(values: List[float]) -> List[float]:
+    """
+    Scale the values to [0, 1], a feature without any spread gives 0 to everyone.
+    """
+    values = [value or 0 for value in values]
+    lowest, highest = min(values, default=0), max(values, default=0)
+    if highest == lowest:
+        return [0.0] * len(values)
+    return [(value - lowest) / (highest - lowest) for value in values]
+
+
+def compute_scores(features: Dict[str, List[float]], weights: Dict[str, float]) -> List[float]:
+    """
+    Weighted sum of the normalized features, each feature is normalized over all the items at once
+    so that no feature dominates because of its unit.
+    """
+    normalized = {name: min_max_normalize(values) for name, values in features.items()}
+    nb_items = len(next(iter(features.values()), []))
+    return [sum(weights[name] * normalized[name][i] for name in weights) for i in range(nb_items)]
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class SearchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.search'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        connection_created.connect(register_sqlite_functions)
+
+
+def register_sqlite_functions(sender, connection, **kwargs):
+    # MySQL gets _levenshtein_ratio installed by hand, SQLite runs the Python one
+    if connection.vendor == 'sqlite':
+        from .ranking import levenshtein_ratio
+        connection.connection.create_function('_levenshtein_ratio', 2, levenshtein_ratio, deterministic=True)
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from core.utils import get_cache_version, bump_cache_version
+from .dtos import SearchItem
+from .utils import to_search_key
+
+# Results kept by each process, the least recently used are evicted first
+RESULTS_CACHE_MAX_SIZE = 1024
+# Seconds a result is served, the relevances follow the trigram index rebuilt as often
+RESULTS_CACHE_TIMEOUT = 5 * 60
+RESULTS_VERSION_KEY = 'quick_search_results_version'
+
+
+class ResultCache:
+    """
+    Least recently used results of a process, counting how often a search is answered from it.
+    """
+
+    def __init__(self, max_size: int = RESULTS_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[SearchItem]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, results = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return results
+
+    def set(self, key: str, results: List[SearchItem], timeout: float):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def record(self, outcome: str):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = sum(self.stats.values())
+            return {
+                'hits': self.stats['hit'],
+                'shared_hits': self.stats['shared_hit'],
+                'misses': self.stats['miss'],
+                'hit_ratio': (self.stats['hit'] + self.stats['shared_hit']) / lookups if lookups else 0.0,
+                'size': len(self.entries),
+                'max_size': self.max_size,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.stats.clear()
+
+
+_results = ResultCache()
+
+
+def get_shared_backend():
+    return caches[settings.QUICK_SEARCH_CACHE_ALIAS] if settings.QUICK_SEARCH_CACHE_ALIAS else None
+
+
+def bump_version():
+    # The version lives next to the shared results, so a change seen by one worker reaches the others
+    bump_cache_version(RESULTS_VERSION_KEY, get_shared_backend() or cache)
+
+
+def get_results(search_type: str, keyword: str, search: Callable[[str], List[SearchItem]]) -> List[SearchItem]:
+    """
+    Results of the search for the keyword, read from the process, then from the shared backend, and only
+    searched when neither has them for the current version. The searches only read the search key of the
+    keyword, the keywords sharing it ('Béjaïa', 'bejaia', 'بجاية') share an entry.
+    """
+    shared_backend = get_shared_backend()
+    version = get_cache_version(RESULTS_VERSION_KEY, shared_backend or cache)
+    key = f'quick_search:{version}:{search_type}:{to_search_key(keyword)}'
+    results = _results.get(key)
+    if results is not None:
+        _results.record('hit')
+        return results
+    if shared_backend is not None:
+        results = shared_backend.get(key)
+    if results is not None:
+        _results.record('shared_hit')
+    else:
+        _results.record('miss')
+        results = search(keyword)
+        if shared_backend is not None:
+            shared_backend.set(key, results, RESULTS_CACHE_TIMEOUT)
+    _results.set(key, results, RESULTS_CACHE_TIMEOUT)
+    return results
+
+
+def get_stats() -> Dict[str, float]:
+    return _results.get_stats()
+
+
+def clear():
+    _results.clear()
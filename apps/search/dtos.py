@@ -1,6 +1,7 @@
 from dataclasses import dataclass
+from datetime import date
 
-from typing import List
+from typing import List, Optional
 
 from apps.hotels.models import Amenity
 
@@ -15,6 +16,23 @@ class SearchItem:
     relevance: float
 
 
+@dataclass
+class QuickSearchCacheStats:
+    hits: int
+    shared_hits: int
+    misses: int
+    hit_ratio: float
+    size: int
+    max_size: int
+
+
+@dataclass
+class Suggestion:
+    id: int
+    type: str
+    name: str
+
+
 @dataclass
 class HotelItem:
     id: int
@@ -23,3 +41,23 @@ class HotelItem:
     starts_from: int
     hotel_amenities: List[Amenity]
     is_liked: bool
+
+
+@dataclass
+class CitySearchItem:
+    id: int
+    type: str
+    name: str
+    image: str
+    rating: float
+    reviews_count: int
+    # Cheapest nightly price of the rooms hosting the party for a hotel, the price per person for a tour
+    starts_from: int
+    total_price: int
+    available_on: date
+
+
+@dataclass
+class CitySearchPage:
+    items: List[CitySearchItem]
+    next_cursor: Optional[str]
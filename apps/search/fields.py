@@ -0,0 +1,40 @@
+from django.db import models
+
+from .utils import to_search_key, to_skeleton_key
+
+
+class SearchKeyField(models.CharField):
+    """
+    Search key of the source field, computed whenever the row is saved, the searches match on it
+    instead of comparing the raw names.
+    """
+
+    def __init__(self, source: str, **kwargs):
+        self.source = source
+        kwargs.setdefault('max_length', 255)
+        kwargs.setdefault('default', '')
+        kwargs.setdefault('db_index', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(**kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def compute(self, text: str) -> str:
+        return to_search_key(text)
+
+    def pre_save(self, model_instance, add):
+        value = self.compute(getattr(model_instance, self.source))[:self.max_length]
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class SearchSkeletonField(SearchKeyField):
+    """
+    Consonant skeleton of the search key of the source field, matched as is by the searches.
+    """
+
+    def compute(self, text: str) -> str:
+        return to_skeleton_key(to_search_key(text))
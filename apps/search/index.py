@@ -0,0 +1,157 @@
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Set, Iterable, Tuple
+
+from django.apps import apps
+
+from .ranking import levenshtein_ratios, MIN_NAME_RATIO, SKELETON_MATCH_RATIO
+from .utils import get_trigrams, normalize, to_search_key, to_skeleton_key
+
+# Share of the trigrams of the keyword an item needs to be a candidate
+MIN_TRIGRAM_SIMILARITY = 0.25
+# Seconds before an index is rebuilt, it catches the changes made by the other worker processes
+INDEX_MAX_AGE = 5 * 60
+
+# The searchable sources: model and displayed name, the index holds their search_key
+SOURCES = {
+    'hotel': ('hotels.Hotel', 'name'),
+    'tour': ('touristicagencies.PeriodicTour', 'title'),
+    'agency': ('touristicagencies.TouristicAgency', 'name'),
+    'city': ('destinations.City', 'name'),
+}
+
+
+class TrigramIndex:
+    """
+    Inverted index from the trigrams of a search key to the ids of the items holding it, along with
+    the items sharing each skeleton.
+    """
+
+    def __init__(self, items: Iterable[Tuple[int, str]] = ()):
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        self.trigrams: Dict[int, Set[str]] = {}
+        self.texts: Dict[int, str] = {}
+        self.skeletons: Dict[str, Set[int]] = defaultdict(set)
+        self.lock = threading.Lock()
+        self.built_at = time.monotonic()
+        for item_id, text in items:
+            self._add(item_id, text)
+
+    def _add(self, item_id: int, text: str):
+        trigrams = get_trigrams(text or '')
+        self.trigrams[item_id] = trigrams
+        self.texts[item_id] = normalize(text or '')
+        self.skeletons[to_skeleton_key(self.texts[item_id])].add(item_id)
+        for trigram in trigrams:
+            self.postings[trigram].add(item_id)
+
+    def _remove(self, item_id: int):
+        text = self.texts.pop(item_id, None)
+        if text is not None:
+            skeleton = to_skeleton_key(text)
+            self.skeletons[skeleton].discard(item_id)
+            if not self.skeletons[skeleton]:
+                del self.skeletons[skeleton]
+        for trigram in self.trigrams.pop(item_id, ()):
+            self.postings[trigram].discard(item_id)
+            if not self.postings[trigram]:
+                del self.postings[trigram]
+
+    def update(self, item_id: int, text: str):
+        with self.lock:
+            self._remove(item_id)
+            self._add(item_id, text)
+
+    def remove(self, item_id: int):
+        with self.lock:
+            self._remove(item_id)
+
+    def candidates(self, keyword: str) -> Set[int]:
+        """
+        Items sharing enough trigrams with the keyword, plus every item containing the keyword
+        as a substring, which holds all of its inner trigrams, and the items sharing its skeleton.
+        """
+        trigrams = get_trigrams(keyword)
+        inner_trigrams = get_trigrams(keyword, padded=False)
+        min_shared = max(1, math.ceil(len(trigrams) * MIN_TRIGRAM_SIMILARITY))
+        shared = defaultdict(int)
+        with self.lock:
+            for trigram in trigrams:
+                for item_id in self.postings.get(trigram, ()):
+                    shared[item_id] += 1
+            containing = set.intersection(*[self.postings.get(trigram, set()) for trigram in inner_trigrams]) \
+                if inner_trigrams else set()
+            same_skeleton = set(self.skeletons.get(to_skeleton_key(normalize(keyword)), ()))
+        return {item_id for item_id, count in shared.items() if count >= min_shared} | containing | same_skeleton
+
+    def rank(self, keyword: str, limit: int = None) -> Dict[int, float]:
+        """
+        Relevance of the candidates computed here rather than by the database: 1 for the items containing
+        the keyword, else the edit-distance ratio, raised to SKELETON_MATCH_RATIO for the candidates sharing
+        the skeleton of the keyword. Only the relevant ones are kept, the best `limit` of them when given.
+        """
+        keyword = normalize(keyword)
+        candidates = self.candidates(keyword)
+        skeleton = to_skeleton_key(keyword)
+        with self.lock:
+            texts = [(item_id, self.texts[item_id]) for item_id in candidates if item_id in self.texts]
+        relevances = {item_id: 1.0 for item_id, text in texts if keyword in text}
+        fuzzy = [(item_id, text) for item_id, text in texts if item_id not in relevances]
+        ratios = levenshtein_ratios(keyword, [text for _, text in fuzzy])
+        for (item_id, text), ratio in zip(fuzzy, ratios):
+            if to_skeleton_key(text) == skeleton:
+                ratio = max(ratio, SKELETON_MATCH_RATIO)
+            if ratio > MIN_NAME_RATIO:
+                relevances[item_id] = ratio
+        if limit is not None and len(relevances) > limit:
+            relevances = dict(heapq.nlargest(limit, relevances.items(), key=lambda item: (item[1], -item[0])))
+        return relevances
+
+
+_indexes: Dict[str, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def build_index(source: str) -> TrigramIndex:
+    model, _ = SOURCES[source]
+    return TrigramIndex(apps.get_model(model).objects.values_list('id', 'search_key').iterator(chunk_size=5000))
+
+
+def get_index(source: str) -> TrigramIndex:
+    """
+    Index of a source, built by the first search of the process and rebuilt once too old.
+    """
+    index = _indexes.get(source)
+    if index is None or time.monotonic() - index.built_at > INDEX_MAX_AGE:
+        with _indexes_lock:
+            index = _indexes.get(source)
+            if index is None or time.monotonic() - index.built_at > INDEX_MAX_AGE:
+                index = _indexes[source] = build_index(source)
+    return index
+
+
+def find_candidates(source: str, keyword: str) -> Set[int]:
+    return get_index(source).candidates(to_search_key(keyword))
+
+
+def rank(source: str, keyword: str, limit: int = None) -> Dict[int, float]:
+    return get_index(source).rank(to_search_key(keyword), limit)
+
+
+def update_item(source: str, item_id: int, search_key: str):
+    # An index not built yet reads the change from the database when it is
+    if source in _indexes:
+        _indexes[source].update(item_id, search_key)
+
+
+def remove_item(source: str, item_id: int):
+    if source in _indexes:
+        _indexes[source].remove(item_id)
+
+
+def reset_indexes():
+    with _indexes_lock:
+        _indexes.clear()
@@ -0,0 +1,80 @@
+import json
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.search import services
+
+
+def search_with_process_pool(keyword: str):
+    """
+    The quick search before the shared pool: a pool of processes forked for every request.
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(source, keyword) for source in
+                   [services.do_quick_search_hotels, services.do_quick_search_tours,
+                    services.do_quick_search_agencies, services.do_quick_search_cities]]
+        for future in futures:
+            results.append(future.result())
+    return services.merge_top(results, services.QUICK_SEARCH_LIMIT)
+
+
+PATHS = {
+    'process_pool': search_with_process_pool,
+    'shared_pool': services.do_quick_search,
+}
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the quick search of all the sources against the configured database, the process pool '
+            'forked per request against the pool shared by the worker, then report the latencies')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keywords', nargs='+', default=['alger', 'oran', 'constantine', 'hotel'])
+        parser.add_argument('--requests', type=int, default=100, help='Searches per path')
+        parser.add_argument('--concurrency', type=int, default=4, help='Searches running at the same time')
+        parser.add_argument('--paths', nargs='+', choices=list(PATHS), default=list(PATHS))
+        parser.add_argument('--output', help='Write the report to this json file')
+
+    def handle(self, *args, **options):
+        keywords = list(islice(cycle(options['keywords']), options['requests']))
+        report = {name: self.run(PATHS[name], keywords, options['concurrency']) for name in options['paths']}
+        self.stdout.write(json.dumps(report, indent=2))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+    def run(self, search, keywords, concurrency):
+        # Warm up, the first search of the shared path starts its threads
+        self.search(search, keywords[0])
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda keyword: self.search(search, keyword), keywords))
+        elapsed = time.perf_counter() - started_at
+        latencies = sorted(latency for _, latency in results)
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'searches': len(results),
+            'searches_per_second': round(len(results) / elapsed, 2),
+            'latency_ms': {'p50': round(percentiles[49], 2), 'p95': round(percentiles[94], 2),
+                           'p99': round(percentiles[98], 2)},
+            'outcomes': dict(Counter(outcome for outcome, _ in results)),
+        }
+
+    def search(self, search, keyword):
+        started_at = time.perf_counter()
+        try:
+            search(keyword)
+            outcome = 'ok'
+        except Exception as e:
+            outcome = f'error: {e.__class__.__name__}'
+        finally:
+            connections.close_all()
+        return outcome, (time.perf_counter() - started_at) * 1000
@@ -0,0 +1,97 @@
+from typing import Dict, List
+
+from django.db.models import Func, FloatField, Case, When, Value, F
+from django.db.models.functions import Greatest
+
+from .utils import normalize, to_search_key, to_skeleton_key
+
+# Relevance a name needs to be found by a search
+MIN_NAME_RATIO = 0.3
+# Relevance of an item whose skeleton is the keyword's, whatever its edit distance
+SKELETON_MATCH_RATIO = 0.6
+
+
+class LevenshteinRatio(Func):
+    """
+    Edit-distance ratio computed by the database, the _levenshtein_ratio function is installed by hand
+    on MySQL and registered from levenshtein_ratio on SQLite.
+    """
+    function = "_levenshtein_ratio"
+    output_field = FloatField()
+
+
+def get_pattern_masks(pattern: str) -> Dict[str, int]:
+    # Bit i of the mask of a character is set when the pattern holds it at position i
+    masks = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | 1 << i
+    return masks
+
+
+def _distance(masks: Dict[str, int], length: int, text: str) -> int:
+    """
+    Myers' bit-parallel edit distance: the vertical deltas of a whole column of the dynamic
+    programming matrix are kept in two bit vectors and updated at once for every character
+    of the text. Python integers have no width limit, the pattern can be of any length.
+    """
+    if length == 0:
+        return len(text)
+    all_ones = (1 << length) - 1
+    last_bit = 1 << (length - 1)
+    positive, negative, score = all_ones, 0, length
+    for char in text:
+        matches = masks.get(char, 0)
+        vertical = matches | negative
+        horizontal = (((matches & positive) + positive) ^ positive) | matches
+        horizontal_positive = negative | (~(horizontal | positive) & all_ones)
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last_bit:
+            score += 1
+        elif horizontal_negative & last_bit:
+            score -= 1
+        horizontal_positive = ((horizontal_positive << 1) | 1) & all_ones
+        horizontal_negative = (horizontal_negative << 1) & all_ones
+        positive = horizontal_negative | (~(vertical | horizontal_positive) & all_ones)
+        negative = horizontal_positive & vertical
+    return score
+
+
+def levenshtein_ratios(keyword: str, texts: List[str]) -> List[float]:
+    """
+    Similarity of the keyword with every text, 1 - distance / longest length over the normalized
+    strings, the keyword masks are built once for the whole batch.
+    """
+    keyword = normalize(keyword)
+    masks = get_pattern_masks(keyword)
+    ratios = []
+    for text in texts:
+        text = normalize(text or '')
+        longest = max(len(keyword), len(text))
+        ratios.append(1 - _distance(masks, len(keyword), text) / longest if longest else 1.0)
+    return ratios
+
+
+def levenshtein_ratio(text: str, keyword: str) -> float:
+    if text is None or keyword is None:
+        return None
+    return levenshtein_ratios(keyword, [text])[0]
+
+
+def relevance_expression(relevances: Dict[int, float]) -> Case:
+    # Ratios ranked in Python, handed back to the query as a constant per id
+    return Case(*[When(id=item_id, then=Value(ratio)) for item_id, ratio in relevances.items()],
+                default=Value(0.0), output_field=FloatField())
+
+
+def keyword_ratio_expression(keyword: str) -> Case:
+    # The database counterpart of TrigramIndex.rank, over the search_key and search_skeleton columns
+    search_key = to_search_key(keyword)
+    return Case(
+        When(search_key__contains=search_key, then=Value(1.0)),
+        default=Greatest(
+            LevenshteinRatio(F('search_key'), Value(search_key)),
+            Case(When(search_skeleton=to_skeleton_key(search_key), then=Value(SKELETON_MATCH_RATIO)),
+                 default=Value(0.0), output_field=FloatField()),
+        ),
+        output_field=FloatField(),
+    )
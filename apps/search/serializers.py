@@ -2,7 +2,8 @@ from rest_framework import serializers
 from rest_framework_dataclasses.serializers import DataclassSerializer
 
 from apps.hotels.models import Amenity
-from apps.search.dtos import SearchItem
+from apps.search.dtos import SearchItem, Suggestion, QuickSearchCacheStats, CitySearchItem, CitySearchPage
+from apps.search.utils import SearchType
 
 
 class GeneralSearchSerializer(serializers.Serializer):
@@ -26,12 +27,30 @@ class SearchItemSerializer(DataclassSerializer):
         dataclass = SearchItem
 
 
+class QuickSearchCacheStatsSerializer(DataclassSerializer):
+    class Meta:
+        dataclass = QuickSearchCacheStats
+
+
+class SuggestParamsSerializer(serializers.Serializer):
+    q = serializers.CharField(help_text='The first characters typed')
+    type = serializers.ChoiceField(choices=list(SearchType), default=SearchType.ALL)
+    limit = serializers.IntegerField(default=8, min_value=1, max_value=20)
+
+
+class SuggestionSerializer(DataclassSerializer):
+    class Meta:
+        dataclass = Suggestion
+
+
 class SearchByCitySerializer(serializers.Serializer):
     city_id = serializers.IntegerField()
     start_date = serializers.DateField()
     end_date = serializers.DateField()
-    number_of_adults = serializers.IntegerField()
-    number_of_children = serializers.IntegerField()
+    number_of_adults = serializers.IntegerField(min_value=1)
+    number_of_children = serializers.IntegerField(min_value=0, default=0)
+    cursor = serializers.CharField(required=False, help_text='The next_cursor of the previous page')
+    limit = serializers.IntegerField(default=20, min_value=1, max_value=50)
 
     def validate(self, data):
         # Check that start_date is before end_date.
@@ -42,3 +61,15 @@ class SearchByCitySerializer(serializers.Serializer):
         return data
 
 
+class CitySearchItemSerializer(DataclassSerializer):
+    class Meta:
+        dataclass = CitySearchItem
+
+
+class CitySearchPageSerializer(DataclassSerializer):
+    items = CitySearchItemSerializer(many=True)
+
+    class Meta:
+        dataclass = CitySearchPage
+
+
@@ -1,67 +1,275 @@
-from concurrent.futures import ProcessPoolExecutor
-from datetime import datetime, time
-from typing import List
+import heapq
+import logging
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import chain, islice
+from datetime import date, datetime, time
+from typing import List, Callable, Iterator, NamedTuple, Optional, Tuple
 
-from apps.hotels.models import Hotel
-from apps.search.dtos import SearchItem
+from django.db import close_old_connections
+from rest_framework.exceptions import ValidationError
+
+from apps.hotels.models import Hotel, RoomType
+from apps.search.dtos import SearchItem, Suggestion, QuickSearchCacheStats, CitySearchItem, CitySearchPage
+from . import index, cache
 from .converters import SearchItemConverter
+from .suggest import get_index as get_suggest_index, SUGGESTION_TYPES
+from .utils import SearchType, encode_cursor, decode_cursor
 from ..destinations.models import City
 from ..touristicagencies.models import PeriodicTour, TouristicAgency
 
 # Quick Search Part
 
 converter = SearchItemConverter()
+logger = logging.getLogger(__name__)
+
+# Threads shared by the quick searches of a worker process, one per source
+QUICK_SEARCH_MAX_WORKERS = 4
+# Seconds a quick search waits for its sources, the late ones are left out of the response
+QUICK_SEARCH_TIMEOUT = 1.5
+# Items returned by a quick search, each source reads no more rows than that
+QUICK_SEARCH_LIMIT = 10
+# Ranked candidates a source reads beyond its limit, in place of the hidden items its query leaves out
+QUICK_SEARCH_CANDIDATES_MARGIN = 10
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=QUICK_SEARCH_MAX_WORKERS,
+                                               thread_name_prefix='quick-search')
+    return _executor
+
+
+def _reset_executor():
+    # The threads of the parent do not survive a fork, the child builds its own pool
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executor)
+
 
+def _run_source(source: Callable[[str, int], List[SearchItem]], keyword: str, limit: int) -> List[SearchItem]:
+    # The pool threads outlive the requests, their connections are recycled like at the end of a request
+    close_old_connections()
+    try:
+        return source(keyword, limit)
+    finally:
+        close_old_connections()
 
-def do_quick_search_hotels(keyword) -> List[SearchItem]:
-    hotels = Hotel.objects.find_by_keyword(keyword)
+
+def fan_out(sources: List[Callable[[str, int], List[SearchItem]]], keyword: str, limit: int = QUICK_SEARCH_LIMIT,
+            timeout: float = QUICK_SEARCH_TIMEOUT) -> List[List[SearchItem]]:
+    """
+    Run the sources concurrently on the shared pool and gather what they found before the timeout,
+    one list per source, a slow or failing source only loses its own results.
+    """
+    futures = {get_executor().submit(_run_source, source, keyword, limit): source for source in sources}
+    done, not_done = wait(futures, timeout=timeout)
+    results = []
+    for future in futures:
+        if future in not_done:
+            logger.warning('Quick search source %s timed out', futures[future].__name__)
+        elif future.exception() is not None:
+            logger.error('Quick search source %s failed', futures[future].__name__, exc_info=future.exception())
+        else:
+            results.append(future.result())
+    return results
+
+
+def merge_top(results: List[List[SearchItem]], limit: int) -> List[SearchItem]:
+    """
+    K-way merge of the lists already sorted by decreasing relevance, stopped once the limit is reached.
+    """
+    return list(islice(heapq.merge(*results, key=lambda item: -item.relevance), limit))
+
+
+def do_quick_search_hotels(keyword: str, limit: int = QUICK_SEARCH_LIMIT) -> List[SearchItem]:
+    hotels = Hotel.objects.find_by_keyword(keyword, index.rank('hotel', keyword, limit + QUICK_SEARCH_CANDIDATES_MARGIN)).select_related(
+        'city__country'
+    ).only('name', 'address', 'cover_img', 'city__name', 'city__country__name')[:limit]
     return converter.convert_hotels_to_dtos_list(hotels)
 
 
-def do_quick_search_agencies(keyword) -> List[SearchItem]:
-    agencies = TouristicAgency.objects.find_by_keyword(keyword)
+def do_quick_search_agencies(keyword: str, limit: int = QUICK_SEARCH_LIMIT) -> List[SearchItem]:
+    agencies = TouristicAgency.objects.find_by_keyword(keyword, index.rank('agency', keyword, limit + QUICK_SEARCH_CANDIDATES_MARGIN)).select_related(
+        'city__country'
+    ).only('name', 'address', 'cover_img', 'city__name', 'city__country__name')[:limit]
     return converter.convert_agencies_to_dtos_list(agencies)
 
 
-def do_quick_search_tours(keyword) -> List[SearchItem]:
-    tours = PeriodicTour.objects.find_by_keyword(keyword)
-    print(tours)
+def do_quick_search_tours(keyword: str, limit: int = QUICK_SEARCH_LIMIT) -> List[SearchItem]:
+    tours = PeriodicTour.objects.find_by_keyword(keyword, index.rank('tour', keyword, limit + QUICK_SEARCH_CANDIDATES_MARGIN)).select_related(
+        'city__country'
+    ).only('title', 'cover_img', 'city__name', 'city__country__name')[:limit]
     return converter.convert_tours_to_dtos_list(tours)
 
 
-def do_quick_search_cities(keyword) -> List[SearchItem]:
-    cities = City.objects.find_by_keyword(keyword)
-    for city in cities:
-        print(f"{city.name} : {city.name_ratio}")
+def do_quick_search_cities(keyword: str, limit: int = QUICK_SEARCH_LIMIT) -> List[SearchItem]:
+    cities = City.objects.find_by_keyword(keyword, index.rank('city', keyword, limit + QUICK_SEARCH_CANDIDATES_MARGIN)).select_related(
+        'country'
+    ).only('name', 'cover_img', 'country__name')[:limit]
     return converter.convert_cities_to_dtos_list(cities)
 
 
-def quicksort(arr: List[SearchItem]) -> List[SearchItem]:
-    if len(arr) <= 1:
-        return arr
-    pivot = arr[len(arr) // 2].relevance
-    left = [item for item in arr if item.relevance < pivot]
-    middle = [item for item in arr if item.relevance == pivot]
-    right = [item for item in arr if item.relevance > pivot]
-    return quicksort(right) + middle + quicksort(left)
+def do_quick_search(keyword: str, limit: int = QUICK_SEARCH_LIMIT) -> List[SearchItem]:
+    results = fan_out([do_quick_search_hotels, do_quick_search_tours, do_quick_search_agencies,
+                       do_quick_search_cities], keyword, limit)
+    return merge_top(results, limit)
 
 
-def do_quick_search(keyword: str) -> List[SearchItem]:
-    results = []
-    with ProcessPoolExecutor(max_workers=4) as executor:
-        futures = [executor.submit(f, keyword) for f in
-                   [do_quick_search_hotels, do_quick_search_tours, do_quick_search_agencies, do_quick_search_cities]]
-        for future in futures:
-            results.extend(future.result())
-    return quicksort(results)
+QUICK_SEARCHES = {
+    SearchType.ALL: do_quick_search,
+    SearchType.HOTELS: do_quick_search_hotels,
+    SearchType.TOURS: do_quick_search_tours,
+    SearchType.DESTINATIONS: do_quick_search_cities,
+}
+
+
+def quick_search(keyword: str, search_type: SearchType) -> List[SearchItem]:
+    return cache.get_results(search_type, keyword, QUICK_SEARCHES[search_type])
+
+
+def get_quick_search_cache_stats() -> QuickSearchCacheStats:
+    return QuickSearchCacheStats(**cache.get_stats())
+
+
+# Suggestions Part
+
+SUGGESTION_SOURCES = {
+    SearchType.ALL: None,
+    SearchType.HOTELS: {'hotel'},
+    SearchType.TOURS: {'tour'},
+    SearchType.DESTINATIONS: {'city'},
+}
+
+
+def suggest(prefix: str, search_type: SearchType, limit: int) -> List[Suggestion]:
+    """
+    Type-ahead from the in-memory prefix index, the database is only read when the index is rebuilt.
+    """
+    return [Suggestion(item_id, SUGGESTION_TYPES[source], name)
+            for source, item_id, name in get_suggest_index().suggest(prefix, limit, SUGGESTION_SOURCES[search_type])]
 
 
 # Detailed Search By City Part
 
-def get_available_hotels_by_city(search_request: dict):
-    check_in = datetime.combine(search_request['check_in'], time(13, 0))
-    check_out = datetime.combine(search_request['check_out'], time(12, 0))
-    hotels = Hotel.objects.find_available_hotels_by_city_id(search_request['city_id'])
-    pass
+CITY_SEARCH_PAGE_SIZE = 20
+
+
+class CityMatch(NamedTuple):
+    # Best rated first, then the most reviewed, then the cheapest
+    key: Tuple[float, int, int, str, int]
+    starts_from: int
+    total_price: int
+    available_on: date
+
+
+def get_cheapest_rooms_price(room_types: List[Tuple[int, int, int]], nb_guests: int) -> Optional[int]:
+    """
+    Lowest nightly price of the rooms hosting all the guests, from (price, number_of_guests, available_rooms)
+    of the free room types. Bounded knapsack over the number of guests hosted, more rooms than guests
+    are never needed.
+    """
+    unreachable = float('inf')
+    cheapest = [0] + [unreachable] * nb_guests
+    for price, capacity, available_rooms in room_types:
+        for _ in range(min(available_rooms, nb_guests)):
+            for hosted in range(nb_guests, 0, -1):
+                with_room = cheapest[max(hosted - capacity, 0)] + price
+                if with_room < cheapest[hosted]:
+                    cheapest[hosted] = with_room
+    return None if cheapest[nb_guests] == unreachable else cheapest[nb_guests]
+
+
+def find_city_hotel_matches(city_id: int, check_in: date, check_out: date, nb_guests: int) -> Iterator[CityMatch]:
+    candidates = Hotel.objects.find_search_candidates_by_city_id(city_id)
+    if not candidates:
+        return
+    room_types = defaultdict(list)
+    for hotel_id, price, capacity, available_rooms in RoomType.objects.find_available_room_types_by_hotel_ids(
+            [hotel_id for hotel_id, _, _ in candidates],
+            datetime.combine(check_in, time(13, 0)),
+            datetime.combine(check_out, time(12, 0))
+    ).values_list('hotel_id', 'price_per_night', 'number_of_guests', 'available_rooms_count'):
+        room_types[hotel_id].append((price, capacity, available_rooms))
+    nb_nights = (check_out - check_in).days
+    for hotel_id, rating_avg, reviews_count in candidates:
+        nightly_price = get_cheapest_rooms_price(room_types[hotel_id], nb_guests)
+        if nightly_price is not None:
+            total_price = nightly_price * nb_nights
+            yield CityMatch((-float(rating_avg), -reviews_count, total_price, 'hotel', hotel_id), nightly_price,
+                            total_price, check_in)
+
+
+def find_city_tour_matches(city_id: int, first_day: date, last_day: date, nb_guests: int) -> Iterator[CityMatch]:
+    candidates = PeriodicTour.objects.find_search_candidates_by_city_id(city_id)
+    if not candidates:
+        return
+    first_dates = PeriodicTour.objects.find_first_dates([tour_id for tour_id, _, _, _ in candidates],
+                                                        first_day, last_day)
+    for tour_id, price, rating_avg, reviews_count in candidates:
+        if tour_id in first_dates:
+            total_price = price * nb_guests
+            yield CityMatch((-float(rating_avg), -reviews_count, total_price, 'tour', tour_id), price, total_price,
+                            first_dates[tour_id])
+
+
+def get_city_search_items(matches: List[CityMatch]) -> List[CitySearchItem]:
+    # Only the items of the page are read in full, one query per type
+    hotel_ids = [match.key[4] for match in matches if match.key[3] == 'hotel']
+    tour_ids = [match.key[4] for match in matches if match.key[3] == 'tour']
+    hotels = Hotel.objects.only('name', 'cover_img').in_bulk(hotel_ids) if hotel_ids else {}
+    tours = PeriodicTour.objects.only('title', 'cover_img').in_bulk(tour_ids) if tour_ids else {}
+    items = []
+    for match in matches:
+        rating_avg, reviews_count, total_price, item_type, item_id = match.key
+        if item_type == 'hotel':
+            name, image = hotels[item_id].name, hotels[item_id].cover_img
+        else:
+            name, image = tours[item_id].title, tours[item_id].cover_img
+        items.append(CitySearchItem(item_id, item_type, name, image.url if image else None, -rating_avg,
+                                    -reviews_count, match.starts_from, total_price, match.available_on))
+    return items
+
+
+def search_by_city(city_id: int, start_date: date, end_date: date, number_of_adults: int, number_of_children: int,
+                   cursor: str = None, limit: int = CITY_SEARCH_PAGE_SIZE) -> CitySearchPage:
+    """
+    Hotels hosting the whole party over the stay and tours held during it, ranked together.
+    Each stage reads the ids of the previous one in a single query: the candidates of the city, their
+    availability, then the items of the page, so the queries do not grow with the size of the city.
+    The tours take any party, a scheduled tour has no capacity to check it against.
+    Ranking needs the availability of every candidate, so their short tuples are read for the whole
+    city, but the matches are streamed through a heap of one page, never kept in a list.
+    """
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise ValidationError({'detail': 'Invalid cursor'})
+    nb_guests = number_of_adults + number_of_children
+    matches = chain(find_city_hotel_matches(city_id, start_date, end_date, nb_guests),
+                    find_city_tour_matches(city_id, start_date, end_date, nb_guests))
+    if after is not None:
+        matches = (match for match in matches if match.key > after)
+    try:
+        # One more match tells if there is a next page
+        page = heapq.nsmallest(limit + 1, matches)
+    except TypeError:
+        raise ValidationError({'detail': 'Invalid cursor'})
+    page, next_matches = page[:limit], page[limit:]
+    next_cursor = encode_cursor(page[-1].key) if next_matches else None
+    return CitySearchPage(get_city_search_items(page), next_cursor)
 
 
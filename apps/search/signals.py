@@ -0,0 +1,28 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from . import cache, index, suggest
+
+
+def _connect(source: str, model: str, field: str):
+    def on_save(sender, instance, **kwargs):
+        name, search_key = getattr(instance, field), instance.search_key
+        transaction.on_commit(lambda: index.update_item(source, instance.pk, search_key))
+        transaction.on_commit(lambda: suggest.update_item(source, instance, name))
+        # A renamed, hidden or moved item changes the cached results it appears in
+        transaction.on_commit(cache.bump_version)
+
+    def on_delete(sender, instance, **kwargs):
+        item_id = instance.pk
+        transaction.on_commit(lambda: index.remove_item(source, item_id))
+        transaction.on_commit(lambda: suggest.remove_item(source, item_id))
+        transaction.on_commit(cache.bump_version)
+
+    model_class = apps.get_model(model)
+    post_save.connect(on_save, sender=model_class, weak=False, dispatch_uid=f'search_index_save_{source}')
+    post_delete.connect(on_delete, sender=model_class, weak=False, dispatch_uid=f'search_index_delete_{source}')
+
+
+for source, (model, field) in index.SOURCES.items():
+    _connect(source, model, field)
@@ -0,0 +1,162 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Tuple
+
+from django.apps import apps
+from django.db.models import Sum, Value, F
+from django.db.models.functions import Coalesce
+from sql_util.aggregates import SubqueryCount
+
+from .utils import to_search_key
+
+# Seconds before the suggestions are rebuilt, to refresh the popularity and the changes of the other processes
+SUGGEST_MAX_AGE = 5 * 60
+# Type of the suggestions of each source, the same as the quick search items
+SUGGESTION_TYPES = {'hotel': 'hotel', 'tour': 'tour', 'agency': 'agency', 'city': 'destination'}
+
+
+def _load_hotels():
+    from apps.hotels.enums import HotelStatus
+    return apps.get_model('hotels.Hotel').objects.filter(status=HotelStatus.VISIBLE).annotate(
+        popularity=Coalesce(F('stats__reservations_count'), Value(0)) + Coalesce(F('stats__reviews_count'), Value(0))
+    ).values_list('id', 'name', 'popularity')
+
+
+def _load_tours():
+    from apps.touristicagencies.enums import TourStatus
+    return apps.get_model('touristicagencies.PeriodicTour').objects.filter(tour_status=TourStatus.VISIBLE).annotate(
+        popularity=SubqueryCount('scheduled_tours__registrations')
+    ).values_list('id', 'title', 'popularity')
+
+
+def _load_agencies():
+    return apps.get_model('touristicagencies.TouristicAgency').objects.annotate(
+        popularity=SubqueryCount('tours')
+    ).values_list('id', 'name', 'popularity')
+
+
+def _load_cities():
+    return apps.get_model('destinations.City').objects.annotate(
+        popularity=Coalesce(Sum('hotels__stats__reservations_count'), Value(0))
+    ).values_list('id', 'name', 'popularity')
+
+
+def _is_suggested(source: str, instance) -> bool:
+    if source == 'hotel':
+        from apps.hotels.enums import HotelStatus
+        return instance.status == HotelStatus.VISIBLE
+    if source == 'tour':
+        from apps.touristicagencies.enums import TourStatus
+        return instance.tour_status == TourStatus.VISIBLE
+    return True
+
+
+LOADERS = {'hotel': _load_hotels, 'tour': _load_tours, 'agency': _load_agencies, 'city': _load_cities}
+
+
+class PrefixIndex:
+    """
+    Sorted array of the search keys of the names from each of their words, the keys the quick search
+    matches on, a prefix is a binary search away from the range of the names holding a word that starts with it.
+    """
+
+    def __init__(self):
+        self.keys: List[Tuple[str, str, int]] = []
+        self.items: Dict[Tuple[str, int], Tuple[str, int]] = {}
+        self.lock = threading.Lock()
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _get_keys(source: str, item_id: int, name: str) -> List[Tuple[str, str, int]]:
+        words = to_search_key(name).split()
+        # 'Tizi Ouzou' is found from 'tizi uzu' and from 'uzu', so from 'ouzou' and 'وزو' as well
+        return sorted({(' '.join(words[i:]), source, item_id) for i in range(len(words))})
+
+    def _remove(self, source: str, item_id: int):
+        item = self.items.pop((source, item_id), None)
+        if item is None:
+            return
+        for key in self._get_keys(source, item_id, item[0]):
+            position = bisect_left(self.keys, key)
+            if position < len(self.keys) and self.keys[position] == key:
+                del self.keys[position]
+
+    def load(self, source: str, rows):
+        keys = []
+        with self.lock:
+            for item_id, name, popularity in rows:
+                self.items[(source, item_id)] = (name, popularity)
+                keys.extend(self._get_keys(source, item_id, name))
+            self.keys = sorted(self.keys + keys)
+
+    def update(self, source: str, item_id: int, name: str):
+        with self.lock:
+            popularity = self.items.get((source, item_id), (None, 0))[1]
+            self._remove(source, item_id)
+            self.items[(source, item_id)] = (name, popularity)
+            for key in self._get_keys(source, item_id, name):
+                insort(self.keys, key)
+
+    def remove(self, source: str, item_id: int):
+        with self.lock:
+            self._remove(source, item_id)
+
+    def suggest(self, prefix: str, limit: int, sources=None) -> List[Tuple[str, int, str]]:
+        """
+        The most popular items with a word starting with the prefix, as (source, id, name).
+        """
+        prefix = to_search_key(prefix)
+        if not prefix:
+            return []
+        with self.lock:
+            start = bisect_left(self.keys, (prefix,))
+            end = bisect_left(self.keys, (prefix + '\U0010ffff',))
+            matches = {(source, item_id) for _, source, item_id in self.keys[start:end]
+                       if sources is None or source in sources}
+            best = heapq.nsmallest(limit, matches, key=lambda match: (
+                -self.items[match][1], len(self.items[match][0]), match
+            ))
+            return [(source, item_id, self.items[(source, item_id)][0]) for source, item_id in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_index() -> PrefixIndex:
+    index = PrefixIndex()
+    for source, load in LOADERS.items():
+        index.load(source, load())
+    return index
+
+
+def get_index() -> PrefixIndex:
+    global _index
+    if _index is None or time.monotonic() - _index.built_at > SUGGEST_MAX_AGE:
+        with _index_lock:
+            if _index is None or time.monotonic() - _index.built_at > SUGGEST_MAX_AGE:
+                _index = build_index()
+    return _index
+
+
+def update_item(source: str, instance, name: str):
+    # An index not built yet reads the change from the database when it is
+    if _index is None:
+        return
+    if _is_suggested(source, instance):
+        _index.update(source, instance.pk, name)
+    else:
+        _index.remove(source, instance.pk)
+
+
+def remove_item(source: str, item_id: int):
+    if _index is not None:
+        _index.remove(source, item_id)
+
+
+def reset_index():
+    global _index
+    with _index_lock:
+        _index = None
@@ -1,6 +1,19 @@
+import time
+from datetime import date, timedelta
+
 from django.test import TestCase
 
-from apps.search import services
+from apps.destinations.models import Country, City
+from apps.hotels.enums import ReservationStatus, RoomTypeStatus
+from apps.hotels.models import Hotel, Room, RoomType
+from apps.hotels.tests import create_hotel_with_rooms, book
+from apps.search import services, index, suggest, cache
+from apps.search.utils import SearchType, to_search_key, to_skeleton_key
+from apps.search.dtos import SearchItem
+from apps.touristicagencies.enums import TourStatus, ScheduledTourStatus
+from apps.touristicagencies.models import PeriodicTour, ScheduledTour, PeriodicTourRegistration, \
+    PeriodicTourReview
+from apps.search.ranking import levenshtein_ratios, levenshtein_ratio, SKELETON_MATCH_RATIO
 
 
 # Create your tests here.
@@ -9,3 +22,265 @@ class LTestCase(TestCase):
     def test_search_tours(self):
         result = services.quick_search_tours('Hide')
         print(result)
+
+
+class FanOutTestCase(TestCase):
+
+    def test_slow_and_failing_sources_do_not_block_the_others(self):
+        def fast(keyword, limit):
+            return [SearchItem(1, 'hotel', '', keyword, '', 1.0)]
+
+        def slow(keyword, limit):
+            time.sleep(1)
+            return [SearchItem(2, 'tour', '', keyword, '', 1.0)]
+
+        def failing(keyword, limit):
+            raise ValueError(keyword)
+
+        started_at = time.perf_counter()
+        results = services.fan_out([fast, slow, failing], 'oran', timeout=0.2)
+        self.assertLess(time.perf_counter() - started_at, 0.9)
+        self.assertEqual([[item.id for item in items] for items in results], [[1]])
+        # The threads are kept for the next searches
+        self.assertIs(services.get_executor(), services.get_executor())
+
+
+class TrigramIndexTestCase(TestCase):
+
+    def setUp(self):
+        index.reset_indexes()
+        self.country = Country.objects.create(name='Algeria', country_code='213')
+        self.oran = City.objects.create(name='Oran', country=self.country)
+        self.bejaia = City.objects.create(name='Béjaïa', country=self.country)
+
+    def tearDown(self):
+        index.reset_indexes()
+
+    def test_candidates_are_close_names_and_substrings(self):
+        trigram_index = index.TrigramIndex([(1, 'Oran'), (2, 'Grand Hotel'), (3, 'Constantine')])
+        self.assertEqual(trigram_index.candidates('oran'), {1})
+        self.assertEqual(trigram_index.candidates('ran'), {1, 2})
+        self.assertEqual(trigram_index.candidates('constantin'), {3})
+
+    def test_only_the_best_relevant_candidates_are_ranked(self):
+        trigram_index = index.TrigramIndex([(1, 'grand hotel'), (2, 'hotel oran'), (3, 'hotel'), (4, 'hostel')])
+        self.assertEqual(trigram_index.rank('hotel'), {1: 1.0, 2: 1.0, 3: 1.0, 4: 1 - 1 / 6})
+        self.assertEqual(trigram_index.rank('hotel', limit=2), {1: 1.0, 2: 1.0})
+        self.assertEqual(trigram_index.rank('oran'), {2: 1.0})
+
+    def test_saved_and_deleted_items_update_the_index(self):
+        self.assertEqual(index.find_candidates('city', 'bejaia'), {self.bejaia.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            tlemcen = City.objects.create(name='Tlemcen', country=self.country)
+            self.oran.delete()
+        self.assertEqual(index.find_candidates('city', 'tlemcen'), {tlemcen.id})
+        self.assertEqual(index.find_candidates('city', 'oran'), set())
+
+
+class RankingTestCase(TestCase):
+
+    def setUp(self):
+        index.reset_indexes()
+        cache.clear()
+        country = Country.objects.create(name='Algeria', country_code='213')
+        for name in ['Oran', 'Béjaïa', 'Constantine', 'Tlemcen']:
+            City.objects.create(name=name, country=country, cover_img='destinations/cities/city.png')
+
+    def tearDown(self):
+        index.reset_indexes()
+
+    def test_bit_parallel_ratios_match_the_edit_distance(self):
+        self.assertEqual(levenshtein_ratios('oran', ['Oran', 'oarn', 'bejaia', '']), [1.0, 0.5, 1 - 5 / 6, 0.0])
+        self.assertAlmostEqual(levenshtein_ratio('Constantine', 'konstantin'), 1 - 2 / 11)
+
+    def test_spellings_of_a_name_share_its_search_key(self):
+        self.assertEqual({to_search_key(name) for name in ['Tizi Ouzou', 'tizi-ouzou', 'تيزي وزو']}, {'tizi uzu'})
+        self.assertEqual(to_search_key('El Kala'), 'el kala')
+        # The skeleton matches the spellings the edit distance keeps apart
+        self.assertEqual({to_skeleton_key(to_search_key(name)) for name in ['Tizi Ouzou', 'Ouzou Tizi']}, {'az tz'})
+        self.assertEqual({to_skeleton_key(to_search_key(name)) for name in ['Béjaïa', 'Bejaia', 'بجاية']}, {'bj'})
+        self.assertEqual(to_skeleton_key(to_search_key('Djelfa')), to_skeleton_key(to_search_key('الجلفة')))
+        tlemcen = City.objects.get(name='Tlemcen')
+        self.assertEqual((tlemcen.search_key, tlemcen.search_skeleton), ('tlemsen', 'tlmsn'))
+        tizi_ouzou = City.objects.create(name='Tizi Ouzou', country=tlemcen.country)
+        self.assertEqual(City.objects.find_by_keyword('ouzou tizi').get().id, tizi_ouzou.id)
+        self.assertEqual(index.rank('city', 'ouzou tizi'), {tizi_ouzou.id: SKELETON_MATCH_RATIO})
+        response = self.client.get('/api/v1/search/quick', {'q': 'بجاية', 'type': 'destinations'})
+        self.assertEqual([item['name'] for item in response.json()], ['Béjaïa'])
+
+    def test_python_and_database_rankings_agree(self):
+        for keyword in ['oram', 'bejaia', 'BÉJAÏA', 'constantin']:
+            in_database = City.objects.find_by_keyword(keyword).values_list('id', 'name_ratio')
+            in_python = City.objects.find_by_keyword(keyword, index.rank('city', keyword)).values_list(
+                'id', 'name_ratio')
+            # The trigram candidates can leave out the weakest fuzzy matches
+            self.assertLessEqual(set(in_python), set(in_database))
+            self.assertEqual(in_python[0], in_database[0])
+        response = self.client.get('/api/v1/search/quick', {'q': 'bejaia', 'type': 'destinations'})
+        self.assertEqual([item['name'] for item in response.json()], ['Béjaïa'])
+
+    def test_sources_read_their_limit_in_one_query(self):
+        country = Country.objects.get(name='Algeria')
+        for name in ['Oran Est', 'Oran Ouest']:
+            City.objects.create(name=name, country=country, cover_img='destinations/cities/city.png')
+        index.get_index('city')
+        with self.assertNumQueries(1):
+            cities = services.do_quick_search_cities('oran', limit=2)
+        self.assertEqual(len(cities), 2)
+        self.assertTrue(all(city.name.startswith('Oran') and city.address == 'Algeria' for city in cities))
+
+    def test_sorted_results_are_merged_up_to_the_limit(self):
+        hotels = [SearchItem(1, 'hotel', '', '', '', 0.9), SearchItem(2, 'hotel', '', '', '', 0.4)]
+        cities = [SearchItem(3, 'destination', '', '', '', 1.0), SearchItem(4, 'destination', '', '', '', 0.5)]
+        self.assertEqual([item.id for item in services.merge_top([hotels, [], cities], 3)], [3, 1, 4])
+
+
+class SuggestTestCase(TestCase):
+
+    def setUp(self):
+        suggest.reset_index()
+        self.country = Country.objects.create(name='Algeria', country_code='213')
+        self.tizi_ouzou = City.objects.create(name='Tizi Ouzou', country=self.country)
+        self.tlemcen = City.objects.create(name='Tlemcen', country=self.country)
+
+    def tearDown(self):
+        suggest.reset_index()
+
+    def test_most_popular_names_come_first(self):
+        prefix_index = suggest.PrefixIndex()
+        prefix_index.load('hotel', [(1, 'Oran Palace', 3), (2, 'Hotel Oasis', 10), (3, 'Sheraton', 50)])
+        prefix_index.load('city', [(4, 'Oran', 3)])
+        self.assertEqual([item_id for _, item_id, _ in prefix_index.suggest('o', 10)], [2, 4, 1])
+        self.assertEqual([item_id for _, item_id, _ in prefix_index.suggest('O', 10, {'hotel'})], [2, 1])
+        prefix_index.remove('hotel', 2)
+        self.assertEqual([item_id for _, item_id, _ in prefix_index.suggest('oa', 10)], [])
+
+    def test_suggestions_are_served_from_memory(self):
+        suggest.get_index()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/search/suggest', {'q': 'ou', 'type': 'destinations'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'id': self.tizi_ouzou.id, 'type': 'destination', 'name': 'Tizi Ouzou'}])
+        # Arabic script and the other spellings reach the same search keys
+        for prefix in ['وز', 'tlems']:
+            response = self.client.get('/api/v1/search/suggest', {'q': prefix, 'type': 'destinations'})
+            self.assertEqual(len(response.json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tlemcen.name = 'Ouargla'
+            self.tlemcen.save()
+        response = self.client.get('/api/v1/search/suggest', {'q': 'T', 'limit': 5})
+        self.assertEqual([item['name'] for item in response.json()], ['Tizi Ouzou'])
+
+    def test_prefix_is_required(self):
+        response = self.client.get('/api/v1/search/suggest')
+        self.assertEqual(response.status_code, 400)
+
+
+class QuickSearchCacheTestCase(TestCase):
+
+    def setUp(self):
+        index.reset_indexes()
+        cache.clear()
+        country = Country.objects.create(name='Algeria', country_code='213')
+        self.bejaia = City.objects.create(name='Béjaïa', country=country, cover_img='destinations/cities/city.png')
+
+    def tearDown(self):
+        index.reset_indexes()
+        cache.clear()
+
+    def test_normalized_keywords_share_the_results_until_a_name_changes(self):
+        results = services.quick_search('Béjaïa', SearchType.DESTINATIONS)
+        with self.assertNumQueries(0):
+            self.assertEqual(services.quick_search(' BEJAIA ', SearchType.DESTINATIONS), results)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bejaia.name = 'Sétif'
+            self.bejaia.save()
+        self.assertEqual(services.quick_search('bejaia', SearchType.DESTINATIONS), [])
+        stats = services.get_quick_search_cache_stats()
+        self.assertEqual((stats.hits, stats.misses), (1, 2))
+        self.assertAlmostEqual(stats.hit_ratio, 1 / 3)
+
+    def test_search_receives_the_keyword_as_typed(self):
+        keywords = []
+        search = lambda keyword: keywords.append(keyword) or []
+        cache.get_results(SearchType.HOTELS, ' Béjaïa ', search)
+        cache.get_results(SearchType.HOTELS, 'bejaia', search)
+        self.assertEqual(keywords, [' Béjaïa '])
+
+    def test_least_recently_used_results_are_evicted(self):
+        results = cache.ResultCache(max_size=2)
+        results.set('oran', [], 60)
+        results.set('alger', [], 60)
+        results.get('oran')
+        results.set('tlemcen', [], 60)
+        self.assertEqual(list(results.entries), ['oran', 'tlemcen'])
+
+
+class SearchByCityTestCase(TestCase):
+
+    def setUp(self):
+        self.hotel, self.double, self.guest = create_hotel_with_rooms(nb_rooms=1, price_per_night=5000)
+        self.suite = RoomType.objects.create(hotel=self.hotel, name='Suite', size=40, number_of_guests=4,
+                                             price_per_night=15000, status=RoomTypeStatus.VISIBLE)
+        Room.objects.create(room_type=self.suite)
+        self.full_hotel = Hotel.objects.create(owner=self.hotel.owner, name='Full hotel', address='Centre',
+                                               city=self.hotel.city, stars=3, country_code=self.hotel.country_code,
+                                               contact_number=674947412)
+        self.tour = PeriodicTour.objects.create(city=self.hotel.city, title='Santa Cruz', description='Fort',
+                                                cover_img='tourism_agencies/periodic_tours/santa.png',
+                                                start_day=1, start_time='09:00', end_day=1, end_time='12:00',
+                                                price=2000, tour_status=TourStatus.VISIBLE)
+        self.start_date = date.today() + timedelta(days=10)
+        self.end_date = self.start_date + timedelta(days=2)
+        ScheduledTour.objects.create(periodic_tour=self.tour, tour_date=self.start_date + timedelta(days=1),
+                                     tour_status=ScheduledTourStatus.ACTIVE)
+
+    def search(self, number_of_adults, **params):
+        return services.search_by_city(self.hotel.city_id, self.start_date, self.end_date, number_of_adults, 0,
+                                       **params)
+
+    def test_the_cheapest_rooms_hosting_the_party_give_the_price(self):
+        self.assertEqual(services.get_cheapest_rooms_price([(5000, 2, 1), (15000, 4, 1)], 2), 5000)
+        self.assertEqual(services.get_cheapest_rooms_price([(5000, 2, 1), (15000, 4, 1)], 3), 15000)
+        self.assertEqual(services.get_cheapest_rooms_price([(5000, 2, 2), (15000, 4, 1)], 4), 10000)
+        self.assertIsNone(services.get_cheapest_rooms_price([(5000, 2, 1)], 3))
+        book(self.hotel, self.suite, self.guest, self.start_date, self.end_date)
+        self.assertEqual([item.type for item in self.search(3).items], ['tour'])
+
+    def test_hotels_and_tours_are_paged_in_a_bounded_number_of_queries(self):
+        # Hotels, their free rooms, tours, their dates, then the tour of the page
+        with self.assertNumQueries(5):
+            first_page = self.search(3, limit=1)
+        self.assertEqual([(item.type, item.id, item.total_price) for item in first_page.items],
+                         [('tour', self.tour.id, 6000)])
+        self.assertEqual(first_page.items[0].available_on, self.start_date + timedelta(days=1))
+        response = self.client.get('/api/v1/search/city', {
+            'city_id': self.hotel.city_id, 'start_date': self.start_date, 'end_date': self.end_date,
+            'number_of_adults': 3, 'limit': 1, 'cursor': first_page.next_cursor
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['next_cursor'], None)
+        self.assertEqual([(item['type'], item['id'], item['starts_from'], item['total_price'])
+                          for item in response.json()['items']], [('hotel', self.hotel.id, 15000, 30000)])
+
+    def test_tour_reviews_are_grouped_over_all_their_dates(self):
+        for tour_date, ratings in [(self.start_date, [5, 4]), (self.start_date - timedelta(days=7), [3, None])]:
+            scheduled_tour = ScheduledTour.objects.create(periodic_tour=self.tour, tour_date=tour_date,
+                                                          tour_status=ScheduledTourStatus.ACTIVE)
+            for rating in ratings:
+                registration = PeriodicTourRegistration.objects.create(
+                    scheduled_tour=scheduled_tour, first_name='Yusuf', last_name='Mohammed',
+                    email='guest@example.com', phone=1234567, status=ReservationStatus.COMPLETED
+                )
+                if rating is not None:
+                    PeriodicTourReview.objects.create(registration=registration, title='Tour', description='Fort',
+                                                      rating=rating)
+        self.assertEqual(PeriodicTour.objects.find_search_candidates_by_city_id(self.hotel.city_id),
+                         [(self.tour.id, 2000, 4.0, 3)])
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get('/api/v1/search/city', {
+            'city_id': self.hotel.city_id, 'start_date': self.start_date, 'end_date': self.end_date,
+            'number_of_adults': 2, 'cursor': 'oran'
+        })
+        self.assertEqual(response.status_code, 400)
@@ -1,8 +1,11 @@
 from django.urls import path
 
-from apps.search.views import QuickSearchView
+from apps.search.views import QuickSearchView, SuggestView, GetQuickSearchCacheStats, SearchByCityView
 
 APP_URL = 'search/'
 urlpatterns = [
-    path(APP_URL + 'quick', QuickSearchView.as_view())
+    path(APP_URL + 'quick', QuickSearchView.as_view()),
+    path(APP_URL + 'suggest', SuggestView.as_view()),
+    path(APP_URL + 'quick/cache-stats', GetQuickSearchCacheStats.as_view()),
+    path(APP_URL + 'city', SearchByCityView.as_view()),
 ]
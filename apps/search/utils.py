@@ -1,4 +1,9 @@
+import base64
+import json
+import re
+import unicodedata
 from enum import StrEnum
+from typing import Set, Tuple
 
 
 class SearchType(StrEnum):
@@ -6,3 +11,85 @@ class SearchType(StrEnum):
     HOTELS = 'hotels'
     TOURS = 'tours'
     DESTINATIONS = 'destinations'
+
+
+def normalize(text: str) -> str:
+    """
+    Case-fold and strip the accents, 'Béjaïa' and 'bejaia' give the same key.
+    """
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+def get_trigrams(text: str, padded: bool = True) -> Set[str]:
+    """
+    Trigrams of every word of the normalized text, padded words also give their first letters
+    and their ending, like '  o', ' or' and 'an ' for 'oran'.
+    """
+    trigrams = set()
+    for word in normalize(text).split():
+        if padded:
+            word = f'  {word} '
+        trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return trigrams
+
+
+# Latin spelling of the Arabic letters, the way Algerian names are written in French
+ARABIC_LETTERS = str.maketrans({
+    'ا': 'a', 'أ': 'a', 'إ': 'i', 'آ': 'a', 'ء': '', 'ؤ': 'u', 'ئ': 'i', 'ى': 'a', 'ة': 'a',
+    'ب': 'b', 'ت': 't', 'ث': 'th', 'ج': 'j', 'ح': 'h', 'خ': 'kh', 'د': 'd', 'ذ': 'dh', 'ر': 'r',
+    'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's', 'ض': 'd', 'ط': 't', 'ظ': 'dh', 'ع': 'a', 'غ': 'gh',
+    'ف': 'f', 'ق': 'g', 'ك': 'k', 'ل': 'l', 'م': 'm', 'ن': 'n', 'ه': 'h', 'و': 'u', 'ي': 'i', 'ـ': '',
+})
+ARABIC_ARTICLE = re.compile(r'(?<!\S)ال(?=\S{2})')
+# French spellings of the same sounds, applied in this order
+FRENCH_SPELLINGS = [
+    (re.compile(r'dj'), 'j'), (re.compile(r'ch'), 'sh'), (re.compile(r'ou'), 'u'), (re.compile(r'ph'), 'f'),
+    (re.compile(r'gu(?=[eiy])'), 'g'), (re.compile(r'c(?=[eiy])'), 's'), (re.compile(r'[cq]'), 'k'),
+]
+INNER_VOWELS = re.compile(r'(?<=\w)[aeiouy]+')
+REPEATED_LETTERS = re.compile(r'(\w)\1+')
+
+
+def to_search_key(text: str) -> str:
+    """
+    Key the names are matched and ranked on: Arabic transliterated, accents folded, the French
+    spellings unified and the doubled letters merged, the words are kept whole and in their order.
+    'Tizi-Ouzou' and 'تيزي وزو' give 'tizi uzu', 'Béjaïa' gives 'bejaia' and 'بجاية' 'bjaia'.
+    """
+    text = ARABIC_ARTICLE.sub('el ', normalize(text or ''))
+    text = re.sub(r'[\W_]+', ' ', text.translate(ARABIC_LETTERS))
+    for spelling, sound in FRENCH_SPELLINGS:
+        text = spelling.sub(sound, text)
+    return ' '.join(REPEATED_LETTERS.sub(r'\1', text).split())
+
+
+def to_skeleton_key(search_key: str) -> str:
+    """
+    Consonant skeleton of a search key, an extra key matching the spellings the edit distance
+    keeps apart: only the consonants past the first letter, since Arabic does not write the short
+    vowels, the words sorted and a leading article left out, since names are written with and
+    without it. 'ouzou tizi' and 'tizi uzu' give 'az tz', 'jelfa' and 'el jlfa' give 'jlf'.
+    """
+    text = re.sub(r'\b[aeiouy]+', 'a', INNER_VOWELS.sub('', search_key))
+    words = REPEATED_LETTERS.sub(r'\1', text).split()
+    if len(words) > 1 and words[0] == 'al':
+        words = words[1:]
+    return ' '.join(sorted(words))
+
+
+def encode_cursor(key: Tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """
+    Read back the ranking key of the last item of a page, raises ValueError on a malformed cursor.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError('Malformed cursor') from e
+    if not isinstance(key, list):
+        raise ValueError('Malformed cursor')
+    return tuple(key)
@@ -11,11 +11,68 @@ from . import serializers, services
 from apps.destinations import services as destination_services
 from .serializers import SearchItemSerializer
 from .utils import SearchType
+from ..users.permissions import IsAdmin
 
 
 # Create your views here.
 
 
+class SuggestView(APIView):
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(
+        tags=['Search'],
+        summary='Suggest the most popular names starting with the typed characters',
+        parameters=[serializers.SuggestParamsSerializer],
+        responses={200: serializers.SuggestionSerializer}
+    )
+    def get(self, request):
+        request_params = serializers.SuggestParamsSerializer(data=self.request.query_params)
+        if not request_params.is_valid():
+            raise ValidationError(request_params.errors)
+        suggestions = services.suggest(request_params.validated_data['q'], request_params.validated_data['type'],
+                                       request_params.validated_data['limit'])
+        response = serializers.SuggestionSerializer(suggestions, many=True)
+        return Response(data=response.data, status=status.HTTP_200_OK)
+
+
+class GetQuickSearchCacheStats(APIView):
+    permission_classes = [IsAdmin]
+
+    @extend_schema(
+        tags=['Admin'],
+        summary='Get the hits and misses of the quick search results cache of the serving process',
+        responses={200: serializers.QuickSearchCacheStatsSerializer}
+    )
+    def get(self, request):
+        stats = services.get_quick_search_cache_stats()
+        response = serializers.QuickSearchCacheStatsSerializer(stats)
+        return Response(data=response.data, status=status.HTTP_200_OK)
+
+
+class SearchByCityView(APIView):
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(
+        tags=['Search'],
+        summary='Search the hotels and the tours of a city available for a date range and a party, page by page',
+        parameters=[serializers.SearchByCitySerializer],
+        responses={
+            200: serializers.CitySearchPageSerializer,
+            400: 'Invalid parameters - either missing or invalid fields -'
+        }
+    )
+    def get(self, request):
+        request_params = serializers.SearchByCitySerializer(data=self.request.query_params)
+        if not request_params.is_valid():
+            raise ValidationError(request_params.errors)
+        page = services.search_by_city(**request_params.validated_data)
+        response = serializers.CitySearchPageSerializer(page)
+        return Response(data=response.data, status=status.HTTP_200_OK)
+
+
 class QuickSearchView(APIView):
     authentication_classes = []
     permission_classes = []
@@ -36,14 +93,6 @@ class QuickSearchView(APIView):
             raise ValidationError({'detail': 'You have to provide at least a keyword with three characters'})
         if search_type not in iter(SearchType):
             raise ValidationError({'detail': 'Invalid search type, see the docs for more details'})
-        result = []
-        if search_type == SearchType.ALL:
-            result = services.do_quick_search(keyword)[:10]
-        elif search_type == SearchType.HOTELS:
-            result = services.do_quick_search_hotels(keyword)[:10]
-        elif search_type == SearchType.TOURS:
-            result = services.do_quick_search_tours(keyword)[:10]
-        elif search_type == SearchType.DESTINATIONS:
-            result = services.do_quick_search_cities(keyword)[:10]
+        result = services.quick_search(keyword, SearchType(search_type))
         response = serializers.SearchItemSerializer(result, many=True)
         return Response(data=response.data, status=status.HTTP_200_OK)
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0007_country_iso'),
+        ('guests', '0009_alter_guest_phone'),
+        ('touristicagencies', '0008_alter_periodictour_price_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='periodictourregistration',
+            name='chk_tour_reg_status',
+        ),
+        migrations.AlterField(
+            model_name='periodictourregistration',
+            name='status',
+            field=models.CharField(choices=[('On Hold', 'On Hold'), ('Uncompleted', 'Uncompleted'), ('Confirmed', 'Confirmed'), ('Active', 'Active'), ('Cancelled By Owner', 'Cancelled By Owner'), ('Cancelled By Guest', 'Cancelled By Guest'), ('Completed', 'Completed'), ('Deleted_By_Admin', 'Deleted By Admin')], max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='periodictourregistration',
+            constraint=models.CheckConstraint(condition=models.Q(('status__in', ['On Hold', 'Uncompleted', 'Confirmed', 'Active', 'Cancelled By Owner', 'Cancelled By Guest', 'Completed', 'Deleted_By_Admin'])), name='chk_tour_reg_status'),
+        ),
+    ]
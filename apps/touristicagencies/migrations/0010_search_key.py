@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:10
+
+import apps.search.fields
+from django.db import migrations
+
+from apps.search.utils import to_search_key
+
+
+def fill_search_keys(apps, schema_editor):
+    for model, field in [('PeriodicTour', 'title'), ('TouristicAgency', 'name')]:
+        model = apps.get_model('touristicagencies', model)
+        items = list(model.objects.only(field))
+        for item in items:
+            item.search_key = to_search_key(getattr(item, field))[:255]
+        model.objects.bulk_update(items, ['search_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('touristicagencies', '0009_periodictourregistration_on_hold_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='periodictour',
+            name='search_key',
+            field=apps.search.fields.SearchKeyField(db_index=True, default='', editable=False, max_length=255, source='title'),
+        ),
+        migrations.AddField(
+            model_name='touristicagency',
+            name='search_key',
+            field=apps.search.fields.SearchKeyField(db_index=True, default='', editable=False, max_length=255, source='name'),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:29
+
+import apps.search.fields
+from django.db import migrations
+
+from apps.search.utils import to_search_key, to_skeleton_key
+
+
+def fill_search_keys(apps, schema_editor):
+    # The search keys keep their words whole since the skeleton was split from them
+    for model, field in [('PeriodicTour', 'title'), ('TouristicAgency', 'name')]:
+        model = apps.get_model('touristicagencies', model)
+        items = list(model.objects.only(field))
+        for item in items:
+            item.search_key = to_search_key(getattr(item, field))[:255]
+            item.search_skeleton = to_skeleton_key(to_search_key(getattr(item, field)))[:255]
+        model.objects.bulk_update(items, ['search_key', 'search_skeleton'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('touristicagencies', '0010_search_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='periodictour',
+            name='search_skeleton',
+            field=apps.search.fields.SearchSkeletonField(db_index=True, default='', editable=False, max_length=255, source='title'),
+        ),
+        migrations.AddField(
+            model_name='touristicagency',
+            name='search_skeleton',
+            field=apps.search.fields.SearchSkeletonField(db_index=True, default='', editable=False, max_length=255, source='name'),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,19 @@
+from datetime import date
+from typing import Dict, List
+
 from django.core.validators import RegexValidator
 from django.db import models
 from django.db.models import Q, Func, F, BigIntegerField, FloatField, Value, CheckConstraint, Count, Avg, Case, When, \
-    Sum
+    Sum, Min
 from django.db.models.functions import Coalesce
 from django.utils.dates import WEEKDAYS
 from sql_util.aggregates import SubqueryCount, SubqueryAvg
 
+from apps.leaderboards.boards import TOP_TOURS
+from apps.leaderboards.models import LeaderboardEntry, Rankings
+from apps.leaderboards.utils import compute_scores
+from apps.search.fields import SearchKeyField, SearchSkeletonField
+from apps.search.ranking import keyword_ratio_expression, relevance_expression, MIN_NAME_RATIO
 from apps.users.models import User
 from .enums import TourStatus, ScheduledTourStatus
 from ..destinations.models import Country, City
@@ -13,26 +21,24 @@ from ..guests.models import Guest
 from ..hotels.enums import ReservationStatus
 
 
-class LevenshteinRatio(Func):
-    function = "_levenshtein_ratio"
-    output_field = FloatField()
-
-
 class TouristicAgencyManager(models.Manager):
 
-    def find_by_keyword(self, keyword: str):
-        return self.annotate(
-            name_ratio=Case(
-                When(name__icontains=keyword, then=1),
-                default=LevenshteinRatio(F('name'), Value(keyword)),
-                output_field=FloatField(),
-            )
-        ).filter(name_ratio__gt=0.3).order_by('-name_ratio').all()
+    def find_by_keyword(self, keyword: str, relevances: Dict[int, float] = None):
+        """
+        Ratios computed by the database, or the relevances ranked beforehand for the candidate ids.
+        """
+        items = self.all() if relevances is None else self.filter(id__in=relevances)
+        return items.annotate(
+            name_ratio=keyword_ratio_expression(keyword) if relevances is None
+            else relevance_expression(relevances)
+        ).filter(name_ratio__gt=MIN_NAME_RATIO).order_by('-name_ratio').all()
 
 
 class TouristicAgency(models.Model):
     user = models.OneToOneField(User, related_name='agency', on_delete=models.SET_NULL, null=True)
     name = models.CharField(max_length=255)
+    search_key = SearchKeyField(source='name')
+    search_skeleton = SearchSkeletonField(source='name')
     description = models.TextField(max_length=300)
     address = models.CharField(max_length=300, null=True)
     city = models.ForeignKey(City, related_name='touristic_agencies', on_delete=models.SET_NULL, null=True)
@@ -57,23 +63,63 @@ class Guide(models.Model):
 
 
 class PeriodicTourManager(models.Manager):
+    w1 = 0.6  # Rating weight
+    w2 = 0.4  # Number of reviews weight
+
+    def rank_tours(self, size: int) -> Rankings:
+        rows = list(self.filter(tour_status=TourStatus.VISIBLE).annotate(
+            reviews_count=SubqueryCount('scheduled_tours__registrations__review'),
+            rating_avg=SubqueryAvg('scheduled_tours__registrations__review__rating')
+        ).values_list('id', 'rating_avg', 'reviews_count'))
+        scores = compute_scores(
+            features={'rating': [row[1] for row in rows], 'reviews': [row[2] for row in rows]},
+            weights={'rating': self.w1, 'reviews': self.w2}
+        )
+        ranking = sorted(zip([row[0] for row in rows], scores), key=lambda item: (-item[1], item[0]))
+        return {'all': ranking[:size]}
 
     def find_top_tours(self):
+        ranking = LeaderboardEntry.objects.find_ranking(TOP_TOURS, limit=8)
         return list(self.annotate(
-            reviews_count=Coalesce(Sum('scheduled_tours__registrations__review'), Value(0),
-                                   output_field=models.IntegerField()),
-            rating_avg=Coalesce(Sum('scheduled_tours__registrations__review__rating'), Value(0),
-                                output_field=models.IntegerField()),
-        ).all()[:8])
-
-    def find_by_keyword(self, keyword: str):
-        return self.annotate(
-            title_ratio=Case(
-                When(title__icontains=keyword, then=1),
-                default=LevenshteinRatio(F('title'), Value(keyword)),
-                output_field=FloatField(),
-            )
-        ).filter(title_ratio__gt=0.3).order_by('-title_ratio').all()
+            reviews_count=SubqueryCount('scheduled_tours__registrations__review'),
+            rating_avg=Coalesce(SubqueryAvg('scheduled_tours__registrations__review__rating'), Value(0),
+                                output_field=FloatField()),
+            score=Case(*[When(id=tour_id, then=Value(score)) for tour_id, score in ranking],
+                       default=Value(0.0), output_field=FloatField())
+        ).filter(id__in=[tour_id for tour_id, _ in ranking]).order_by('-score', 'id'))
+
+    def find_by_keyword(self, keyword: str, relevances: Dict[int, float] = None):
+        """
+        Ratios computed by the database, or the relevances ranked beforehand for the candidate ids.
+        """
+        items = self.all() if relevances is None else self.filter(id__in=relevances)
+        return items.annotate(
+            title_ratio=keyword_ratio_expression(keyword) if relevances is None
+            else relevance_expression(relevances)
+        ).filter(title_ratio__gt=MIN_NAME_RATIO).order_by('-title_ratio').all()
+
+    def find_search_candidates_by_city_id(self, city_id: int) -> List[tuple]:
+        """
+        (id, price, rating_avg, reviews_count) of every visible tour of the city, the reviews grouped
+        by tour in the same query, a registration has a single review so the joins do not repeat them.
+        """
+        return list(self.filter(city_id=city_id, tour_status=TourStatus.VISIBLE).annotate(
+            reviews_count=Count('scheduled_tours__registrations__review'),
+            rating_avg=Coalesce(Avg('scheduled_tours__registrations__review__rating'), Value(0.0),
+                                output_field=FloatField())
+        ).values_list('id', 'price', 'rating_avg', 'reviews_count'))
+
+    def find_first_dates(self, tour_ids: List[int], first_day: date, last_day: date) -> Dict[int, date]:
+        """
+        First active date of each tour within the days, the tours not held then are left out.
+        """
+        return dict(ScheduledTour.objects.filter(
+            periodic_tour_id__in=tour_ids,
+            tour_status=ScheduledTourStatus.ACTIVE,
+            tour_date__range=(first_day, last_day)
+        ).values('periodic_tour_id').annotate(
+            first_date=Min('tour_date')
+        ).values_list('periodic_tour_id', 'first_date'))
 
     def find_top_tours_by_city_id(self, city_id: int):
         return self.annotate(
@@ -109,6 +155,8 @@ class PeriodicTour(models.Model):
     touristic_agency = models.ForeignKey(TouristicAgency, on_delete=models.SET_NULL, null=True, related_name='tours')
     city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, related_name='periodic_tours')
     title = models.CharField(max_length=255)
+    search_key = SearchKeyField(source='title')
+    search_skeleton = SearchSkeletonField(source='title')
     description = models.TextField(max_length=500)
     cover_img = models.ImageField(null=True, upload_to='tourism_agencies/periodic_tours/')
     start_day = models.CharField(max_length=255, choices=list(WEEKDAYS.items()))
@@ -4,7 +4,7 @@ from ..destinations.serializers import CitySerializer
 
 
 class TourSerializer(serializers.ModelSerializer):
-    rating_avg = serializers.IntegerField()
+    rating_avg = serializers.FloatField()
     reviews_count = serializers.IntegerField()
 
     class Meta:
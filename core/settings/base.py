@@ -1,5 +1,6 @@
 from datetime import timedelta
 from pathlib import Path
+from celery.schedules import crontab
 from decouple import config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -33,6 +34,8 @@ INSTALLED_APPS = [
     'apps.vacationrentals',
     'apps.destinations',
     'apps.blogs',
+    'apps.leaderboards',
+    'apps.search',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -153,6 +156,20 @@ USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# The cache versions (hotel calendars, closed month revenues, quick search results) are bumped by one
+# process and read by the others, the cache must be shared by every web and Celery worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_URL', default='redis://localhost:6379/1'),
+    }
+}
+
+# Alias of CACHES holding the quick search results shared by the workers, each process keeps its own when None.
+# The results version lives in this cache, or the default one when None, both must be shared by the workers
+# or an invalidation only reaches the process that made it
+QUICK_SEARCH_CACHE_ALIAS = None
+
 # Celery configuration
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
@@ -160,3 +177,17 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    'release-expired-holds': {
+        'task': 'apps.hotels.tasks.release_expired_holds',
+        'schedule': 60.0,
+    },
+    'reconcile-hotel-stats': {
+        'task': 'apps.hotels.tasks.reconcile_hotel_stats',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'refresh-leaderboards': {
+        'task': 'apps.leaderboards.tasks.refresh_leaderboards',
+        'schedule': crontab(minute='*/10'),
+    },
+}
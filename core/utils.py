@@ -1,3 +1,6 @@
+import time
+
+from django.core.cache import cache
 from rest_framework.exceptions import APIException
 
 
@@ -7,6 +10,18 @@ class CustomException(APIException):
         self.status_code = status
 
 
+def get_cache_version(key: str, backend=cache) -> int:
+    # Start from the current time, a version key evicted from the cache never reuses an old version
+    return backend.get_or_set(key, time.time_ns, timeout=None)
+
+
+def bump_cache_version(key: str, backend=cache):
+    try:
+        backend.incr(key)
+    except ValueError:
+        backend.set(key, time.time_ns(), timeout=None)
+
+
 def _get_queryset(klass):
     if hasattr(klass, "_default_manager"):
         return klass._default_manager.all()